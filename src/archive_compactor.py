@@ -0,0 +1,337 @@
+# -*- coding: utf-8 -*-
+"""
+処理済みフォルダ（済）の圧縮アーカイブ
+======================================
+「済」フォルダに溜まった古いJSONを日付ごとのZIPにまとめ、
+orderId / homisId / job_id で引ける索引を作る。
+
+v1.0.0 - 新規作成 (2026/10/18)
+  - 旧: 済フォルダに数千件の小さなJSONが溜まり、Drive同期・一覧表示・手動検索が遅くなる
+  - 新: N日より古いファイルを 済/archive/YYYYMMDD.zip にまとめて元ファイルを削除
+        索引 済/archive/YYYYMMDD.index.json で1件だけすぐに取り出せる
+v1.0.1 - バンドル（.jsonl）もアーカイブ・未アーカイブ分も中身で検索 (2026/10/18)
+  - 旧: 対象は *.json のみ（.jsonl のバンドルは済フォルダに残り続ける）
+        未アーカイブ分はファイル名しか見ないため orderId / homisId / job_id で見つからない
+  - 新: *.jsonl も対象。索引・検索はファイル内の全ジョブ（バンドルの各行・複合ジョブの各要素）の
+        orderId / homisId / job_id を見る（複数あれば索引の値はリスト）
+v1.0.2 - 複数PCで同じ済フォルダを圧縮しても壊れないように (2026/10/18)
+  - 旧: 固定名の YYYYMMDD.zip.tmp をロックなしで作るため、同じ済フォルダを監視する
+        2台が同じ日を同時に圧縮すると一時ファイル・索引を上書きし合う
+  - 新: 日ごとにロック（archive/YYYYMMDD.lock を排他作成）を取ってから圧縮し、
+        他のPCが圧縮中の日は飛ばす（LOCK_STALE_SECONDS を過ぎたロックは落ちたPCのものとして奪う）
+        一時ファイル名にPC名・PIDを入れ、元ファイルは最終的なZIPに入ったことを確認してから削除
+
+設定（config.json）:
+    "archive": {
+        "enabled": true,
+        "days": 14          # 更新日時がこの日数より古いファイルをアーカイブ
+    }
+
+使い方:
+    # watcher.py から（監視ループの各サイクルで呼ぶ。実行間隔内なら何もしない）
+    compactor = ArchiveCompactor(processed_folder, days=14)
+    compactor.maybe_start()
+
+    # 手動検索（コマンドライン）
+    python archive_compactor.py <済フォルダ> <orderId / homisId / job_id>
+"""
+
+import os
+import json
+import time
+import socket
+import shutil
+import zipfile
+import logging
+import threading
+from pathlib import Path
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_DIR_NAME = "archive"
+RUN_INTERVAL = 3600      # 圧縮処理の実行間隔（秒）
+DEFAULT_DAYS = 14
+INDEX_KEYS = ("orderId", "homisId", "job_id")
+ARCHIVE_PATTERNS = ("*.json", "*.jsonl")
+LOCK_STALE_SECONDS = 3600   # この時間を過ぎた日ごとのロックは落ちたPCのものとみなす
+
+
+def _read_job(name: str, raw: bytes) -> Any:
+    """ファイルの中身を読む（.jsonl は行ごとのリスト。解析できない行・ファイルは None）"""
+    if name.endswith(".jsonl"):
+        return [_read_json(line) for line in raw.splitlines() if line.strip()]
+    return _read_json(raw)
+
+
+def _iter_jobs(content: Any):
+    """ファイルの中身からジョブ（dict）を順に取り出す（バンドルの各行・複合ジョブの各要素も）"""
+    for job in (content if isinstance(content, list) else [content]):
+        if not isinstance(job, dict):
+            continue
+        yield job
+        for item in job.get("templates") or []:
+            if isinstance(item, dict):
+                yield item
+
+
+def _index_entry(name: str, raw: bytes) -> Dict[str, Any]:
+    """ファイルから索引用の項目を取り出す（壊れたJSONはファイル名だけ。値が複数ならリスト）"""
+    entry: Dict[str, Any] = {"file": name}
+    values: Dict[str, List[str]] = {key: [] for key in INDEX_KEYS}
+    for job in _iter_jobs(_read_job(name, raw)):
+        data = job.get("data")
+        data = data if isinstance(data, dict) else {}
+        for key in INDEX_KEYS:
+            value = job.get(key) if key == "job_id" else data.get(key)
+            if value not in (None, "") and str(value) not in values[key]:
+                values[key].append(str(value))
+    for key, found in values.items():
+        if found:
+            entry[key] = found[0] if len(found) == 1 else found
+    return entry
+
+
+def _entry_matches(entry: Dict[str, Any], key: str) -> bool:
+    """索引の項目がファイル名の一部、または orderId / homisId / job_id に一致するか"""
+    if key in entry["file"]:
+        return True
+    for index_key in INDEX_KEYS:
+        value = entry.get(index_key, "")
+        if any(str(v) == key for v in (value if isinstance(value, list) else [value])):
+            return True
+    return False
+
+
+class ArchiveCompactor:
+    """済フォルダの古いファイルを日付別ZIPにまとめる（バックグラウンド実行）"""
+
+    def __init__(self, processed_folder: Path, days: int = DEFAULT_DAYS):
+        self.processed_folder = Path(processed_folder)
+        self.days = days
+        self._last_run = 0.0
+        self._thread: Optional[threading.Thread] = None
+        self.node_id = f"{socket.gethostname().replace('.', '-')}.{os.getpid()}"
+
+    @property
+    def archive_folder(self) -> Path:
+        return self.processed_folder / ARCHIVE_DIR_NAME
+
+    def maybe_start(self):
+        """前回から RUN_INTERVAL 秒経っていて、実行中でなければバックグラウンドで圧縮"""
+        if self._thread and self._thread.is_alive():
+            return
+        if time.time() - self._last_run < RUN_INTERVAL:
+            return
+        self._last_run = time.time()
+        self._thread = threading.Thread(target=self._run_safe, name="ArchiveCompactor", daemon=True)
+        self._thread.start()
+
+    def _run_safe(self):
+        try:
+            count = self.compact()
+            if count:
+                logger.info(f"🗜 済フォルダをアーカイブ: {count}件")
+        except Exception as e:
+            logger.warning(f"⚠️ 済フォルダのアーカイブエラー: {e}")
+
+    def compact(self) -> int:
+        """
+        古いファイルを日付別ZIPにまとめる
+
+        Returns:
+            int: アーカイブしたファイル数
+        """
+        if not self.processed_folder.exists():
+            return 0
+
+        limit = (datetime.now() - timedelta(days=self.days)).date()
+        by_day: Dict[str, List[Path]] = {}
+        for path in self._loose_files():
+            try:
+                day = datetime.fromtimestamp(path.stat().st_mtime).date()
+            except OSError:
+                continue
+            if day < limit:
+                by_day.setdefault(day.strftime("%Y%m%d"), []).append(path)
+
+        total = 0
+        for day, files in sorted(by_day.items()):
+            self.archive_folder.mkdir(parents=True, exist_ok=True)
+            lock = self._lock_day(day)
+            if lock is None:
+                logger.info(f"⏭ 他のPCがアーカイブ中のためスキップ: {day}")
+                continue
+            try:
+                total += self._compact_day(day, files)
+            finally:
+                self._unlock_day(lock)
+        return total
+
+    def _lock_day(self, day: str) -> Optional[Path]:
+        """
+        日ごとのロックを取る（排他作成。取れなければ None）
+        期限切れのロックはリネームで奪う（同時に奪おうとしても成功するのは1台だけ）
+        """
+        lock = self.archive_folder / f"{day}.lock"
+        for _ in range(2):
+            try:
+                fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                try:
+                    age = time.time() - lock.stat().st_mtime
+                except OSError:
+                    continue   # ちょうど解放された → もう一度取りにいく
+                if age < LOCK_STALE_SECONDS:
+                    return None
+                try:
+                    os.rename(lock, lock.with_name(f"{lock.name}.stale.{self.node_id}"))
+                    os.remove(lock.with_name(f"{lock.name}.stale.{self.node_id}"))
+                except OSError:
+                    return None   # 他のPCが先に奪った
+                logger.warning(f"♻️ 期限切れのアーカイブロックを回収: {day}（{age:.0f}秒）")
+                continue
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(self.node_id)
+            return lock
+        return None
+
+    def _unlock_day(self, lock: Path):
+        """自分のロックだけを消す（期限切れで他のPCに奪われていたら触らない）"""
+        try:
+            if lock.read_text(encoding="utf-8") == self.node_id:
+                lock.unlink()
+        except OSError:
+            pass
+
+    def _loose_files(self) -> List[Path]:
+        """済フォルダ直下の未アーカイブのファイル（単体JSON・バンドル）"""
+        files = []
+        for pattern in ARCHIVE_PATTERNS:
+            files.extend(self.processed_folder.glob(pattern))
+        return sorted(files)
+
+    def _compact_day(self, day: str, files: List[Path]) -> int:
+        """1日分をZIPに追記 → 索引更新 → 元ファイル削除（_lock_day でロックを取ってから呼ぶ）"""
+        bundle = self.archive_folder / f"{day}.zip"
+        index_path = self.archive_folder / f"{day}.index.json"
+        tmp_bundle = bundle.with_name(f"{bundle.name}.{self.node_id}.tmp")
+
+        # ロック中なので、この日の一時ファイルはすべて中断した圧縮の残骸
+        for leftover in self.archive_folder.glob(f"{day}.*.tmp"):
+            try:
+                leftover.unlink()
+            except OSError:
+                pass
+
+        index = self._load_index(index_path)
+        indexed = {entry["file"] for entry in index}
+
+        # 既存ZIPをコピーしてから追記し、最後に置き換える（途中で落ちても元のZIPは壊れない）
+        if bundle.exists():
+            shutil.copyfile(bundle, tmp_bundle)
+        archived = []
+        with zipfile.ZipFile(tmp_bundle, "a", compression=zipfile.ZIP_DEFLATED) as zf:
+            existing = set(zf.namelist())
+            for path in files:
+                try:
+                    raw = path.read_bytes()
+                except OSError as e:
+                    logger.warning(f"⚠️ アーカイブ対象を読めません: {path.name} - {e}")
+                    continue
+                # 前回、ZIP更新後・削除前に中断した場合は追記せず削除だけ行う
+                if path.name not in existing:
+                    zf.writestr(path.name, raw)
+                if path.name not in indexed:
+                    index.append(_index_entry(path.name, raw))
+                    indexed.add(path.name)
+                archived.append(path)
+        os.replace(tmp_bundle, bundle)
+
+        tmp_index = index_path.with_name(f"{index_path.name}.{self.node_id}.tmp")
+        with open(tmp_index, "w", encoding="utf-8") as f:
+            json.dump(index, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_index, index_path)
+
+        # 最終的なZIPに入っているものだけ削除（万一、他のPCのZIPで置き換えられていても失わない）
+        with zipfile.ZipFile(bundle) as zf:
+            stored = set(zf.namelist())
+        archived = [path for path in archived if path.name in stored]
+        for path in archived:
+            try:
+                path.unlink()
+            except OSError as e:
+                logger.warning(f"⚠️ アーカイブ済みファイルを削除できません: {path.name} - {e}")
+        return len(archived)
+
+    @staticmethod
+    def _load_index(index_path: Path) -> List[Dict[str, Any]]:
+        if not index_path.exists():
+            return []
+        try:
+            with open(index_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"⚠️ 索引ファイルを読めません（作り直します）: {index_path.name} - {e}")
+            return []
+
+    # ------------------------------------------------------------
+    # 検索
+    # ------------------------------------------------------------
+
+    def lookup(self, key: str) -> List[Dict[str, Any]]:
+        """
+        orderId / homisId / job_id（またはファイル名の一部）で検索
+
+        Returns:
+            list: [{"location": "済" or "archive/YYYYMMDD.zip", "file": ファイル名, "job": JSON}, ...]
+        """
+        results = []
+
+        # 済フォルダ（未アーカイブ分）はファイルを読んで検索
+        for path in self._loose_files():
+            try:
+                raw = path.read_bytes()
+            except OSError as e:
+                logger.warning(f"⚠️ 検索対象を読めません: {path.name} - {e}")
+                continue
+            if _entry_matches(_index_entry(path.name, raw), key):
+                results.append({"location": self.processed_folder.name, "file": path.name,
+                                "job": _read_job(path.name, raw)})
+
+        # アーカイブ分は索引で検索
+        for index_path in sorted(self.archive_folder.glob("*.index.json")):
+            matches = [entry["file"] for entry in self._load_index(index_path) if _entry_matches(entry, key)]
+            if not matches:
+                continue
+            bundle = self.archive_folder / index_path.name.replace(".index.json", ".zip")
+            with zipfile.ZipFile(bundle) as zf:
+                for name in matches:
+                    results.append({"location": f"{ARCHIVE_DIR_NAME}/{bundle.name}", "file": name,
+                                    "job": _read_job(name, zf.read(name))})
+        return results
+
+
+def _read_json(raw: bytes) -> Any:
+    try:
+        return json.loads(raw.decode("utf-8"))
+    except Exception:
+        return None
+
+
+# === 手動検索用 ===
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) != 3:
+        print("使い方: python archive_compactor.py <済フォルダ> <orderId / homisId / job_id>")
+        sys.exit(1)
+
+    compactor = ArchiveCompactor(Path(sys.argv[1]))
+    found = compactor.lookup(sys.argv[2])
+    if not found:
+        print("見つかりませんでした")
+    for item in found:
+        print(f"=== {item['location']} / {item['file']} ===")
+        print(json.dumps(item["job"], ensure_ascii=False, indent=2))
@@ -5,6 +5,48 @@
 YAMLテンプレートで指定されたアクションを実行
 
 v1.1.0 - A/P Summary欄の選択ロジック修正 (2026/01/26)
+v1.2.0 - 操作中のセッション切れ（ログイン画面への転送）を検出して SessionExpired を送出 (2026/10/18)
+v1.3.0 - 条件待ち wait_for アクション・wait_until（ステップ後の条件待ち）を追加 (2026/10/18)
+  - 旧: wait / wait_after の固定ミリ秒のみ（安全のため3〜5秒を足していた）
+  - 新: 条件が満たされた時点で次へ進む（timeout ミリ秒で失敗）
+
+条件（wait_for のステップ・wait_until の辞書に1つ指定）:
+    visible: セレクタ        要素が表示された
+    gone: セレクタ           要素が消えた（非表示・削除）
+    url_contains: 文字列     URLに文字列が含まれる
+    alert: true              アラートが表示された
+    text: 文字列             ページ本文に文字列が表示された
+    network_idle: true       読み込み完了・通信（XHR / fetch / jQuery・リソース取得）が idle_ms 止まった
+    共通: timeout（ミリ秒。既定はアクションのタイムアウト）、selector_type（css / xpath）、
+          idle_ms（network_idle のみ。既定500）
+
+    例:
+      - name: 医科カルテ画面を待つ
+        action: wait_for
+        visible: "#act_date"
+        timeout: 10000
+
+      - name: 新規ボタンをクリック
+        action: click
+        selector: "#karteNew"
+        wait_until: {visible: "#doctor018"}
+
+v1.4.0 - 要素待ちをブラウザ内で行う observer 方式を追加（既定） (2026/10/18)
+  - 旧: WebDriverWait が0.5秒ごとにchromedriverへ問い合わせ（1回ごとにHTTP往復）
+        要素が出てから最大0.5秒の遅れ＋待ち時間に比例したコマンド数
+  - 新: execute_async_script 1回で、ページ内の MutationObserver / requestAnimationFrame が
+        要素の出現（visible / gone も同様）を監視し、一致した瞬間に返す
+        ページ遷移でスクリプトが中断された場合は残り時間を従来のポーリングで待つ
+  - config.json の "wait_mode": "polling" で従来方式に戻せる
+  - 比較: python browser_actions.py --bench 50（ローカルのモックページで両方式の遅れ・コマンド数を計測）
+v1.4.1 - 既定の待ち方式を polling に戻す (2026/10/18)
+  - observer は実際のHomisでのベンチマーク結果を HANDOVER.md に記録するまで
+    "wait_mode": "observer" を指定した場合だけ使う（オプトイン）
+v1.4.2 - network_idle の通信検出を修正 (2026/10/18)
+  - 旧: performance のリソース件数（既定250件で記録が止まる）と jQuery.active だけを見ていた
+        → 長く開いたページや jQuery 以外の XHR / fetch では通信中でも「停止」と判定
+  - 新: ページに一度だけフックを入れ、実行中の XHR / fetch を数える
+        リソース件数は PerformanceObserver で数える（記録の上限に影響されない）
 """
 
 import time
@@ -13,17 +55,142 @@ from typing import Dict, Any, Optional
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait, Select
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoAlertPresentException
+from selenium.common.exceptions import TimeoutException, NoAlertPresentException, WebDriverException
 
 logger = logging.getLogger(__name__)
 
+# 画面遷移を伴う可能性があるアクション（実行後にセッション切れを確認する）
+NAVIGATING_ACTIONS = ("click", "navigate")
+
+# 条件待ちの種類・確認間隔
+WAIT_CONDITIONS = ("visible", "gone", "url_contains", "alert", "text", "network_idle")
+WAIT_POLL_SECONDS = 0.1
+DEFAULT_IDLE_MS = 500
+
+# 要素待ちの方式
+WAIT_MODE_OBSERVER = "observer"   # ブラウザ内で監視（execute_async_script 1回）
+WAIT_MODE_POLLING = "polling"     # WebDriverWait で問い合わせ（既定）
+DEFAULT_WAIT_MODE = WAIT_MODE_POLLING
+DEFAULT_SCRIPT_TIMEOUT = 30       # chromedriver の execute_async_script 既定タイムアウト（秒）
+SCRIPT_TIMEOUT_MARGIN = 5         # ブラウザ内の待ち時間に対する余裕（秒）
+
+# ページ内で要素の状態を監視し、条件を満たした瞬間に返す
+# 引数: セレクタ, XPathか, 条件(present / visible / clickable / gone), タイムアウト(ms)
+# 戻り値: 要素（gone は true）／タイムアウトなら null
+_OBSERVE_SCRIPT = """
+var selector = arguments[0], isXpath = arguments[1], mode = arguments[2], timeoutMs = arguments[3];
+var done = arguments[arguments.length - 1];
+var finished = false, observer = null, frame = null, interval = null, timer = null;
+
+function find() {
+    if (isXpath) {
+        return document.evaluate(selector, document, null,
+                                 XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+    }
+    return document.querySelector(selector);
+}
+function visible(el) {
+    return !!el && el.getClientRects().length > 0 && getComputedStyle(el).visibility !== 'hidden';
+}
+function test() {
+    var el = find();
+    if (mode === 'gone') return visible(el) ? null : true;
+    if (mode === 'present') return el;
+    if (!visible(el)) return null;
+    if (mode === 'clickable' && el.disabled) return null;
+    return el;
+}
+function finish(value) {
+    if (finished) return;
+    finished = true;
+    if (observer) observer.disconnect();
+    if (frame) cancelAnimationFrame(frame);
+    clearInterval(interval);
+    clearTimeout(timer);
+    done(value);
+}
+function check() {
+    if (finished) return;
+    var value = test();
+    if (value) finish(value);
+}
+function onFrame() {
+    check();
+    if (!finished) frame = requestAnimationFrame(onFrame);
+}
+
+check();
+if (!finished) {
+    observer = new MutationObserver(check);
+    observer.observe(document, {childList: true, subtree: true, attributes: true});
+    frame = requestAnimationFrame(onFrame);        // CSSの表示切り替え（属性変化なし）用
+    interval = setInterval(check, 100);            // 非表示タブで rAF が止まる場合の保険
+    timer = setTimeout(function () { finish(null); }, timeoutMs);
+}
+"""
+
+# [読み込み状態, 実行中の通信数（XHR / fetch / jQuery）, 取得済みリソース数]
+# 初回にページへフックを入れる（ページ遷移で消えるので、次の確認で入れ直す）
+_NETWORK_STATE_SCRIPT = """
+var net = window.__homisNetwork;
+if (!net) {
+    net = window.__homisNetwork = {inflight: 0, resources: 0, observed: false};
+    var finished = function (request) {
+        if (!request.__homisDone) { request.__homisDone = true; net.inflight--; }
+    };
+    var send = XMLHttpRequest.prototype.send;
+    XMLHttpRequest.prototype.send = function () {
+        var request = this;
+        net.inflight++;
+        request.addEventListener('loadend', function () { finished(request); });
+        try { return send.apply(request, arguments); } catch (e) { finished(request); throw e; }
+    };
+    if (window.fetch) {
+        var fetch = window.fetch;
+        window.fetch = function () {
+            net.inflight++;
+            var done = function () { net.inflight--; };
+            try {
+                var promise = fetch.apply(this, arguments);
+            } catch (e) { done(); throw e; }
+            return promise.then(function (r) { done(); return r; }, function (e) { done(); throw e; });
+        };
+    }
+    // 記録の上限（既定250件）に達しても数え続ける
+    net.resources = performance.getEntriesByType('resource').length;
+    try {
+        new PerformanceObserver(function (list) { net.resources += list.getEntries().length; })
+            .observe({type: 'resource'});
+        net.observed = true;
+    } catch (e) {
+        try { performance.setResourceTimingBufferSize(100000); } catch (ignored) {}
+    }
+}
+return [document.readyState,
+        net.inflight + (window.jQuery ? window.jQuery.active : 0),
+        net.observed ? net.resources : performance.getEntriesByType('resource').length];
+"""
+
+
+class SessionExpired(Exception):
+    """操作中にログイン画面へ戻された（セッション切れ）"""
+
 
 class BrowserActions:
     """ブラウザ操作アクションクラス"""
     
-    def __init__(self, driver, timeout: int = 10):
+    def __init__(self, driver, timeout: int = 10, detect_login: bool = False,
+                 wait_mode: str = DEFAULT_WAIT_MODE):
+        """
+        Args:
+            detect_login: True=画面遷移後・失敗時にログイン画面か確認し、SessionExpired を送出
+            wait_mode: 要素待ちの方式（observer=ブラウザ内で監視 / polling=WebDriverWait）
+        """
         self.driver = driver
         self.timeout = timeout
+        self.detect_login = detect_login
+        self.wait_mode = wait_mode
+        self._script_timeout = DEFAULT_SCRIPT_TIMEOUT
     
     def execute_action(self, action: Dict[str, Any], data: Dict[str, Any]) -> bool:
         """
@@ -35,6 +202,9 @@ class BrowserActions:
         
         Returns:
             bool: 成功/失敗
+        
+        Raises:
+            SessionExpired: ログイン画面に戻された（detect_login=True の場合のみ）
         """
         action_type = action.get("action", "")
         name = action.get("name", action_type)
@@ -62,6 +232,8 @@ class BrowserActions:
                 self._action_navigate(value)
             elif action_type == "wait":
                 time.sleep(action.get("ms", 1000) / 1000)
+            elif action_type == "wait_for":
+                self._wait_condition(action, data)
             else:
                 logger.warning(f"未対応のアクション: {action_type}")
                 return False
@@ -71,18 +243,96 @@ class BrowserActions:
             for i in range(alert_count):
                 self._confirm_alert()
             
+            # 条件待ち（固定の wait_after より先に、条件が満たされた時点で進む）
+            if action.get("wait_until"):
+                self._wait_condition(action["wait_until"], data)
+            
             # 待機
             wait_after = action.get("wait_after", 0)
             if wait_after > 0:
                 time.sleep(wait_after / 1000)
             
+            # 画面遷移後にログイン画面へ戻されていないか
+            if action_type in NAVIGATING_ACTIONS and self._session_expired():
+                raise SessionExpired(f"{name} の後にログイン画面へ戻されました")
+            
             logger.info(f"✅ {name} 完了")
             return True
             
+        except SessionExpired:
+            raise
         except Exception as e:
+            # 要素が見つからない原因がセッション切れ（ログイン画面）なら呼び出し元で再ログイン
+            if self._session_expired():
+                raise SessionExpired(f"{name} の実行中にログイン画面へ戻されました") from e
             logger.error(f"❌ {name} 失敗: {e}")
             return False
     
+    def _wait_condition(self, condition: Dict[str, Any], data: Dict[str, Any]):
+        """
+        条件が満たされるまで待つ（WAIT_CONDITIONS のうち最初に見つかった1つ）
+        
+        Raises:
+            TimeoutException: timeout ミリ秒以内に満たされなかった
+        """
+        kind = next((key for key in WAIT_CONDITIONS if condition.get(key)), None)
+        if kind is None:
+            raise ValueError(f"待機条件がありません（{' / '.join(WAIT_CONDITIONS)} のいずれかを指定）")
+        target = condition[kind]
+        if isinstance(target, str):
+            target = self._expand_variables(target, data)
+        by = By.XPATH if condition.get("selector_type") == "xpath" else By.CSS_SELECTOR
+        
+        timeout = condition.get("timeout", self.timeout * 1000) / 1000
+        started = time.time()
+        if kind in ("visible", "gone"):
+            self._await_element(by, target, kind, timeout)
+            logger.info(f"⏱ 条件成立: {kind} {target}（{time.time() - started:.1f}秒）")
+            return
+        
+        if kind == "url_contains":
+            predicate = EC.url_contains(target)
+        elif kind == "alert":
+            predicate = EC.alert_is_present()
+        elif kind == "text":
+            predicate = lambda d: d.execute_script(
+                "return !!document.body && document.body.innerText.indexOf(arguments[0]) >= 0;", target
+            )
+        else:
+            predicate = self._network_idle(condition.get("idle_ms", DEFAULT_IDLE_MS))
+        
+        WebDriverWait(self.driver, timeout, poll_frequency=WAIT_POLL_SECONDS).until(
+            predicate, message=f"{kind}: {target} を{timeout:.0f}秒待ちましたが満たされません"
+        )
+        logger.info(f"⏱ 条件成立: {kind} {target if target is not True else ''}（{time.time() - started:.1f}秒）")
+    
+    @staticmethod
+    def _network_idle(idle_ms: float):
+        """読み込み完了かつ通信が idle_ms ミリ秒止まったら真になる条件"""
+        state = {"count": None, "since": 0.0}
+        
+        def idle(driver) -> bool:
+            ready, active, count = driver.execute_script(_NETWORK_STATE_SCRIPT)
+            now = time.time()
+            if ready != "complete" or active:
+                state["count"] = None
+                return False
+            if count != state["count"]:
+                state.update(count=count, since=now)
+                return False
+            return now - state["since"] >= idle_ms / 1000
+        
+        return idle
+    
+    def _session_expired(self) -> bool:
+        """ログイン画面が表示されているか（URLにloginを含む。homis_writerと同じ判定）"""
+        if not self.detect_login:
+            return False
+        try:
+            return "login" in self.driver.current_url.lower()
+        except WebDriverException:
+            return False
+    
     def _expand_variables(self, text: str, data: Dict[str, Any]) -> str:
         """変数を展開 {varName} -> data[varName]"""
         if not text:
@@ -98,34 +348,56 @@ class BrowserActions:
     
     def _find_element(self, selector: str, clickable: bool = False, selector_type: str = "css"):
         """要素を検索（XPath対応）"""
-        wait = WebDriverWait(self.driver, self.timeout)
-        
-        # XPathの場合
-        if selector_type == "xpath":
-            if clickable:
-                return wait.until(EC.element_to_be_clickable((By.XPATH, selector)))
-            else:
-                return wait.until(EC.presence_of_element_located((By.XPATH, selector)))
+        by = By.XPATH if selector_type == "xpath" else By.CSS_SELECTOR
         
         # :contains() 疑似セレクタ対応
-        if ":contains(" in selector:
+        if by == By.CSS_SELECTOR and ":contains(" in selector:
             import re
             match = re.match(r"(.+):contains\('(.+)'\)", selector)
             if match:
                 tag = match.group(1)
                 text = match.group(2)
-                xpath = f"//{tag}[contains(text(), '{text}')]"
-                
-                if clickable:
-                    return wait.until(EC.element_to_be_clickable((By.XPATH, xpath)))
-                else:
-                    return wait.until(EC.presence_of_element_located((By.XPATH, xpath)))
-        
-        # 通常のCSSセレクタ
-        if clickable:
-            return wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, selector)))
-        else:
-            return wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, selector)))
+                by, selector = By.XPATH, f"//{tag}[contains(text(), '{text}')]"
+        
+        return self._await_element(by, selector, "clickable" if clickable else "present", self.timeout)
+    
+    def _await_element(self, by: str, selector: str, mode: str, timeout: float):
+        """
+        要素が mode（present / visible / clickable / gone）になるまで待つ
+        
+        Returns:
+            要素（gone の場合は True）
+        
+        Raises:
+            TimeoutException: timeout 秒以内にならなかった
+        """
+        deadline = time.time() + timeout
+        if self.wait_mode == WAIT_MODE_OBSERVER:
+            if timeout + SCRIPT_TIMEOUT_MARGIN > self._script_timeout:
+                self._script_timeout = timeout + SCRIPT_TIMEOUT_MARGIN
+                self.driver.set_script_timeout(self._script_timeout)
+            try:
+                value = self.driver.execute_async_script(
+                    _OBSERVE_SCRIPT, selector, by == By.XPATH, mode, int(timeout * 1000)
+                )
+            except TimeoutException:
+                raise
+            except WebDriverException as e:
+                # ページ遷移などでスクリプトが中断された → 残り時間は従来のポーリングで待つ
+                logger.debug(f"ブラウザ内の要素待ちが中断されました（ポーリングで継続）: {e}")
+            else:
+                if value:
+                    return value
+                raise TimeoutException(f"{selector} を{timeout:.0f}秒待ちましたが {mode} になりません")
+        
+        conditions = {
+            "present": EC.presence_of_element_located,
+            "visible": EC.visibility_of_element_located,
+            "clickable": EC.element_to_be_clickable,
+            "gone": EC.invisibility_of_element_located,
+        }
+        remaining = max(0.0, deadline - time.time())
+        return WebDriverWait(self.driver, remaining).until(conditions[mode]((by, selector)))
     
     def _action_click(self, selector: str, selector_type: str = "css", text_contains: str = ""):
         """クリックアクション（ラベルテキスト検索対応）"""
@@ -213,3 +485,67 @@ class BrowserActions:
             logger.info("アラートでOKをクリック")
         except NoAlertPresentException:
             pass
+
+
+# === ベンチマーク（observer / polling の比較） ===
+if __name__ == "__main__":
+    import sys
+    import math
+    import random
+    import threading
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+    from urllib.parse import urlparse, parse_qs
+
+    from browser_session import BrowserSession
+
+    logging.basicConfig(level=logging.WARNING)
+    count = int(sys.argv[2]) if len(sys.argv) == 3 and sys.argv[1] == "--bench" else 30
+
+    # モックページ: ボタンを押すと delay ミリ秒後に #target が現れる（Homisのダイアログ表示相当）
+    class MockPage(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            delay = int(parse_qs(urlparse(self.path).query).get("delay", ["200"])[0])
+            body = (
+                "<!doctype html><html><body>"
+                "<button id='open' onclick=\"setTimeout(function () {"
+                "var d = document.createElement('div'); d.id = 'target'; d.textContent = 'ok';"
+                f"document.body.appendChild(d); }}, {delay})\">open</button>"
+                "</body></html>"
+            ).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockPage)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}/"
+
+    session = BrowserSession({}, headless=True)
+    driver = session.get_driver()
+    delays = [random.randint(100, 600) for _ in range(count)]
+    try:
+        for mode in (WAIT_MODE_POLLING, WAIT_MODE_OBSERVER):
+            actions = BrowserActions(driver, wait_mode=mode)
+            overshoots = []
+            commands = 0
+            for delay in delays:
+                driver.get(f"{base}?delay={delay}")
+                driver.find_element(By.ID, "open").click()
+                session.commands.take()
+                started = time.perf_counter()
+                actions._find_element("#target")
+                overshoots.append((time.perf_counter() - started) * 1000 - delay)
+                commands += sum(count for count, _ in session.commands.take().values())
+            overshoots.sort()
+            print(f"{mode:8s} {count}回: 出現から検出までの遅れ "
+                  f"p50={overshoots[len(overshoots) // 2]:.0f}ms p95={overshoots[math.ceil(len(overshoots) * 0.95) - 1]:.0f}ms "
+                  f"平均={sum(overshoots) / len(overshoots):.0f}ms "
+                  f"WebDriverコマンド={commands / count:.1f}回/待ち")
+    finally:
+        session.close()
+        server.shutdown()
@@ -0,0 +1,522 @@
+# -*- coding: utf-8 -*-
+"""
+ブラウザセッション管理
+======================
+Chrome（Selenium WebDriver）をジョブ間で使い回し、
+メモリ使用量・処理件数がしきい値を超えたらブラウザだけを再起動（リサイクル）する。
+
+v1.0.0 - 新規作成 (2026/10/18)
+  - 旧: ジョブごとにChrome起動→終了、メモリ増加は日次リスタート(0:00)頼み
+  - 新: 1つのChromeを使い回し、しきい値超過時はジョブの合間にバックグラウンドで再起動
+v1.1.0 - WebDriverコマンド（chromedriverへのHTTP往復）の回数・時間を種類別に集計 (2026/10/18)
+  - driver.execute を包んで数えるため、BrowserActions / TemplateEngine / clipboard_utils の
+    どこから呼んだコマンドも（要素の .click() / .text 等も）漏れなく数えられる
+  - session.commands.take() で前回からの集計を取り出す（監視側がジョブごとに呼ぶ）
+v1.2.0 - ジョブごとのブラウザコンテキスト（シークレットウィンドウ相当）で分離 (2026/10/18)
+  - 旧: 1つのタブを使い続けるため、前の患者のモーダル・入力途中のフォーム・アラートが
+        次のジョブに残ることがある（分離するにはChromeごと再起動するしかない）
+  - 新: new_context() でCDPの Target.createBrowserContext から新しいコンテキストとタブを作り、
+        前のコンテキストは破棄する（Chromeのプロセスとキャッシュは共有したまま、数十ミリ秒）
+        ログインCookieは前のコンテキストから Storage.getCookies / setCookies で明示的に引き継ぐ
+        （リサイクルでChromeを起動し直しても引き継ぐ）
+        CDPが使えない場合はそのChromeでは従来どおり1つのタブで動かす
+v1.3.0 - 永続プロファイル（chrome_profile.py）に対応 (2026/10/18)
+  - chrome_profile.enabled のとき STATE_DIR/chrome_profiles のスロットで起動し、
+    HTTPキャッシュ・Cookieをアプリの再起動後も使う（スロットはアプリ終了まで保持）
+  - job_isolation=context では、コンテキストのCookieをプロファイル側（既定のコンテキスト）にも
+    書き戻し、次回起動時の最初のコンテキストに引き継ぐ（有効期限付きのCookieのみ残る）
+v1.4.0 - 起動済みChromeへの再接続（chrome_supervisor.py）に対応 (2026/10/18)
+  - chrome_attach.enabled のとき Chrome を切り離して起動し、debuggerAddress で接続する
+  - close()（アプリ終了・日次リスタート・Homis停止中）は切断だけで Chrome は残し、
+    次のプロセスが接続し直す。接続直後にウィンドウ取得・JavaScript実行で健全性を確認し、
+    応答しなければその Chrome を終了して起動し直す
+  - リサイクル・close(keep_browser=False) では Chrome ごと終了する
+v1.5.0 - 最後に使った時刻（last_used）を記録 (2026/10/18)
+  - アイドル時の解放（browser_warmup.py）の判定用。事前起動は job_finished(count=False) で件数に数えない
+v1.5.1 - セッションCookieの引き継ぎ修正・job_isolation の既定を tab に戻す (2026/10/18)
+  - 旧: Storage.getCookies がセッションCookieに返す expires=-1 をそのまま setCookies に渡し、
+        新しいコンテキストでは期限切れ扱いになってログインCookie（セッションCookie）が消えていた
+  - 新: session=true・expires<0 のCookieは expires を外して（セッションCookieとして）引き継ぐ
+        2つ目以降のコンテキストでログインし直さずに済むことを確認できるまで、既定は tab（従来の1タブ）
+
+設定（config.json）:
+    "browser_recycle": {
+        "max_memory_mb": 1500,   # chromedriver + Chrome 全プロセスのRSS合計（MB）
+        "max_jobs": 50           # 起動後この件数を処理したら再起動
+    },
+    "job_isolation": "tab",      # tab=1つのタブを使い続ける（既定） / context=ジョブごとに新しいコンテキスト
+    "chrome_profile": {"enabled": false, ...}   # chrome_profile.py 参照（アプリ再起動で反映）
+    "chrome_attach": {"enabled": false, ...}    # chrome_supervisor.py 参照（アプリ再起動で反映）
+
+使い方:
+    from browser_session import BrowserSession
+
+    session = BrowserSession(config, headless=True)
+    driver = session.get_driver()   # 未起動なら起動
+    session.new_context()           # 新しいコンテキストのタブに切り替え（job_isolation=context）
+    ...ジョブ実行...
+    session.job_finished()          # しきい値チェック → 必要ならリサイクル
+    session.close()                 # アプリ終了時（chrome_attach 有効時は切断のみ）
+
+    counts = session.commands.take()  # {コマンド名: (回数, 秒)}（前回 take() 以降）
+"""
+
+import time
+import logging
+import threading
+from typing import Dict, Any, List, Optional, Callable, Tuple
+
+from chrome_profile import ProfileSlots
+from chrome_supervisor import ChromeSupervisor
+from paths import STATE_DIR
+
+logger = logging.getLogger(__name__)
+
+# デフォルトのリサイクルしきい値
+DEFAULT_MAX_MEMORY_MB = 1500
+DEFAULT_MAX_JOBS = 50
+
+ISOLATION_CONTEXT = "context"
+ISOLATION_TAB = "tab"
+DEFAULT_ISOLATION = ISOLATION_TAB
+
+# コンテキスト間で引き継ぐCookieの項目（Storage.setCookies が受け付けるもの）
+_COOKIE_FIELDS = ("name", "value", "domain", "path", "secure", "httpOnly", "sameSite", "expires")
+
+
+def _transferable_cookies(cookies: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Storage.getCookies の結果を Storage.setCookies に渡せる形にする
+    セッションCookie（session=true / expires=-1）は expires を外す（付けたままだと期限切れとして捨てられる）
+    """
+    transferable = []
+    for cookie in cookies:
+        item = {key: cookie[key] for key in _COOKIE_FIELDS if key in cookie}
+        if cookie.get("session") or item.get("expires", 0) < 0:
+            item.pop("expires", None)
+        transferable.append(item)
+    return transferable
+
+# 新しいタブがWebDriverのウィンドウ一覧に現れるまで待つ秒数
+CONTEXT_TAB_TIMEOUT = 5.0
+
+
+class CommandCounter:
+    """WebDriverコマンドの回数・所要時間をコマンド種類別に数える（スレッドセーフ）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: Dict[str, list] = {}   # {コマンド名: [回数, 秒]}
+
+    def attach(self, driver):
+        """driver.execute を数える版に差し替える（要素の操作も driver.execute を通る）"""
+        execute = driver.execute
+
+        def counted_execute(driver_command, params=None):
+            started = time.perf_counter()
+            try:
+                return execute(driver_command, params)
+            finally:
+                self.record(driver_command, time.perf_counter() - started)
+
+        driver.execute = counted_execute
+
+    def record(self, command: str, seconds: float):
+        with self._lock:
+            item = self._counts.setdefault(command, [0, 0.0])
+            item[0] += 1
+            item[1] += seconds
+
+    def take(self) -> Dict[str, Tuple[int, float]]:
+        """前回の take() 以降の集計を返してリセット"""
+        with self._lock:
+            counts, self._counts = self._counts, {}
+        return {command: (count, seconds) for command, (count, seconds) in counts.items()}
+
+
+class BrowserSession:
+    """Chromeを1つ保持し、ジョブ間で使い回すセッション"""
+
+    def __init__(self, config: Dict[str, Any], headless: bool = False,
+                 on_state: Optional[Callable[[str], None]] = None):
+        """
+        Args:
+            config: 設定辞書（browser_recycle を参照）
+            headless: True=非表示モード
+            on_state: 状態が変わったときに呼ばれるコールバック（ダッシュボード用）
+        """
+        self.config = config
+        self.headless = headless
+        self.driver = None
+        self.generation = 0          # 起動ごとに+1（リサイクル検知用）
+        self.verified: Dict[str, int] = {}  # {テンプレート名: 画面構成を確認済みの世代}
+        self.commands = CommandCounter()     # WebDriverコマンドの集計（起動し直しても引き継ぐ）
+        self.current_page: Optional[str] = None  # 直前のジョブが正常に終わったページ（再利用の判定用）
+        self.isolation = config.get("job_isolation", DEFAULT_ISOLATION)
+        self.context_id: Optional[str] = None    # 使用中のブラウザコンテキスト（なければ最初のタブ）
+        self._base_handle: Optional[str] = None  # 起動時のタブ（コンテキスト破棄時に戻る先）
+        self._contexts_supported = True
+        self._cookies: List[Dict[str, Any]] = []  # 次のコンテキストに引き継ぐCookie
+        self.jobs_since_launch = 0
+        self.launched_at: Optional[float] = None
+        self.last_used: Optional[float] = None   # 最後にジョブ（事前起動を含む）を終えた時刻
+        self.state = "未起動"
+        self._unhealthy_reason = ""  # ジョブ中にブラウザ異常を検知した場合の理由
+        self._on_state = on_state
+        # get_driver / リサイクル / 終了 を直列化（リサイクル中のジョブは起動完了まで待つ）
+        self._lock = threading.RLock()
+
+        recycle = config.get("browser_recycle", {})
+        self.max_memory_mb = recycle.get("max_memory_mb", DEFAULT_MAX_MEMORY_MB)
+        self.max_jobs = recycle.get("max_jobs", DEFAULT_MAX_JOBS)
+
+        profile = config.get("chrome_profile", {})
+        self.attach = config.get("chrome_attach", {})
+        self.profiles: Optional[ProfileSlots] = None   # 永続プロファイル（無効ならNone）
+        self.supervisor: Optional[ChromeSupervisor] = None  # 切り離して起動したChrome（接続時のみ）
+        # 再接続はリモートデバッグに専用プロファイルが必要なため、スロットを必ず使う
+        if profile.get("enabled") or self.attach.get("enabled"):
+            self.profiles = ProfileSlots(
+                STATE_DIR / "chrome_profiles",
+                **{key: profile[key] for key in ("slots", "max_size_mb", "max_age_days") if key in profile},
+            )
+
+    # ------------------------------------------------------------
+    # 起動・終了
+    # ------------------------------------------------------------
+
+    def get_driver(self):
+        """WebDriverを返す（未起動なら起動）"""
+        with self._lock:
+            if self.driver is None:
+                self._launch()
+            self._set_state("実行中")
+            return self.driver
+
+    def _launch(self):
+        """Chromeを起動"""
+        from selenium import webdriver
+        from selenium.webdriver.chrome.service import Service
+        from selenium.webdriver.chrome.options import Options
+        from webdriver_manager.chrome import ChromeDriverManager
+
+        self._set_state("起動中")
+        profile_dir = self.profiles.acquire() if self.profiles else None
+        service = Service(ChromeDriverManager().install())
+
+        if self.attach.get("enabled") and profile_dir is not None:
+            self.supervisor = ChromeSupervisor(profile_dir, self.attach.get("chrome_path", ""))
+            reused = self.supervisor.ensure(self.headless)
+            if not reused:
+                self.profiles.trim(profile_dir)   # 起動済みChromeの使用中のキャッシュは消さない
+
+            def connect():
+                options = Options()
+                options.add_experimental_option("debuggerAddress", self.supervisor.address)
+                return webdriver.Chrome(service=service, options=options)
+
+            try:
+                self.driver = connect()
+            except Exception:
+                if not reused:
+                    raise
+                self.driver = None
+            if reused and (self.driver is None or not self._attached_healthy()):
+                logger.warning("⚠️ 起動済みのChromeが応答しないため、起動し直します")
+                if self.driver is not None:
+                    try:
+                        self.driver.quit()
+                    except Exception:
+                        pass
+                self.supervisor.stop()
+                self.supervisor.ensure(self.headless)
+                self.driver = connect()
+        else:
+            options = Options()
+            if self.headless:
+                options.add_argument("--headless")
+            options.add_argument("--no-sandbox")
+            options.add_argument("--disable-dev-shm-usage")
+            options.add_argument("--window-size=1200,900")
+            if profile_dir is not None:
+                self.profiles.trim(profile_dir)
+                options.add_argument(f"--user-data-dir={profile_dir}")
+                options.add_argument("--hide-crash-restore-bubble")   # 前回の強制終了後の「復元」表示を出さない
+            self.driver = webdriver.Chrome(service=service, options=options)
+
+        self.commands.attach(self.driver)
+        self.generation += 1
+        self.current_page = None
+        self.context_id = None
+        self._base_handle = self.driver.current_window_handle
+        self._contexts_supported = True
+        if profile_dir is not None and not self._cookies:
+            self._load_profile_cookies()
+        self.jobs_since_launch = 0
+        self.launched_at = time.time()
+        self.last_used = self.launched_at
+        self._set_state("待機")
+
+        logger.info(f"Chromeブラウザを起動しました（headless={self.headless}, 世代={self.generation}）")
+
+    def _attached_healthy(self) -> bool:
+        """再接続した Chrome が操作できるか（ウィンドウ取得・JavaScript実行・アラートなし）"""
+        try:
+            return bool(self.driver.window_handles) and \
+                self.driver.execute_script("return document.readyState") is not None
+        except Exception as e:
+            logger.debug(f"再接続したChromeの確認失敗: {e}")
+            return False
+
+    def _quit(self, keep_browser: bool = False):
+        """
+        Chromeを終了（ロック取得済みで呼ぶ）
+        keep_browser=True なら、切り離して起動した Chrome は終了せずに切断だけ行う
+        """
+        if self.driver:
+            self._save_cookies()   # 起動し直した後の最初のコンテキストに引き継ぐ
+            try:
+                # debuggerAddress で接続した場合、quit() は切断のみ（Chromeは終了しない）
+                self.driver.quit()
+            except Exception as e:
+                logger.warning(f"ブラウザ終了時にエラー: {e}")
+            finally:
+                self.driver = None
+                self.launched_at = None
+            if self.supervisor is None:
+                logger.info("ブラウザを終了しました")
+        if self.supervisor is not None:
+            if keep_browser:
+                logger.info(f"Chromeから切断しました（Chromeは起動したまま: PID {self.supervisor.pid}）")
+            else:
+                self.supervisor.stop()
+                logger.info("ブラウザを終了しました")
+            self.supervisor = None
+
+    def close(self, timeout: Optional[float] = None, keep_browser: bool = True) -> bool:
+        """
+        ブラウザを終了
+
+        Args:
+            timeout: ジョブ実行中の場合に待つ最大秒数（None=終わるまで待つ）
+            keep_browser: chrome_attach 有効時、Chrome を残して切断だけ行う（次のプロセスが再接続）
+
+        Returns:
+            bool: 終了できたか（timeout内にロックを取れなければFalse）
+        """
+        if not self._lock.acquire(timeout=-1 if timeout is None else timeout):
+            logger.warning("⚠️ ジョブ実行中のためブラウザを終了できませんでした")
+            return False
+        try:
+            self._quit(keep_browser=keep_browser)
+            if self.profiles is not None:
+                self.profiles.release()   # リサイクルでは保持し、終了時だけ返す
+            self._set_state("停止")
+            return True
+        finally:
+            self._lock.release()
+
+    # ------------------------------------------------------------
+    # ブラウザコンテキスト（ジョブ間の分離）
+    # ------------------------------------------------------------
+
+    def new_context(self) -> bool:
+        """
+        新しいブラウザコンテキストを作ってそのタブに切り替え、前のコンテキストを破棄する
+        （ログインCookieは引き継ぐ。job_isolation=tab・CDP非対応なら何もしない）
+
+        Returns:
+            bool: 新しいコンテキストに切り替えたらTrue
+        """
+        with self._lock:
+            if self.driver is None:
+                return False
+            if self.isolation != ISOLATION_CONTEXT or not self._contexts_supported:
+                self._dispose_context()   # tab に変更された場合は最初のタブに戻る
+                return False
+
+            started = time.perf_counter()
+            self._dispose_context()
+            try:
+                self.context_id = self.driver.execute_cdp_cmd(
+                    "Target.createBrowserContext", {"disposeOnDetach": True}
+                )["browserContextId"]
+                if self._cookies:
+                    self.driver.execute_cdp_cmd(
+                        "Storage.setCookies",
+                        {"cookies": self._cookies, "browserContextId": self.context_id},
+                    )
+                target_id = self.driver.execute_cdp_cmd(
+                    "Target.createTarget", {"url": "about:blank", "browserContextId": self.context_id}
+                )["targetId"]
+                self._switch_to(target_id)
+            except Exception as e:
+                logger.warning(f"⚠️ ブラウザコンテキストを作成できません（このChromeでは1つのタブで処理）: {e}")
+                self._contexts_supported = False
+                self._dispose_context()
+                return False
+
+            self.current_page = None
+            logger.info(
+                f"🧼 新しいブラウザコンテキストで実行（Cookie {len(self._cookies)}件を引き継ぎ、"
+                f"{(time.perf_counter() - started) * 1000:.0f}ms）"
+            )
+            return True
+
+    def _switch_to(self, target_id: str):
+        """CDPで作ったタブにWebDriverを切り替える（ウィンドウハンドル = ターゲットID）"""
+        deadline = time.time() + CONTEXT_TAB_TIMEOUT
+        while target_id not in self.driver.window_handles:
+            if time.time() >= deadline:
+                raise TimeoutError(f"新しいタブが見つかりません: {target_id}")
+            time.sleep(0.05)
+        self.driver.switch_to.window(target_id)
+
+    def _save_cookies(self):
+        """使用中のコンテキストのCookieを控える（次のコンテキストに引き継ぐ）"""
+        if self.context_id is None:
+            return
+        try:
+            cookies = self.driver.execute_cdp_cmd(
+                "Storage.getCookies", {"browserContextId": self.context_id}
+            )["cookies"]
+        except Exception as e:
+            logger.debug(f"Cookieの取得失敗: {e}")
+            return
+        self._cookies = _transferable_cookies(cookies)
+        if self.profiles is not None and self._cookies:
+            # 既定のコンテキストに書き戻す（プロファイルに保存され、アプリ再起動後も使える）
+            try:
+                self.driver.execute_cdp_cmd("Storage.setCookies", {"cookies": self._cookies})
+            except Exception as e:
+                logger.debug(f"プロファイルへのCookie保存失敗: {e}")
+
+    def _load_profile_cookies(self):
+        """前回までのCookie（プロファイルに保存されたもの）を最初のコンテキストに引き継ぐ"""
+        try:
+            cookies = self.driver.execute_cdp_cmd("Storage.getCookies", {})["cookies"]
+        except Exception as e:
+            logger.debug(f"プロファイルのCookie取得失敗: {e}")
+            return
+        self._cookies = _transferable_cookies(cookies)
+
+    def _dispose_context(self):
+        """使用中のコンテキストを破棄して最初のタブに戻る（ロック取得済みで呼ぶ）"""
+        if self.context_id is None:
+            return
+        self._save_cookies()
+        context_id, self.context_id = self.context_id, None
+        self.current_page = None
+        try:
+            self.driver.switch_to.window(self._base_handle)
+            self.driver.execute_cdp_cmd("Target.disposeBrowserContext", {"browserContextId": context_id})
+        except Exception as e:
+            # 破棄できないコンテキストが残るとメモリが増えるため、次の区切りでリサイクル
+            logger.warning(f"⚠️ ブラウザコンテキストを破棄できません: {e}")
+            self.mark_unhealthy(f"コンテキスト破棄失敗: {e}")
+
+    # ------------------------------------------------------------
+    # リサイクル
+    # ------------------------------------------------------------
+
+    def job_finished(self, count: bool = True):
+        """
+        1ジョブ終了を記録し、しきい値を超えていればバックグラウンドでリサイクル
+        （count=False: 事前起動など、処理件数に数えない使用）
+        """
+        with self._lock:
+            if count:
+                self.jobs_since_launch += 1
+            self.last_used = time.time()
+            self._set_state("待機" if self.driver else "停止")
+            reason = self._recycle_reason()
+
+        if reason:
+            logger.info(f"♻️ ブラウザをリサイクルします: {reason}")
+            threading.Thread(target=self.recycle, args=(reason,), daemon=True).start()
+
+    def _recycle_reason(self) -> str:
+        """リサイクルが必要なら理由を返す（不要なら空文字）"""
+        if self.driver is None:
+            return ""
+        if self._unhealthy_reason:
+            return f"異常検知: {self._unhealthy_reason}"
+        if self.max_jobs and self.jobs_since_launch >= self.max_jobs:
+            return f"処理件数 {self.jobs_since_launch}件 ≥ {self.max_jobs}件"
+        if self.max_memory_mb:
+            memory_mb = self.memory_mb()
+            if memory_mb is not None and memory_mb >= self.max_memory_mb:
+                return f"メモリ {memory_mb:.0f}MB ≥ {self.max_memory_mb}MB"
+        return ""
+
+    def apply_config(self, config: Dict[str, Any]):
+        """
+        設定変更を反映（しきい値は即時、headless変更時はバックグラウンドでリサイクル）
+        """
+        reason = ""
+        with self._lock:
+            self.config = config
+            recycle = config.get("browser_recycle", {})
+            self.max_memory_mb = recycle.get("max_memory_mb", DEFAULT_MAX_MEMORY_MB)
+            self.max_jobs = recycle.get("max_jobs", DEFAULT_MAX_JOBS)
+            self.isolation = config.get("job_isolation", DEFAULT_ISOLATION)   # 次のジョブから
+            headless = config.get("headless", False)
+            if headless != self.headless:
+                self.headless = headless
+                if self.driver is not None:
+                    reason = f"headless={headless} に変更"
+
+        if reason:
+            logger.info(f"♻️ ブラウザをリサイクルします: {reason}")
+            threading.Thread(target=self.recycle, args=(reason,), daemon=True).start()
+
+    def mark_unhealthy(self, reason: str):
+        """ジョブ中のブラウザ異常を記録（次の job_finished() でリサイクルされる）"""
+        self._unhealthy_reason = reason[:100]
+
+    def recycle(self, reason: str = ""):
+        """ブラウザを終了して起動し直す（次のジョブ用に事前起動しておく）"""
+        with self._lock:
+            self._set_state("リサイクル中")
+            self._unhealthy_reason = ""
+            self._quit()
+            try:
+                self._launch()
+                logger.info(f"♻️ ブラウザのリサイクル完了（{reason}）")
+            except Exception as e:
+                # 起動失敗時は次の get_driver() で再試行
+                logger.error(f"ブラウザ再起動エラー: {e}")
+                self._set_state("停止")
+
+    def memory_mb(self) -> Optional[float]:
+        """chromedriver と配下のChromeプロセス（切り離したChromeを含む）のRSS合計（MB）。取得できなければNone"""
+        try:
+            import psutil
+            pids = [self.driver.service.process.pid]
+            if self.supervisor is not None and self.supervisor.pid:
+                pids.append(self.supervisor.pid)   # 切り離したChromeは chromedriver の配下にない
+            total = 0
+            for pid in pids:
+                root = psutil.Process(pid)
+                total += root.memory_info().rss
+                for child in root.children(recursive=True):
+                    try:
+                        total += child.memory_info().rss
+                    except (psutil.NoSuchProcess, psutil.AccessDenied):
+                        pass
+            return total / (1024 * 1024)
+        except Exception as e:
+            logger.debug(f"ブラウザのメモリ取得失敗: {e}")
+            return None
+
+    # ------------------------------------------------------------
+    # 状態通知
+    # ------------------------------------------------------------
+
+    def _set_state(self, state: str):
+        self.state = state
+        if self._on_state:
+            try:
+                self._on_state(state)
+            except Exception:
+                pass
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+業務時間に合わせたブラウザの事前起動・アイドル時の解放
+======================================================
+業務開始の少し前に Chrome を起動してログインまで済ませ、
+使われない時間が続いたら Chrome を終了してメモリを返す。
+
+v1.0.0 - 新規作成 (2026/10/18)
+  - 旧: 朝の最初のジョブが Chrome の起動とログインを待つ
+        夜間・休憩中も使われない Chrome が数百MBを保持したまま
+  - 新: work_start の prewarm_minutes 分前から work_end まで（業務時間）、
+        Chrome が起動していなければ監視ループの合間に起動・ログインしておく
+        最後のジョブから idle_release_minutes 分使われなければ Chrome を終了する
+        （業務時間内に解放した場合は、次の業務開始まで事前起動しない。
+          その間に来たジョブは従来どおり必要になった時点で起動する）
+v1.0.1 - 事前起動は業務時間の判定だけで決める・既定で無効 (2026/10/18)
+  - ジョブの到着・書き込み完了待ちのファイルでは事前起動しない
+    （ジョブ自身が起動するため、監視ループで先に起動すると同じ起動を二重に待つだけ）
+  - 効果を本番で確認するまで enabled の既定は false（オプトイン）
+
+設定（config.json）:
+    "browser_warmup": {
+        "enabled": false,             # true で有効（既定は無効）
+        "work_start": "08:30",
+        "work_end": "19:00",
+        "prewarm_minutes": 10,        # 業務開始の何分前から起動するか
+        "idle_release_minutes": 60    # 0 で解放しない
+    }
+
+使い方:
+    warmup = WarmupSchedule(config["browser_warmup"])
+    if warmup.should_release(now, last_used): ...Chromeを終了... warmup.released(now)
+    if warmup.should_prewarm(now): ...Chromeを起動・ログイン... warmup.succeeded() / failed(now)
+"""
+
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORK_START = "08:30"
+DEFAULT_WORK_END = "19:00"
+DEFAULT_PREWARM_MINUTES = 10
+DEFAULT_IDLE_RELEASE_MINUTES = 60
+RETRY_SECONDS = 300   # 事前起動に失敗したとき、次に試すまでの秒数
+
+
+class WarmupSchedule:
+    """事前起動・解放の判断（時刻の判定だけを行い、ブラウザは操作しない）"""
+
+    def __init__(self, config: Dict[str, Any]):
+        self.enabled = config.get("enabled", False)
+        self.work_start = datetime.strptime(config.get("work_start", DEFAULT_WORK_START), "%H:%M").time()
+        self.work_end = datetime.strptime(config.get("work_end", DEFAULT_WORK_END), "%H:%M").time()
+        self.prewarm_minutes = config.get("prewarm_minutes", DEFAULT_PREWARM_MINUTES)
+        self.idle_release_minutes = config.get("idle_release_minutes", DEFAULT_IDLE_RELEASE_MINUTES)
+        self._released_at: Optional[datetime] = None   # アイドルで解放した時刻
+        self._retry_at: Optional[datetime] = None      # 事前起動の失敗後、次に試す時刻
+
+    def warm_start(self, now: datetime) -> datetime:
+        """その日の事前起動の開始時刻"""
+        return datetime.combine(now.date(), self.work_start) - timedelta(minutes=self.prewarm_minutes)
+
+    def in_hours(self, now: datetime) -> bool:
+        """事前起動の開始時刻〜業務終了の間か"""
+        return self.warm_start(now) <= now < datetime.combine(now.date(), self.work_end)
+
+    def should_prewarm(self, now: datetime) -> bool:
+        """
+        （Chromeが起動していないときに）今起動しておくべきか
+        業務時間内で、今日の事前起動の開始後にアイドル解放していなければ起動する
+        """
+        if not self.enabled:
+            return False
+        if self._retry_at is not None and now < self._retry_at:
+            return False
+        if not self.in_hours(now):
+            return False
+        return self._released_at is None or self._released_at < self.warm_start(now)
+
+    def should_release(self, now: datetime, last_used: Optional[datetime]) -> bool:
+        """（Chromeが起動しているときに）アイドル時間を超えたので終了すべきか"""
+        if not self.enabled or not self.idle_release_minutes or last_used is None:
+            return False
+        return now - last_used >= timedelta(minutes=self.idle_release_minutes)
+
+    def released(self, now: datetime):
+        """アイドル解放したことを記録（業務時間内なら、次のジョブまで事前起動しない）"""
+        self._released_at = now
+
+    def activity(self):
+        """ジョブの到着を記録（ジョブがChromeを起動したので、アイドル解放の記録を消す）"""
+        self._released_at = None
+
+    def succeeded(self):
+        """事前起動の成功を記録"""
+        self._retry_at = None
+
+    def failed(self, now: datetime):
+        """事前起動の失敗を記録（RETRY_SECONDS 後にもう一度試す）"""
+        self._retry_at = now + timedelta(seconds=RETRY_SECONDS)
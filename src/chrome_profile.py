@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""
+Chromeプロファイルの永続化（スロット方式）
+==========================================
+Chromeの user-data-dir を STATE_DIR 配下に残し、HTTPキャッシュ・Cookieを
+アプリの再起動（日次リスタート含む）をまたいで使い回す。
+
+v1.0.0 - 新規作成 (2026/10/18)
+  - 旧: webdriver.Chrome は毎回使い捨てのプロファイルで起動するため、起動のたびに
+        Homisの静的ファイル（JS/CSS/画像）をすべて取り直し、ログイン画面から入り直す
+  - 新: STATE_DIR/chrome_profiles/slot<N> をプロファイルとして使う
+        同じプロファイルを2つのChromeで同時に使えないため、スロットごとにロックファイル
+        （slot<N>.lock: PID・取得時刻）を作って取得する。同じPCで監視を複数動かしても
+        空いているスロットを使い、全スロット使用中なら使い捨てプロファイルで起動する
+        起動前にサイズを確認し、max_size_mb を超えていればキャッシュだけ削除（Cookieは残す）
+        max_age_days 使われていないスロット・スロット数を減らした分は削除する
+
+設定（config.json）:
+    "chrome_profile": {
+        "enabled": false,
+        "slots": 2,            # 同じPCで同時に動かす監視プロセスの数まで
+        "max_size_mb": 500,    # これを超えたら起動前にキャッシュを削除
+        "max_age_days": 14     # これより長く使われていないスロットは削除
+    }
+
+    ※ job_isolation=context の場合、ジョブは別コンテキスト（シークレット相当）で動くため
+       ディスクのHTTPキャッシュは使われない。ログインCookieはプロファイル経由で引き継ぐ
+
+使い方:
+    slots = ProfileSlots(STATE_DIR / "chrome_profiles", slots=2)
+    profile_dir = slots.acquire()      # 空きがなければ None
+    slots.trim(profile_dir)            # Chromeの起動前に（上限超過ならキャッシュ削除）
+    options.add_argument(f"--user-data-dir={profile_dir}")
+    ...
+    slots.release()                    # ブラウザを閉じた後
+"""
+
+import os
+import json
+import time
+import shutil
+import logging
+from pathlib import Path
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SLOTS = 2
+DEFAULT_MAX_SIZE_MB = 500
+DEFAULT_MAX_AGE_DAYS = 14
+
+# サイズ超過時に削除するフォルダ（プロファイル内の相対パス。Cookie・ログイン情報は含まない）
+CACHE_DIRS = (
+    "Default/Cache",
+    "Default/Code Cache",
+    "Default/GPUCache",
+    "Default/Service Worker/CacheStorage",
+    "Default/Service Worker/ScriptCache",
+    "GrShaderCache",
+    "ShaderCache",
+)
+
+
+def _pid_alive(pid: int) -> bool:
+    """同じPC上のプロセスが生きているか"""
+    import psutil
+    return psutil.pid_exists(pid)
+
+
+def dir_size_mb(path: Path) -> float:
+    """フォルダ内のファイルサイズ合計（MB）"""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total / (1024 * 1024)
+
+
+class ProfileSlots:
+    """永続プロファイルのスロット（ロック付き）"""
+
+    def __init__(self, root: Path, slots: int = DEFAULT_SLOTS,
+                 max_size_mb: float = DEFAULT_MAX_SIZE_MB,
+                 max_age_days: float = DEFAULT_MAX_AGE_DAYS):
+        self.root = Path(root)
+        self.slots = slots
+        self.max_size_mb = max_size_mb
+        self.max_age_days = max_age_days
+        self.pid = os.getpid()
+        self.current: Optional[Path] = None   # このプロセスが取得中のスロット
+
+    def _lock_path(self, profile_dir: Path) -> Path:
+        return profile_dir.with_name(profile_dir.name + ".lock")
+
+    def acquire(self) -> Optional[Path]:
+        """
+        空いているスロットを取得し、そのプロファイルフォルダを返す
+        （取得済みならそのまま返す。全スロット使用中ならNone）
+        """
+        if self.current is not None:
+            return self.current
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.cleanup()
+
+        for index in range(1, self.slots + 1):
+            profile_dir = self.root / f"slot{index}"
+            if self._try_lock(profile_dir):
+                self.current = profile_dir
+                profile_dir.mkdir(exist_ok=True)
+                os.utime(profile_dir)   # 最終使用日時（cleanup の判定用）
+                logger.info(f"Chromeプロファイル: {profile_dir}")
+                return profile_dir
+
+        logger.warning(f"⚠️ Chromeプロファイルの空きスロットがありません（{self.slots}個使用中）"
+                       "— 使い捨てのプロファイルで起動します")
+        return None
+
+    def release(self):
+        """取得中のスロットを返す（Chromeを終了した後に呼ぶ）"""
+        if self.current is None:
+            return
+        try:
+            self._lock_path(self.current).unlink()
+        except OSError:
+            pass
+        self.current = None
+
+    def _try_lock(self, profile_dir: Path) -> bool:
+        """ロックファイルを排他作成（終了済みプロセスのロックは取り直す）"""
+        lock_path = self._lock_path(profile_dir)
+        for _ in range(2):
+            try:
+                fd = os.open(str(lock_path), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                if not self._is_stale(lock_path):
+                    return False
+                logger.info(f"終了済みプロセスのプロファイルロックを解除: {lock_path.name}")
+                try:
+                    lock_path.unlink()
+                except OSError:
+                    return False
+                continue
+            except OSError as e:
+                logger.warning(f"⚠️ プロファイルロックを作成できません: {lock_path} - {e}")
+                return False
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"pid": self.pid, "locked_at": time.time()}, f)
+            return True
+        return False
+
+    def _is_stale(self, lock_path: Path) -> bool:
+        """ロックしたプロセスが終了しているか（読めないロックは作成途中とみなして有効）"""
+        try:
+            with open(lock_path, "r", encoding="utf-8") as f:
+                pid = int(json.load(f)["pid"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return False
+        return pid != self.pid and not _pid_alive(pid)
+
+    def trim(self, profile_dir: Path):
+        """サイズが上限を超えていればキャッシュを削除（Chrome起動前に呼ぶ）"""
+        if not self.max_size_mb:
+            return
+        size = dir_size_mb(profile_dir)
+        if size < self.max_size_mb:
+            return
+        for relative in CACHE_DIRS:
+            shutil.rmtree(profile_dir / relative, ignore_errors=True)
+        logger.info(f"🧹 Chromeプロファイルのキャッシュを削除: {profile_dir.name} "
+                    f"{size:.0f}MB → {dir_size_mb(profile_dir):.0f}MB")
+
+    def cleanup(self) -> List[Path]:
+        """長く使われていないスロット・範囲外のスロットを削除（ロック中のものは残す）"""
+        removed = []
+        cutoff = time.time() - self.max_age_days * 86400
+        for profile_dir in self.root.glob("slot*"):
+            if not profile_dir.is_dir() or not profile_dir.name[4:].isdigit():
+                continue
+            in_range = int(profile_dir.name[4:]) <= self.slots
+            try:
+                idle = profile_dir.stat().st_mtime < cutoff
+            except OSError:
+                continue
+            if in_range and not (self.max_age_days and idle):
+                continue
+            if not self._try_lock(profile_dir):
+                continue   # 使用中
+            shutil.rmtree(profile_dir, ignore_errors=True)
+            self._lock_path(profile_dir).unlink()
+            removed.append(profile_dir)
+            logger.info(f"🧹 使われていないChromeプロファイルを削除: {profile_dir.name}")
+        return removed
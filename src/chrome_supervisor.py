@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""
+アプリ再起動をまたいで生き残るChrome（リモートデバッグ接続）
+============================================================
+Chromeを監視プロセスから切り離して起動し、リモートデバッグポートで接続する。
+監視プロセスが終了・再起動しても Chrome はログイン済みのまま残り、
+新しいプロセスは起動し直さずに接続し直す。
+
+v1.0.0 - 新規作成 (2026/10/18)
+  - 旧: アプリ終了（_cleanup_and_quit）・日次リスタートでブラウザも終了し、
+        再起動後の最初のジョブで Chrome の起動とログインをやり直す
+  - 新: プロファイルのスロット（chrome_profile.py）ごとに Chrome を1つ切り離して起動し、
+        PID・ポートを <スロット>.debug.json に記録する
+        次の起動時はこの記録から生きている Chrome を探し、/json/version の応答と
+        起動オプション（headless）が一致すれば接続し直す（一致しなければ終了して起動し直す）
+        WebDriverの接続後の健全性確認（ウィンドウ取得・JavaScript実行）は browser_session.py 側
+        ブラウザのリサイクル（メモリ・件数・異常）では従来どおり Chrome ごと終了する
+
+設定（config.json）:
+    "chrome_attach": {
+        "enabled": false,
+        "chrome_path": ""     # 空なら標準のインストール先から探す
+    }
+    ※ Chrome は専用のプロファイルでしかリモートデバッグできないため、
+       chrome_profile のスロットを使う（chrome_profile.enabled に関係なく）
+
+コマンドライン（運用時の確認・停止用）:
+    python chrome_supervisor.py status
+    python chrome_supervisor.py stop
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import logging
+import subprocess
+import urllib.request
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+LAUNCH_TIMEOUT = 15.0     # 起動後、デバッグポートが応答するまで待つ秒数
+PROBE_TIMEOUT = 2.0
+
+# chrome_path 未設定時に探す場所
+CHROME_CANDIDATES = (
+    r"C:\Program Files\Google\Chrome\Application\chrome.exe",
+    r"C:\Program Files (x86)\Google\Chrome\Application\chrome.exe",
+    os.path.join(os.environ.get("LOCALAPPDATA", ""), r"Google\Chrome\Application\chrome.exe"),
+    "/Applications/Google Chrome.app/Contents/MacOS/Google Chrome",
+)
+
+
+def find_chrome(chrome_path: str = "") -> Optional[str]:
+    """Chromeの実行ファイルを探す（見つからなければNone）"""
+    if chrome_path:
+        return chrome_path if Path(chrome_path).exists() else None
+    for candidate in CHROME_CANDIDATES:
+        if candidate and Path(candidate).exists():
+            return candidate
+    for name in ("google-chrome", "google-chrome-stable", "chromium", "chromium-browser"):
+        found = shutil.which(name)
+        if found:
+            return found
+    return None
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _is_chrome(pid: int) -> bool:
+    """PID が生きている Chrome のものか（PC再起動後に別のプロセスへ再利用された PID を除く）"""
+    import psutil
+    try:
+        name = psutil.Process(pid).name().lower()
+    except psutil.Error:
+        return False
+    return "chrome" in name or "chromium" in name
+
+
+def debugger_ready(port: int, timeout: float = PROBE_TIMEOUT) -> bool:
+    """デバッグポートが応答するか（/json/version）"""
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/json/version", timeout=timeout) as resp:
+            return "webSocketDebuggerUrl" in json.loads(resp.read().decode("utf-8"))
+    except (OSError, ValueError):
+        return False
+
+
+class ChromeSupervisor:
+    """プロファイル1つにつき Chrome を1つ、監視プロセスから切り離して管理する"""
+
+    def __init__(self, profile_dir: Path, chrome_path: str = ""):
+        self.profile_dir = Path(profile_dir)
+        self.chrome_path = chrome_path
+        self.state_file = self.profile_dir.with_name(self.profile_dir.name + ".debug.json")
+        self.pid: Optional[int] = None
+        self.port: Optional[int] = None
+
+    @property
+    def address(self) -> str:
+        """chromedriver の debuggerAddress に渡す値"""
+        return f"127.0.0.1:{self.port}"
+
+    def _read_state(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.state_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def ensure(self, headless: bool) -> bool:
+        """
+        接続できる Chrome を用意する（生きていれば再利用、なければ起動）
+
+        Returns:
+            bool: 既存の Chrome を再利用する場合True（新しく起動した場合False）
+        """
+        state = self._read_state()
+        if state:
+            pid, port = state.get("pid"), state.get("port")
+            if pid and _is_chrome(pid):
+                if port and debugger_ready(port) and state.get("headless") == headless:
+                    self.pid, self.port = pid, port
+                    logger.info(f"🔌 起動済みのChromeに接続します（PID {pid}, ポート {port}）")
+                    return True
+                logger.info(f"起動済みのChrome（PID {pid}）は使えないため終了します"
+                            f"（応答なし、または headless={headless} に変更）")
+                self.pid = pid
+            self.stop()
+        self._launch(headless)
+        return False
+
+    def _launch(self, headless: bool):
+        chrome = find_chrome(self.chrome_path)
+        if chrome is None:
+            raise FileNotFoundError("Chromeが見つかりません（chrome_attach.chrome_path を設定してください）")
+
+        self.port = _free_port()
+        args = [
+            chrome,
+            f"--remote-debugging-port={self.port}",
+            "--remote-debugging-address=127.0.0.1",
+            f"--user-data-dir={self.profile_dir}",
+            "--no-first-run",
+            "--no-default-browser-check",
+            "--hide-crash-restore-bubble",
+            "--window-size=1200,900",
+            "about:blank",
+        ]
+        if headless:
+            args.insert(1, "--headless")
+
+        # 監視プロセスが終了しても残るよう、プロセスグループ・コンソールから切り離す
+        kwargs: Dict[str, Any] = {"stdin": subprocess.DEVNULL, "stdout": subprocess.DEVNULL,
+                                  "stderr": subprocess.DEVNULL}
+        if sys.platform == "win32":
+            kwargs["creationflags"] = subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP
+        else:
+            kwargs["start_new_session"] = True
+        process = subprocess.Popen(args, **kwargs)
+        self.pid = process.pid
+
+        deadline = time.time() + LAUNCH_TIMEOUT
+        while not debugger_ready(self.port):
+            if process.poll() is not None or time.time() >= deadline:
+                self.stop()
+                raise RuntimeError(f"Chromeのデバッグポートが応答しません（ポート {self.port}）")
+            time.sleep(0.2)
+
+        with open(self.state_file, "w", encoding="utf-8") as f:
+            json.dump({"pid": self.pid, "port": self.port, "headless": headless,
+                       "started_at": time.time()}, f)
+        logger.info(f"🚀 Chromeを切り離して起動しました（PID {self.pid}, ポート {self.port}）")
+
+    def stop(self):
+        """Chrome を終了して記録を消す（リサイクル・接続できないときに呼ぶ）"""
+        if self.pid:
+            try:
+                import psutil
+                process = psutil.Process(self.pid)
+                children = process.children(recursive=True)
+                process.terminate()
+                _, alive = psutil.wait_procs([process] + children, timeout=5)
+                for item in alive:
+                    item.kill()
+            except Exception as e:
+                logger.debug(f"Chrome終了時のエラー（終了済みの可能性）: {e}")
+        self.pid = None
+        self.port = None
+        try:
+            self.state_file.unlink()
+        except OSError:
+            pass
+
+
+# === 運用コマンド ===
+if __name__ == "__main__":
+    from paths import STATE_DIR
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    command = sys.argv[1] if len(sys.argv) > 1 else "status"
+    for state_file in sorted((STATE_DIR / "chrome_profiles").glob("slot*.debug.json")):
+        supervisor = ChromeSupervisor(state_file.with_name(state_file.name[:-len(".debug.json")]))
+        state = supervisor._read_state() or {}
+        ready = bool(state.get("port")) and debugger_ready(state["port"])
+        print(f"{supervisor.profile_dir.name}: PID {state.get('pid')} ポート {state.get('port')} "
+              f"{'応答あり' if ready else '応答なし'}")
+        if command == "stop":
+            supervisor.pid = state.get("pid") if state.get("pid") and _is_chrome(state["pid"]) else None
+            supervisor.stop()
+            print("  → 終了しました")
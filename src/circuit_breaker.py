@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+Homis障害時のサーキットブレーカー
+================================
+Homisが落ちている・極端に遅いときに、ジョブごとにChromeを動かして
+タイムアウトを待ち続けるのをやめ、軽いHTTP確認で復旧を待つ。
+
+v1.0.0 - 新規作成 (2026/10/18)
+  - 旧: Homis障害中も1件ずつChromeで画面遷移 → 各ステップで WAIT_TIMEOUT まで待って失敗
+        失敗が続くとGUIの連続エラー判定でプロセスごと再起動
+  - 新: 画面遷移・ログインの失敗が failure_threshold 回続いたら「遮断」
+        遮断中はジョブを処理せず監視フォルダ・APIキューに残す（ブラウザも終了）
+        probe_interval 秒ごとに homis_url へHTTPリクエストだけ送り、応答があれば
+        「試行」に移って次のジョブを1件処理 → 成功で「通常」に戻る／失敗で再び遮断
+        画面構成の変更（HTTP確認では判断できない）は trip() で即遮断し、長めに待ってから試行
+v1.0.1 - 遮断の判断を Homis に届かない失敗に限定・試行は1件ずつ (2026/10/18)
+  - 旧: テンプレートのステップ失敗・実行エラー（Homisには届いている）も連続失敗に数え、
+        入力データの問題が続くだけで遮断していた
+        試行中（half_open）は allow() が常に True で、1サイクルに複数のジョブを流していた
+  - 新: 連続失敗に数えるのは画面遷移（navigation）・ログイン（login）の失敗とHTTP確認の失敗だけ
+        ステップ失敗（step_failed）は Homis に届いている証拠として record_success() で数え直す
+        試行中は begin_job() 〜 結果の記録（record_*() / end_job()）の間、次のジョブを止める
+
+状態:
+    closed    : 通常（ジョブを処理）
+    open      : 遮断中（ジョブを処理しない。HTTP確認だけ行う）
+    half_open : 試行中（HTTP確認に成功。次のジョブ1件の結果で closed / open を決める）
+
+設定（config.json）:
+    "circuit_breaker": {
+        "failure_threshold": 3,   # 連続何回の失敗で遮断するか
+        "probe_interval": 30,     # 遮断中にHTTP確認する間隔（秒）
+        "probe_timeout": 5,       # HTTP確認のタイムアウト（秒）
+        "ui_change_hold": 600     # 画面構成の変更を検出したとき、次の試行まで待つ秒数
+    }
+
+使い方:
+    breaker = CircuitBreaker(lambda: http_probe(homis_url), failure_threshold=3)
+    if breaker.allow():
+        breaker.begin_job()          # ブラウザで処理する直前（試行中なら次のジョブを止める）
+        result = ...ジョブ処理...
+        breaker.record_success() / breaker.record_failure(reason)
+        （Homisの状態と関係ない失敗は breaker.end_job()）
+"""
+
+import time
+import logging
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+DEFAULT_FAILURE_THRESHOLD = 3
+DEFAULT_PROBE_INTERVAL = 30.0
+DEFAULT_PROBE_TIMEOUT = 5.0
+
+# 連続失敗に数える失敗の種類（Homisに届かなかったもの。error_class は retry_policy.py 参照）
+BREAKER_ERROR_CLASSES = ("navigation", "login")
+
+
+def http_probe(url: str, timeout: float = DEFAULT_PROBE_TIMEOUT) -> bool:
+    """
+    HomisにHTTPリクエストを1回だけ送る（ブラウザを使わない死活確認）
+
+    Returns:
+        True=サーバーが応答した（5xx以外。ログイン画面へのリダイレクト等も正常とみなす）
+    """
+    import requests
+    try:
+        response = requests.get(url, timeout=timeout, allow_redirects=False)
+    except requests.RequestException as e:
+        logger.info(f"🩺 Homis応答なし: {e}")
+        return False
+    if response.status_code >= 500:
+        logger.info(f"🩺 Homis応答エラー: HTTP {response.status_code}")
+        return False
+    return True
+
+
+class CircuitBreaker:
+    """連続失敗でジョブ処理を止め、HTTP確認で再開するブレーカー"""
+
+    def __init__(self, probe: Callable[[], bool],
+                 failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+                 probe_interval: float = DEFAULT_PROBE_INTERVAL,
+                 on_change: Optional[Callable[[str, str], None]] = None):
+        """
+        Args:
+            probe: 復旧確認の関数（True=復旧）
+            on_change: 状態が変わったときに呼ばれる（引数: 新しい状態, 理由）
+        """
+        self.probe = probe
+        self.failure_threshold = failure_threshold
+        self.probe_interval = probe_interval
+        self.on_change = on_change
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._next_probe_at = 0.0
+        self._trial_running = False   # 試行中のジョブを処理中
+
+    def allow(self) -> bool:
+        """ジョブを処理してよいか（遮断中は確認間隔ごとにHTTP確認する。試行中は1件ずつ）"""
+        if self.state == HALF_OPEN:
+            return not self._trial_running
+        if self.state != OPEN:
+            return True
+        if time.time() < self._next_probe_at:
+            return False
+        if self.probe():
+            self._set_state(HALF_OPEN, "Homisの応答を確認")
+            return True
+        self._next_probe_at = time.time() + self.probe_interval
+        return False
+
+    def next_probe_in(self) -> Optional[float]:
+        """次のHTTP確認までの秒数（遮断中でなければNone）"""
+        if self.state != OPEN:
+            return None
+        return max(0.0, self._next_probe_at - time.time())
+
+    def begin_job(self):
+        """ブラウザでジョブを処理する直前に呼ぶ（試行中なら結果が出るまで次のジョブを止める）"""
+        if self.state == HALF_OPEN:
+            self._trial_running = True
+
+    def end_job(self):
+        """Homisの状態と関係ない結果で終わった（試行中なら次のジョブで改めて試す）"""
+        self._trial_running = False
+
+    def record_success(self, reason: str = "ジョブ成功"):
+        """Homisに届いた（成功、またはHomisの画面に届いた後のステップ失敗）"""
+        self._trial_running = False
+        self.failures = 0
+        if self.state != CLOSED:
+            self._set_state(CLOSED, reason)
+
+    def record_failure(self, reason: str = ""):
+        """Homisに届かなかった（画面遷移・ログインの失敗）"""
+        self._trial_running = False
+        self.failures += 1
+        if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+            self.opened_at = time.time()
+            self._next_probe_at = self.opened_at + self.probe_interval
+            detail = f": {reason}" if reason else ""
+            self._set_state(OPEN, f"{self.failures}回連続で失敗{detail}")
+
+    def trip(self, reason: str, hold_seconds: Optional[float] = None):
+        """失敗回数に関係なく即遮断（hold_seconds 後に復旧を確認。省略時は probe_interval）"""
+        self._trial_running = False
+        self.failures += 1
+        self.opened_at = time.time()
+        self._next_probe_at = self.opened_at + (self.probe_interval if hold_seconds is None else hold_seconds)
+        self._set_state(OPEN, reason)
+
+    def _set_state(self, state: str, reason: str):
+        self.state = state
+        if state == OPEN:
+            wait = self._next_probe_at - time.time()
+            logger.warning(f"⛔ Homis接続を遮断: {reason}（{wait:.0f}秒後に復旧を確認）")
+        elif state == HALF_OPEN:
+            logger.info(f"🩺 {reason} — 次のジョブで復旧を確認します")
+        else:
+            logger.info(f"✅ Homis接続を再開: {reason}")
+        if self.on_change:
+            self.on_change(state, reason)
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""
+設定ホットリロードモジュール
+============================
+config.json の変更（更新日時）を検知し、検証してから稼働中の監視処理に反映する。
+
+v1.0.0 - 新規作成 (2026/10/18)
+  - 旧: 設定変更のたびに停止 → 開始（group_pending や起動済みブラウザが消える）
+  - 新: 監視ループの合間に変更を検知し、検証OKなら新しい設定に丸ごと差し替える
+        検証NGなら今の設定のまま動かし続ける（ログに理由を出す）
+
+使い方:
+    from config_service import ConfigService
+
+    service = ConfigService(CONFIG_FILE, load_config)
+    service.add_listener(lambda config, changed: ...)   # changed: 変更されたキーのset
+    service.poll()   # 監視ループの各サイクルで呼ぶ（変更がなければ stat 1回だけ）
+"""
+
+import re
+import logging
+from pathlib import Path
+from typing import Callable, Dict, Any, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+ConfigListener = Callable[[Dict[str, Any], Set[str]], None]
+
+
+def validate_config(config: Dict[str, Any]) -> List[str]:
+    """
+    設定値の形式チェック（エラーのリストを返す。空ならOK）
+    ※ フォルダの存在や認証情報の有無はGUI側（_validate_config）でチェックする
+    """
+    errors = []
+
+    if not config.get("watch_folder"):
+        errors.append("watch_folder が未設定です")
+
+    poll = config.get("poll_interval_seconds", 10)
+    if not isinstance(poll, (int, float)) or isinstance(poll, bool) or not (1 <= poll <= 3600):
+        errors.append(f"poll_interval_seconds は1〜3600の数値にしてください: {poll!r}")
+
+    for key in ("test_mode", "headless", "auto_start", "reuse_patient_page"):
+        if key in config and not isinstance(config[key], bool):
+            errors.append(f"{key} は true/false で指定してください: {config[key]!r}")
+
+    wait_mode = config.get("wait_mode", "polling")
+    if wait_mode not in ("observer", "polling"):
+        errors.append(f"wait_mode は observer / polling のどちらかにしてください: {wait_mode!r}")
+
+    job_isolation = config.get("job_isolation", "tab")
+    if job_isolation not in ("context", "tab"):
+        errors.append(f"job_isolation は context / tab のどちらかにしてください: {job_isolation!r}")
+
+    for key in ("chat_webhook_url", "oushin_chat_webhook_url", "gas_web_app_url", "homis_url"):
+        value = config.get(key, "")
+        if value and not (isinstance(value, str) and value.startswith(("http://", "https://"))):
+            errors.append(f"{key} がURLではありません: {value!r}")
+
+    restart_time = config.get("schedule", {}).get("restart_time")
+    if restart_time is not None and not re.fullmatch(r"([01]\d|2[0-3]):[0-5]\d", str(restart_time)):
+        errors.append(f"schedule.restart_time はHH:MM形式にしてください: {restart_time!r}")
+
+    for key, value in config.get("browser_recycle", {}).items():
+        if not isinstance(value, (int, float)) or isinstance(value, bool) or value < 0:
+            errors.append(f"browser_recycle.{key} は0以上の数値にしてください: {value!r}")
+
+    for key, value in config.get("lease", {}).items():
+        if not isinstance(value, (int, float)) or isinstance(value, bool) or value <= 0:
+            errors.append(f"lease.{key} は正の数値にしてください: {value!r}")
+
+    for key, value in config.get("circuit_breaker", {}).items():
+        if not isinstance(value, (int, float)) or isinstance(value, bool) or value <= 0:
+            errors.append(f"circuit_breaker.{key} は正の数値にしてください: {value!r}")
+
+    profile = config.get("chrome_profile", {})
+    if "enabled" in profile and not isinstance(profile["enabled"], bool):
+        errors.append(f"chrome_profile.enabled は true/false で指定してください: {profile['enabled']!r}")
+    slots = profile.get("slots", 2)
+    if not isinstance(slots, int) or isinstance(slots, bool) or not (1 <= slots <= 16):
+        errors.append(f"chrome_profile.slots は1〜16の整数にしてください: {slots!r}")
+    for key in ("max_size_mb", "max_age_days"):
+        value = profile.get(key, 0)
+        if not isinstance(value, (int, float)) or isinstance(value, bool) or value < 0:
+            errors.append(f"chrome_profile.{key} は0以上の数値にしてください: {value!r}")
+
+    warmup = config.get("browser_warmup", {})
+    if "enabled" in warmup and not isinstance(warmup["enabled"], bool):
+        errors.append(f"browser_warmup.enabled は true/false で指定してください: {warmup['enabled']!r}")
+    hours = [warmup.get("work_start", "08:30"), warmup.get("work_end", "19:00")]
+    for key, value in zip(("work_start", "work_end"), hours):
+        if not re.fullmatch(r"([01]\d|2[0-3]):[0-5]\d", str(value)):
+            errors.append(f"browser_warmup.{key} はHH:MM形式にしてください: {value!r}")
+    if all(re.fullmatch(r"([01]\d|2[0-3]):[0-5]\d", str(value)) for value in hours) and hours[0] >= hours[1]:
+        errors.append("browser_warmup.work_start は work_end より前にしてください")
+    for key in ("prewarm_minutes", "idle_release_minutes"):
+        value = warmup.get(key, 0)
+        if not isinstance(value, (int, float)) or isinstance(value, bool) or value < 0:
+            errors.append(f"browser_warmup.{key} は0以上の数値にしてください: {value!r}")
+
+    attach = config.get("chrome_attach", {})
+    if "enabled" in attach and not isinstance(attach["enabled"], bool):
+        errors.append(f"chrome_attach.enabled は true/false で指定してください: {attach['enabled']!r}")
+    if not isinstance(attach.get("chrome_path", ""), str):
+        errors.append(f"chrome_attach.chrome_path は文字列で指定してください: {attach['chrome_path']!r}")
+
+    for key, value in config.get("readiness", {}).items():
+        if not isinstance(value, (int, float)) or isinstance(value, bool) or value < 0:
+            errors.append(f"readiness.{key} は0以上の数値にしてください: {value!r}")
+
+    for error_class, policy in config.get("retry", {}).get("policies", {}).items():
+        for key, value in (policy.items() if isinstance(policy, dict) else [("", policy)]):
+            if not isinstance(value, (int, float)) or isinstance(value, bool) or value < 0:
+                errors.append(f"retry.policies.{error_class}.{key} は0以上の数値にしてください: {value!r}")
+
+    port = config.get("api", {}).get("port", 8765)
+    if not isinstance(port, int) or isinstance(port, bool) or not (1 <= port <= 65535):
+        errors.append(f"api.port は1〜65535の整数にしてください: {port!r}")
+
+    days = config.get("archive", {}).get("days", 14)
+    if not isinstance(days, int) or isinstance(days, bool) or days < 1:
+        errors.append(f"archive.days は1以上の整数にしてください: {days!r}")
+
+    return errors
+
+
+class ConfigService:
+    """config.json の変更を検知して登録済みリスナーに反映する"""
+
+    def __init__(self, path: Path, loader: Callable[[], Dict[str, Any]],
+                 current: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            path: 設定ファイルのパス（更新日時の監視対象）
+            loader: 設定を読み込む関数（デフォルト値とのマージ済みdictを返す）
+            current: 現在適用中の設定（変更キーの比較用。省略時は loader() の結果）
+        """
+        self.path = path
+        self.loader = loader
+        self.current = current if current is not None else loader()
+        self._listeners: List[ConfigListener] = []
+        self._mtime = self._get_mtime()
+
+    def add_listener(self, listener: ConfigListener):
+        """設定変更時に呼ばれる関数を登録（引数: 新しい設定, 変更されたキー）"""
+        self._listeners.append(listener)
+
+    def _get_mtime(self) -> Optional[float]:
+        try:
+            return self.path.stat().st_mtime
+        except OSError:
+            return None
+
+    def poll(self) -> bool:
+        """
+        設定ファイルが更新されていれば読み込み・検証・反映する
+
+        Returns:
+            bool: 新しい設定を反映したらTrue
+        """
+        mtime = self._get_mtime()
+        if mtime is None or mtime == self._mtime:
+            return False
+        # 検証NGでも同じ内容で何度もログを出さないよう、先に更新日時を記録
+        self._mtime = mtime
+
+        try:
+            new_config = self.loader()
+        except Exception as e:
+            logger.error(f"⚠️ 設定の再読み込みに失敗（現在の設定で続行）: {e}")
+            return False
+
+        errors = validate_config(new_config)
+        if errors:
+            logger.error("⚠️ 設定ファイルに問題があるため反映しません（現在の設定で続行）:")
+            for err in errors:
+                logger.error(f"  ❌ {err}")
+            return False
+
+        changed = {
+            key for key in set(new_config) | set(self.current)
+            if new_config.get(key) != self.current.get(key)
+        }
+        if not changed:
+            return False
+
+        logger.info(f"🔧 設定ファイルの変更を反映します: {', '.join(sorted(changed))}")
+        self.current = new_config
+        for listener in self._listeners:
+            try:
+                listener(new_config, changed)
+            except Exception as e:
+                logger.error(f"設定反映エラー: {e}")
+        return True
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""
+ファイル書き込み完了の判定
+==========================
+Drive同期中などで書き込み途中のJSONを処理しないための判定。
+
+v1.0.0 - 新規作成 (2026/10/18)
+  - 旧: 見つけた直後に処理済みセットに入れて json.load
+        書き込み途中だと JSONDecodeError → 失敗として済フォルダへ移動（ジョブ消失）
+  - 新: (1) サイズ・更新日時が stable_seconds 変わらないファイルだけを処理対象にする
+        (2) 同期ツールの一時ファイル（XXX.json.tmp 等）が横にある間は処理しない
+        (3) 読み込みで解析エラーになったら、少し待ちながら中身の変化を確認
+            その間に中身が変わった → まだ書き込み中（FileNotReady: 後で再処理）
+            変わらない → 本当に壊れたファイル（従来どおり失敗扱い）
+v1.0.1 - 読めない状態が続くファイルをデッドレターへ (2026/10/18)
+  - 旧: 読み込みの OSError（同期ツールのロック等）は毎回 FileNotReady で後回しにするだけで、
+        ずっと読めないファイルは永久に再試行され続ける
+  - 新: 後回しにした回数・最初に後回しにしてからの時間を記録し、
+        max_deferrals 回 または max_defer_seconds 秒を超えたら呼び出し元がデッドレターへ移す
+v1.1.0 - 自分で書き出したファイルは待たずに通す（trust） (2026/10/18)
+  - API経由のジョブは一時ファイル → リネームで書き出すので、書き込み途中にならない
+
+※ 同期ツールによっては更新日時に元ファイルの日時が入るため、
+   「更新日時が古い＝書き込み済み」とはみなさず、実際に観測して変化がないことを確認する。
+
+設定（config.json）:
+    "readiness": {
+        "stable_seconds": 2,     # この秒数サイズ・更新日時が変わらなければ書き込み完了とみなす
+        "parse_retries": 3,      # 解析エラー時に中身の変化を確認する回数
+        "retry_delay": 1.0,      # 確認の間隔（秒）
+        "max_deferrals": 20,     # 書き込み中として後回しにする回数の上限
+        "max_defer_seconds": 1800  # 最初に後回しにしてからこの秒数を超えたら諦める
+    }
+"""
+
+import time
+import logging
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+DEFAULT_STABLE_SECONDS = 2.0
+DEFAULT_PARSE_RETRIES = 3
+DEFAULT_RETRY_DELAY = 1.0
+DEFAULT_MAX_DEFERRALS = 20
+DEFAULT_MAX_DEFER_SECONDS = 1800.0
+
+# 同期・ダウンロード中に本体の横にできる一時ファイルの接尾辞
+SYNC_TEMP_SUFFIXES = (".tmp", ".part", ".partial", ".crdownload", ".download", ".gdownload")
+
+
+class FileNotReady(Exception):
+    """ファイルがまだ書き込み中（後で再処理する）"""
+
+
+def _signature(path: Path) -> Optional[Tuple[int, float]]:
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime
+
+
+class ReadinessGate:
+    """スキャンで見つけたファイルのうち、書き込みが終わったものだけを通す"""
+
+    def __init__(self, stable_seconds: float = DEFAULT_STABLE_SECONDS,
+                 max_deferrals: int = DEFAULT_MAX_DEFERRALS,
+                 max_defer_seconds: float = DEFAULT_MAX_DEFER_SECONDS):
+        self.stable_seconds = stable_seconds
+        self.max_deferrals = max_deferrals
+        self.max_defer_seconds = max_defer_seconds
+        # {ファイル名: ((サイズ, 更新日時), その状態を最初に観測した時刻)}
+        self._seen: Dict[str, Tuple[Tuple[int, float], float]] = {}
+        # {ファイル名: (後回しにした回数, 最初に後回しにした時刻)}
+        self._deferred: Dict[str, Tuple[int, float]] = {}
+        # 書き込み完了が分かっているファイル名（trust で登録）
+        self._trusted: Set[str] = set()
+
+    def filter(self, files: List[Path]) -> List[Path]:
+        """書き込みが完了したファイルだけを返す（まだのものは次回以降のスキャンで再判定）"""
+        if not files:
+            self._seen.clear()
+            self._deferred.clear()
+            return []
+
+        now = time.time()
+        try:
+            siblings = {p.name for p in files[0].parent.iterdir()}
+        except OSError:
+            siblings = set()
+
+        ready = []
+        seen = {}
+        for path in files:
+            if self._has_sync_marker(path.name, siblings):
+                continue
+            if path.name in self._trusted:
+                ready.append(path)
+                continue
+            sig = _signature(path)
+            if sig is None:
+                continue
+            previous = self._seen.get(path.name)
+            seen[path.name] = previous if previous and previous[0] == sig else (sig, now)
+            if sig[0] > 0 and now - seen[path.name][1] >= self.stable_seconds:
+                ready.append(path)
+        self._seen = seen
+        # なくなったファイル（処理済み・他のPCが取得）の後回し記録は消す
+        names = {path.name for path in files}
+        self._deferred = {name: item for name, item in self._deferred.items() if name in names}
+        self._trusted &= names
+        return ready
+
+    def next_check_in(self) -> Optional[float]:
+        """書き込み完了待ちのファイルが判定可能になるまでの秒数（待ちがなければNone）"""
+        if not self._seen:
+            return None
+        now = time.time()
+        waits = [self.stable_seconds - (now - since) for _, since in self._seen.values()]
+        pending = [w for w in waits if w > 0]
+        return min(pending) if pending else None
+
+    def trust(self, name: str):
+        """書き込み完了が分かっているファイル（原子的に書き出したもの）を次のスキャンで通す"""
+        self._trusted.add(name)
+
+    def forget(self, name: str):
+        """判定をやり直す（解析できなかったファイルを再観測する）"""
+        self._seen.pop(name, None)
+        self._trusted.discard(name)
+
+    def defer(self, name: str) -> Optional[str]:
+        """
+        書き込み中として後回しにしたことを記録し、判定をやり直す
+
+        Returns:
+            str: 回数・時間の上限を超えた場合はその内容（呼び出し元でデッドレターへ）。
+                 まだ待てる場合は None
+        """
+        self.forget(name)
+        now = time.time()
+        count, since = self._deferred.get(name, (0, now))
+        count += 1
+        if count >= self.max_deferrals or now - since >= self.max_defer_seconds:
+            self._deferred.pop(name, None)
+            return f"{count}回・{now - since:.0f}秒待っても読み込めません"
+        self._deferred[name] = (count, since)
+        return None
+
+    @staticmethod
+    def _has_sync_marker(name: str, siblings: set) -> bool:
+        if name.startswith("~$"):
+            return True
+        return any(
+            f"{name}{suffix}" in siblings or f".{name}{suffix}" in siblings
+            for suffix in SYNC_TEMP_SUFFIXES
+        )
+
+
+def read_stable(path: Path, parse: Callable[[Path], T],
+                retries: int = DEFAULT_PARSE_RETRIES,
+                delay: float = DEFAULT_RETRY_DELAY) -> T:
+    """
+    ファイルを解析（解析エラー時は retries 回 × delay 秒、中身が変わるか確認）
+
+    Raises:
+        FileNotReady: 再読み込みの間に中身が変わった・同期ツールがロック中で読めない
+        ValueError: 中身が変わらないのに解析できない（壊れたファイル）
+    """
+    before = _signature(path)
+    try:
+        return parse(path)
+    except OSError as e:
+        raise FileNotReady(f"読み込めません（同期中の可能性）: {path.name} - {e}")
+    except ValueError:
+        # 中身が変わるか見届ける（変わらなければ壊れたファイルとしてそのままエラー）
+        for _ in range(retries):
+            time.sleep(delay)
+            if _signature(path) != before:
+                raise FileNotReady(f"書き込み中: {path.name}")
+        raise
@@ -12,6 +12,14 @@ v1.5.0 - カルテ保存「中断」→「完了」に変更 (homis_writer.py変
 v1.6.0 - 24時間稼働: 日次リスタート(0:00)・ハートビートWatchdog・エラー自動復帰 (2026/06/19)
 v2.0.0 - リスタートループ修正・単一インスタンスロック・起動時ハートビート (2026/06/19)
 v2.0.1 - リスタート永続化+5分ウィンドウ・PIDロック解放修正 (2026/06/19)
+v2.1.1 - ログ表示をキュー経由のバッチ描画に変更（スレッドセーフ・行数上限） (2026/10/18)
+v2.2.0 - ダッシュボード（待ち件数・処理数/時・成功率・遅延・工程別時間・ブラウザ状態） (2026/10/18)
+v2.3.0 - 設定ホットリロード（監視中でも設定変更可・停止/開始不要） (2026/10/18)
+v2.4.0 - 複数PCでの分担処理（リース方式）・ダッシュボードにノード別処理件数 (2026/10/18)
+v2.4.1 - ダッシュボードの工程平均にジョブあたりのWebDriverコマンド数・時間を追加 (2026/10/18)
+v2.4.2 - タスクトレイからの終了でも共有ブラウザを閉じる（終了処理を _cleanup_and_quit に一本化） (2026/10/18)
+v2.4.3 - 終了時にウィンドウを固めない（ブラウザは監視側のスレッドで閉じ、終わってから破棄）・
+         設定リロードの反映をログキュー経由でGUIスレッドに渡す (2026/10/18)
 
 ※バージョン更新ルール:
   - GUIや設定の変更時: 下記 self.root.title() のバージョンも必ず更新すること
@@ -20,9 +28,11 @@ v2.0.1 - リスタート永続化+5分ウィンドウ・PIDロック解放修正
 """
 
 import os
+import time
 import logging
 import sys
 import json
+import queue
 import threading
 import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext, filedialog
@@ -229,10 +239,29 @@ class HomisCardGeneratorGUI:
     RED = "#d64123"
     GRAY = "#a7a8a9"
     
+    # v2.1.1: ログ表示の設定（レベル → (タグ名, 文字色)）
+    LOG_TAGS = {
+        "ERROR": ("error", "red"),
+        "WARNING": ("warning", "orange"),
+        "SUCCESS": ("success", "green"),
+        "INFO": ("info", "black"),
+    }
+    LOG_MAX_LINES = 1000          # ログ欄に保持する最大行数（古い行から削除）
+    LOG_DRAIN_INTERVAL_MS = 100   # キューからログ欄へ反映する間隔（ミリ秒）
+    LOG_DRAIN_BATCH = 500         # 1回の反映で取り出す最大件数
+    
+    # v2.4.3: 終了時にブラウザを閉じ終わるのを待つ最大時間・確認間隔（ミリ秒）
+    QUIT_BROWSER_WAIT_MS = 15000
+    QUIT_POLL_MS = 100
+    
+    # v2.2.0: ダッシュボード更新間隔（ミリ秒）
+    DASHBOARD_INTERVAL_MS = 1000
+    DASHBOARD_STAGE_LABELS = {"parse": "読込", "homis": "Homis", "post": "通知・移動"}
+    
     def __init__(self, root):
         self.root = root
-        self.root.title("Homis自動カルテ生成 v2.1.0")
-        self.root.geometry("580x600")
+        self.root.title("Homis自動カルテ生成 v2.4.3")
+        self.root.geometry("580x680")
         
         # 設定読み込み
         self.config = load_config()
@@ -241,6 +270,7 @@ class HomisCardGeneratorGUI:
         self.watcher = None
         self.watcher_thread = None
         self.is_running = False
+        self._quitting = False
         
         # タスクトレイ関連
         self.tray_icon = None
@@ -259,9 +289,18 @@ class HomisCardGeneratorGUI:
         # v2.0.1: 日次リスタートガード（ファイル永続化）
         self._last_restart_date = self._load_last_restart_date()
         
+        # v2.1.1: ログキュー（どのスレッドからでも _add_log で投入可能）
+        self._log_queue = queue.Queue()
+        
         # UI構築
         self._build_ui()
         
+        # v2.1.1: ログキューの定期反映を開始（Tkメインループ上で実行）
+        self.root.after(self.LOG_DRAIN_INTERVAL_MS, self._drain_log_queue)
+        
+        # v2.2.0: ダッシュボードの定期更新を開始
+        self.root.after(self.DASHBOARD_INTERVAL_MS, self._refresh_dashboard)
+        
         # ステータスを初期化
         self._update_status()
         
@@ -441,13 +480,8 @@ class HomisCardGeneratorGUI:
         self.root.after(0, self._stop_watcher)
     
     def _tray_quit(self, icon=None, item=None):
-        """タスクトレイから終了"""
-        if self.tray_icon:
-            self.tray_icon.stop()
-        self.is_running = False
-        if self.watcher:
-            self.watcher.stop()
-        self.root.after(0, self.root.destroy)
+        """タスクトレイから終了（ウィンドウを閉じた場合と同じ終了処理をGUIスレッドで行う）"""
+        self.root.after(0, self._cleanup_and_quit)
     
     def _on_closing(self):
         """ウィンドウを閉じる時の処理"""
@@ -468,15 +502,29 @@ class HomisCardGeneratorGUI:
                 self._cleanup_and_quit()
     
     def _cleanup_and_quit(self):
-        """リソースを解放して終了"""
+        """
+        リソースを解放して終了
+        共有ブラウザは watcher.stop() がバックグラウンドで閉じる。GUIスレッドでは待たず、
+        ウィンドウを隠して閉じ終わり（最大 QUIT_BROWSER_WAIT_MS）を確認してから破棄する
+        """
+        if self._quitting:
+            return
+        self._quitting = True
         self.is_running = False
-        if self.watcher:
-            self.watcher.stop()
+        closer = self.watcher.stop() if self.watcher else None
         if self.tray_icon:
             self.tray_icon.stop()
         # スケジュールタイマーをキャンセル
         if self._shutdown_timer_id:
             self.root.after_cancel(self._shutdown_timer_id)
+        self.root.withdraw()
+        self._destroy_when_closed(closer, time.time() + self.QUIT_BROWSER_WAIT_MS / 1000)
+    
+    def _destroy_when_closed(self, closer, deadline: float):
+        """ブラウザを閉じ終わったら（または期限を過ぎたら）ウィンドウを破棄"""
+        if closer is not None and closer.is_alive() and time.time() < deadline:
+            self.root.after(self.QUIT_POLL_MS, self._destroy_when_closed, closer, deadline)
+            return
         self.root.destroy()
     
     def _build_ui(self):
@@ -569,6 +617,29 @@ class HomisCardGeneratorGUI:
         )
         self.status_label.pack(side=tk.LEFT, padx=10)
         
+        # ============================================================
+        # v2.2.0: ダッシュボードエリア
+        # ============================================================
+        dashboard_frame = ttk.LabelFrame(self.root, text="ダッシュボード", padding="3")
+        dashboard_frame.pack(fill=tk.X, padx=8, pady=3)
+        
+        # 表示項目（キー → ラベル）。値は _refresh_dashboard で更新する
+        self.dashboard_labels = {}
+        dashboard_items = [
+            ("queue", 0, 0), ("throughput", 0, 1), ("success", 0, 2),
+            ("latency", 1, 0), ("browser", 1, 1),
+            ("stages", 2, 0),
+            ("nodes", 3, 0),   # v2.4.0: 複数PC運用時のみ表示
+        ]
+        for key, row, column in dashboard_items:
+            label = ttk.Label(dashboard_frame, text="", font=("メイリオ", 8))
+            label.grid(
+                row=row, column=column, sticky=tk.W, padx=5,
+                columnspan=3 if key in ("stages", "nodes") else 1
+            )
+            self.dashboard_labels[key] = label
+        self._dashboard_texts = {}
+        
         # ============================================================
         # ログエリア（メイン）
         # ============================================================
@@ -585,6 +656,10 @@ class HomisCardGeneratorGUI:
         )
         self.log_text.pack(fill=tk.BOTH, expand=True)
         
+        # v2.1.1: 色分けタグは起動時に1回だけ設定
+        for tag, color in self.LOG_TAGS.values():
+            self.log_text.tag_config(tag, foreground=color)
+        
         # ログクリアボタン
         clear_button = ttk.Button(
             log_frame,
@@ -609,10 +684,7 @@ class HomisCardGeneratorGUI:
     
     def _open_settings(self):
         """設定ダイアログを開く"""
-        if self.is_running:
-            messagebox.showwarning("警告", "監視中は設定を変更できません。\n監視を停止してから設定を変更してください。")
-            return
-        
+        # v2.3.0: 監視中でも変更可能（保存後、次のポーリングで監視処理に反映される）
         dialog = SettingsDialog(self.root, self.config)
         result = dialog.show()
         
@@ -620,7 +692,10 @@ class HomisCardGeneratorGUI:
             # 設定を保存
             if save_config(result):
                 self.config = result
-                messagebox.showinfo("保存完了", "設定を保存しました。")
+                if self.is_running:
+                    messagebox.showinfo("保存完了", "設定を保存しました。\n監視を止めずに次のポーリングで反映されます。")
+                else:
+                    messagebox.showinfo("保存完了", "設定を保存しました。")
                 
                 # UIを再読み込み
                 self._reload_ui()
@@ -652,27 +727,115 @@ class HomisCardGeneratorGUI:
         self._add_log("設定を更新しました", "SUCCESS")
     
     def _add_log(self, message: str, level: str = "INFO"):
-        """ログを追加"""
+        """ログを追加（v2.1.1: キューに積むだけ。どのスレッドから呼んでもOK）"""
         timestamp = datetime.now().strftime("%H:%M:%S")
-        
-        # 色分け
-        if level == "ERROR":
-            tag = "error"
-            color = "red"
-        elif level == "WARNING":
-            tag = "warning"
-            color = "orange"
-        elif level == "SUCCESS":
-            tag = "success"
-            color = "green"
+        self._log_queue.put((timestamp, message, level))
+    
+    def _call_on_gui(self, func, *args):
+        """v2.4.3: GUIスレッドで func(*args) を呼ぶ（ログと同じキューに積む。どのスレッドから呼んでもOK）"""
+        self._log_queue.put((None, func, args))
+    
+    def _drain_log_queue(self):
+        """v2.1.1: キューに溜まったログをまとめてログ欄に反映（メインスレッドで実行）"""
+        try:
+            lines = []
+            while len(lines) < self.LOG_DRAIN_BATCH:
+                try:
+                    lines.append(self._log_queue.get_nowait())
+                except queue.Empty:
+                    break
+            
+            calls = []
+            if lines:
+                # 連続する同じタグの行はまとめて1回で挿入
+                chunk, chunk_tag = [], None
+                for timestamp, message, level in lines:
+                    if timestamp is None:
+                        calls.append((message, level))   # _call_on_gui（関数, 引数）
+                        continue
+                    tag = self.LOG_TAGS.get(level, self.LOG_TAGS["INFO"])[0]
+                    if chunk and tag != chunk_tag:
+                        self.log_text.insert(tk.END, "".join(chunk), chunk_tag)
+                        chunk = []
+                    chunk.append(f"[{timestamp}] {message}\n")
+                    chunk_tag = tag
+                if chunk:
+                    self.log_text.insert(tk.END, "".join(chunk), chunk_tag)
+                
+                # 上限を超えた古い行を削除（メモリを一定に保つ）
+                line_count = int(self.log_text.index("end-1c").split(".")[0]) - 1
+                excess = line_count - self.LOG_MAX_LINES
+                if excess > 0:
+                    self.log_text.delete("1.0", f"{excess + 1}.0")
+                
+                self.log_text.see(tk.END)
+            
+            # ログの反映後に、他のスレッドから頼まれた処理を実行
+            for func, args in calls:
+                try:
+                    func(*args)
+                except Exception as e:
+                    logger.error(f"GUI更新エラー: {e}")
+        except tk.TclError:
+            return  # ウィンドウ破棄後は何もしない
+        
+        self.root.after(self.LOG_DRAIN_INTERVAL_MS, self._drain_log_queue)
+    
+    def _refresh_dashboard(self):
+        """v2.2.0: ダッシュボードを更新（メトリクスのスナップショットを読むだけなので軽量）"""
+        snapshot = self.watcher.metrics.snapshot() if self.watcher else None
+        
+        def fmt_sec(value):
+            return f"{value:.1f}秒" if value is not None else "-"
+        
+        if snapshot:
+            success_rate = snapshot["success_rate"]
+            stages = " / ".join(
+                f"{label} {fmt_sec(snapshot['stages'].get(stage))}"
+                for stage, label in self.DASHBOARD_STAGE_LABELS.items()
+            )
+            texts = {
+                "queue": f"📥 待ち: {snapshot['queue_depth']}件",
+                "throughput": f"⚡ 処理: {snapshot['jobs_per_hour']}件/時",
+                "success": f"✅ 成功率: {success_rate:.0f}%" if success_rate is not None else "✅ 成功率: -",
+                "latency": (
+                    f"⏱ 遅延 p50/p95: {fmt_sec(snapshot['latency_p50'])} / "
+                    f"{fmt_sec(snapshot['latency_p95'])}"
+                ),
+                "browser": f"🌐 ブラウザ: {snapshot['browser_state']}",
+                "stages": f"🧩 工程平均: {stages}{self._format_webdriver(snapshot['webdriver'])}",
+                "nodes": self._format_nodes(snapshot["nodes"]),
+            }
         else:
-            tag = "info"
-            color = "black"
+            texts = {key: "" for key in self.dashboard_labels}
+            texts["queue"] = "（監視開始後に表示）"
         
-        # ログに追加
-        self.log_text.insert(tk.END, f"[{timestamp}] {message}\n", tag)
-        self.log_text.tag_config(tag, foreground=color)
-        self.log_text.see(tk.END)
+        # 変化した項目だけ更新（不要な再描画を避ける）
+        try:
+            for key, text in texts.items():
+                if self._dashboard_texts.get(key) != text:
+                    self.dashboard_labels[key].config(text=text)
+                    self._dashboard_texts[key] = text
+        except tk.TclError:
+            return  # ウィンドウ破棄後は何もしない
+        
+        self.root.after(self.DASHBOARD_INTERVAL_MS, self._refresh_dashboard)
+    
+    @staticmethod
+    def _format_webdriver(webdriver) -> str:
+        """v2.4.1: ジョブあたりのWebDriverコマンド数（ブラウザ処理の実績がなければ表示しない）"""
+        if not webdriver:
+            return ""
+        return f" / WebDriver {webdriver['commands_per_job']:.0f}回・{webdriver['seconds_per_job']:.1f}秒/件"
+    
+    @staticmethod
+    def _format_nodes(nodes) -> str:
+        """v2.4.0: ノード別処理件数の表示（1台だけのときは表示しない）"""
+        if len(nodes) < 2:
+            return ""
+        return "🖥 ノード: " + " / ".join(
+            f"{node['host']} {node['jobs_per_hour']}件/時" for node in nodes
+        )
     
     def _clear_log(self):
         """ログをクリア"""
@@ -738,6 +901,8 @@ class HomisCardGeneratorGUI:
         
         # 別スレッドで監視開始
         self.watcher = FolderWatcher(self.config)
+        # v2.3.0: 監視中の設定変更（ファイル直接編集を含む）をGUI表示にも反映
+        self.watcher.config_service.add_listener(self._on_config_reloaded)
         self.watcher_thread = threading.Thread(target=self._run_watcher, daemon=True)
         self.watcher_thread.start()
     
@@ -856,7 +1021,7 @@ class HomisCardGeneratorGUI:
                 f.write(json.dumps({
                     "timestamp": datetime.now().isoformat(),
                     "status": status,
-                    "version": "2.1.0",
+                    "version": "2.4.3",
                     "pid": os.getpid()
                 }))
         except Exception as e:
@@ -892,26 +1057,17 @@ class HomisCardGeneratorGUI:
         
         while self.is_running:
             try:
-                # フォルダをスキャン
-                files = self.watcher.scan_folder()
-                
-                if files:
-                    self._add_log(f"新規ファイル検出: {len(files)}件", "INFO")
-                    for file in files:
-                        success = self.watcher.process_file(file)
-                        if success:
-                            self._add_log(f"処理成功: {file.name}", "SUCCESS")
-                        else:
-                            self._add_log(f"処理失敗: {file.name}", "ERROR")
-                
-                # v7.7.6: 集団検診グループの完了チェック
-                self.watcher.check_groups()
+                # v2.3.0: 1サイクル実行（設定反映 → スキャン → 処理 → グループ完了チェック）
+                self.watcher.run_cycle(
+                    on_files=lambda files: self._add_log(f"新規ファイル検出: {len(files)}件", "INFO"),
+                    on_result=self._log_file_result,
+                )
                 
                 # v1.6.0: エラーリトライカウンターをリセット（正常動作中）
                 self._error_retry_count = 0
                 
-                # 待機
-                time.sleep(self.watcher.poll_interval)
+                # 待機（停止ボタンで即座に抜ける）
+                self.watcher.wait_next_cycle()
                 
             except Exception as e:
                 error_msg = str(e)
@@ -946,6 +1102,23 @@ class HomisCardGeneratorGUI:
                 self._add_log(f"⏳ 30秒後に自動復帰します...", "WARNING")
                 time.sleep(30)
     
+    def _log_file_result(self, file: Path, success: bool):
+        """1ファイルの処理結果をログに出す（監視スレッドから呼ばれる）"""
+        if success:
+            self._add_log(f"処理成功: {file.name}", "SUCCESS")
+        else:
+            self._add_log(f"処理失敗: {file.name}", "ERROR")
+    
+    def _on_config_reloaded(self, config: dict, changed: set):
+        """v2.3.0: 監視中に config.json の変更が反映されたとき（監視スレッドから呼ばれる）"""
+        self._add_log(f"🔧 設定変更を反映しました: {', '.join(sorted(changed))}", "SUCCESS")
+        self._call_on_gui(self._apply_reloaded_config, config)
+    
+    def _apply_reloaded_config(self, config: dict):
+        """v2.3.0: 反映済みの設定をGUI側にも取り込む（メインスレッド）"""
+        self.config = config
+        self._reload_ui()
+    
     def _stop_watcher(self):
         """フォルダ監視を停止"""
         self.is_running = False
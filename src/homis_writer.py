@@ -18,8 +18,8 @@ JSONファイルの内容をHomisのカルテに登録する
 # ============================================================
 # バージョン情報
 # ============================================================
-MODULE_VERSION = "2.1.0"
-MODULE_VERSION_DATE = "2026-06-29"
+MODULE_VERSION = "2.2.1"
+MODULE_VERSION_DATE = "2026-10-18"
 
 import os
 import time
@@ -30,7 +30,7 @@ from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
+from selenium.common.exceptions import TimeoutException, NoSuchElementException, WebDriverException
 from webdriver_manager.chrome import ChromeDriverManager
 
 # ロガー設定
@@ -168,6 +168,8 @@ class HomisKarteWriter:
             
         Returns:
             dict: {"success": bool, "karte_url": str|None}
+                  v2.2.0: 失敗時は "error", "error_class"（login / transient）も入る
+                  v2.2.1: 患者ページへ移動できない場合は navigation（サーキットブレーカー用）
         """
         result = {"success": False, "karte_url": None}
         
@@ -187,12 +189,18 @@ class HomisKarteWriter:
             # Step 1: 患者詳細ページに直接アクセス
             patient_url = f"{self.base_url}?pid=patient_detail&patient_id={homis_id}"
             logger.info(f"患者ページに移動: {patient_url}")
-            self.driver.get(patient_url)
+            try:
+                self.driver.get(patient_url)
+            except WebDriverException as e:
+                logger.error(f"患者ページに移動できません: {e}")
+                result.update(error=f"患者ページに移動できません: {e}", error_class="navigation")
+                return result
             self._safe_sleep(self.WAIT_MEDIUM)
             
             # ログイン画面が表示された場合のみ認証
             if not self._login_if_needed():
                 logger.error("ログインに失敗しました")
+                result.update(error="ログイン失敗", error_class="login")
                 return result
             
             # Step 2: 「新規」ボタンをクリック（aタグ id="karteNew"）
@@ -478,6 +486,7 @@ class HomisKarteWriter:
             
         except Exception as e:
             logger.error(f"カルテ書き込みエラー: {e}")
+            result.update(error=f"カルテ書き込みエラー: {e}", error_class="transient")
             return result
         finally:
             self.close()
@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+"""
+ジョブ投入HTTP API（ローカル）
+==============================
+監視プロセス内で小さなHTTPサーバーを動かし、フォルダ経由より速くジョブを受け付ける。
+
+v1.0.0 - 新規作成 (2026/10/18)
+  - 旧: GASがDriveにJSONを書く → Drive同期 → 次のポーリングで検知（数十秒かかることがある）
+  - 新: POST /jobs で同じJSON（action, template, data, job_id）を直接受け付け、
+        監視ループを起こして即座に処理。GET /jobs/<id> で状態を返す
+        （result_{job_id}.json のポーリングの代わり）
+v1.1.0 - 複合ジョブ（templates）の要素ごとの結果を返す (2026/10/18)
+v1.2.0 - 受け付けたジョブを監視フォルダに書き出す (2026/10/18)
+  - 旧: メモリ上のキューで待ち、再試行もタイマー → 夜間の再起動・異常終了で
+        「受け付けました」と返したジョブが消える
+  - 新: api_<id>.json として監視フォルダに書き出してから 202 を返す
+        以降はフォルダ経由のジョブと同じく取得（リース）・再試行・デッドレターの対象
+        ※ 複数PCで同じフォルダを監視している場合は他のPCが処理することがある
+          （状態はそのPCのAPIで返る。job_id 付きなら result_<job_id>.json でも確認できる）
+
+エンドポイント:
+    POST /jobs          本文: ジョブJSON → 202 {"id": ..., "status": "queued"}
+                        id は job_id（なければ自動採番。data には入れない）
+                        同じIDのジョブが監視フォルダに残っていれば 409、書き出せなければ 503
+    GET  /jobs/<id>     → 200 {"id", "status": queued|running|retrying|success|failed,
+                               "karte_url", "error", "error_class", "submitted_at", "finished_at",
+                               "results": 複合ジョブの要素ごとの結果（それ以外は null）}
+    GET  /health        → 200 {"status": "ok", "queued": 待ち件数}
+
+    token を設定した場合は X-Api-Token ヘッダーが一致しないと 401
+
+設定（config.json）:
+    "api": {
+        "enabled": false,
+        "host": "127.0.0.1",     # 他のPCから受け付ける場合のみ 0.0.0.0
+        "port": 8765,
+        "token": ""
+    }
+
+ベンチマーク（ブラウザを使わずAPIの往復だけを計測）:
+    python job_api.py --bench 200
+"""
+
+import re
+import json
+import math
+import time
+import uuid
+import queue
+import logging
+import threading
+from collections import OrderedDict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, Any, Optional, Callable, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 8765
+MAX_BODY_BYTES = 1024 * 1024
+MAX_STATUSES = 1000      # 状態を保持する件数（古いものから削除）
+
+# 監視フォルダに書き出すときのファイル名の接頭辞・IDを残すキー
+API_FILE_PREFIX = "api_"
+API_ID_KEY = "_api_id"
+
+
+def api_file_name(job_key: str) -> str:
+    """API経由のジョブを書き出すファイル名（ファイル名に使えない文字は _ に置き換える）"""
+    return f"{API_FILE_PREFIX}{re.sub(r'[^0-9A-Za-z_.-]', '_', job_key)}.json"
+
+
+class JobStatusStore:
+    """ジョブの状態（スレッドセーフ・件数上限付き）"""
+
+    def __init__(self, max_items: int = MAX_STATUSES):
+        self._lock = threading.Lock()
+        self._items: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._max_items = max_items
+
+    def set(self, job_key: str, status: str, **fields):
+        """状態を更新（fields: karte_url, error など）"""
+        with self._lock:
+            item = self._items.pop(job_key, {"id": job_key, "submitted_at": time.time()})
+            item["status"] = status
+            item.update(fields)
+            if status in ("success", "failed"):
+                item["finished_at"] = time.time()
+            self._items[job_key] = item
+            while len(self._items) > self._max_items:
+                self._items.popitem(last=False)
+
+    def get(self, job_key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            item = self._items.get(job_key)
+            return dict(item) if item else None
+
+    def restore(self, job_key: str, item: Optional[Dict[str, Any]]):
+        """状態を以前の内容に戻す（None なら削除）"""
+        with self._lock:
+            if item is None:
+                self._items.pop(job_key, None)
+            else:
+                self._items[job_key] = dict(item)
+
+
+class JobApiServer:
+    """ジョブ投入APIサーバー（別スレッドで待ち受け）"""
+
+    def __init__(self, submit: Callable[[str, Dict[str, Any]], None], statuses: JobStatusStore,
+                 host: str = "127.0.0.1", port: int = DEFAULT_PORT, token: str = "",
+                 queued: Optional[Callable[[], int]] = None):
+        """
+        Args:
+            submit: ジョブを監視フォルダに書き出す関数（引数: id, ジョブJSON）
+                    同じIDのジョブが残っていれば FileExistsError、書き出せなければ OSError
+            statuses: 状態の保存先（GET /jobs/<id> で参照）
+            queued: 待ち件数を返す関数（/health 用）
+        """
+        self.submit = submit
+        self.statuses = statuses
+        self.host = host
+        self.port = port
+        self.token = token
+        self.queued = queued
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        handler = type("JobApiHandler", (_JobApiHandler,), {"api": self})
+        self._server = ThreadingHTTPServer((self.host, self.port), handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="JobApiServer", daemon=True
+        )
+        self._thread.start()
+        logger.info(f"🌐 ジョブ投入API開始: http://{self.host}:{self.port}/jobs")
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+            logger.info("🌐 ジョブ投入API停止")
+
+    def handle_submit(self, job: Any) -> Tuple[int, Dict[str, Any]]:
+        """POST /jobs の本体（ステータスコード, 応答JSON）"""
+        if not isinstance(job, dict) or not job.get("action"):
+            return 400, {"error": "action を含むJSONオブジェクトを送ってください"}
+        job_key = str(job.get("job_id") or f"api_{uuid.uuid4().hex[:12]}")
+        current = self.statuses.get(job_key)
+        if current and current["status"] in ("queued", "running", "retrying"):
+            return 409, {"id": job_key, "error": "同じIDのジョブを処理中です"}
+        self.statuses.set(job_key, "queued", karte_url=None, error="")
+        try:
+            self.submit(job_key, job)
+        except FileExistsError:
+            self.statuses.restore(job_key, current)
+            return 409, {"id": job_key, "error": "同じIDのジョブが監視フォルダに残っています"}
+        except OSError as e:
+            self.statuses.restore(job_key, current)
+            logger.error(f"⚠️ APIジョブを書き出せません: {job_key} - {e}")
+            return 503, {"id": job_key, "error": f"ジョブを保存できません: {e}"}
+        return 202, {"id": job_key, "status": "queued"}
+
+
+class _JobApiHandler(BaseHTTPRequestHandler):
+    api: JobApiServer
+
+    def log_message(self, format, *args):
+        logger.debug("API %s - " + format, self.client_address[0], *args)
+
+    def _reply(self, status: int, body: Dict[str, Any]):
+        payload = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _authorized(self) -> bool:
+        if self.api.token and self.headers.get("X-Api-Token") != self.api.token:
+            self._reply(401, {"error": "認証エラー"})
+            return False
+        return True
+
+    def do_GET(self):
+        if not self._authorized():
+            return
+        if self.path == "/health":
+            queued = self.api.queued() if self.api.queued else 0
+            self._reply(200, {"status": "ok", "queued": queued})
+        elif self.path.startswith("/jobs/"):
+            item = self.api.statuses.get(self.path[len("/jobs/"):])
+            if item:
+                self._reply(200, item)
+            else:
+                self._reply(404, {"error": "ジョブが見つかりません"})
+        else:
+            self._reply(404, {"error": "not found"})
+
+    def do_POST(self):
+        if not self._authorized():
+            return
+        if self.path != "/jobs":
+            self._reply(404, {"error": "not found"})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        if length <= 0 or length > MAX_BODY_BYTES:
+            self._reply(400, {"error": "本文が空か大きすぎます"})
+            return
+        try:
+            job = json.loads(self.rfile.read(length).decode("utf-8"))
+        except (UnicodeDecodeError, ValueError) as e:
+            self._reply(400, {"error": f"JSON解析エラー: {e}"})
+            return
+        self._reply(*self.api.handle_submit(job))
+
+
+# === ベンチマーク ===
+if __name__ == "__main__":
+    import sys
+    import urllib.request
+
+    logging.basicConfig(level=logging.WARNING)
+
+    count = int(sys.argv[2]) if len(sys.argv) == 3 and sys.argv[1] == "--bench" else 100
+
+    # ブラウザの代わりに即座に成功を返す処理スレッド（監視ループ相当）
+    statuses = JobStatusStore()
+    jobs: "queue.Queue[Tuple[str, Dict[str, Any]]]" = queue.Queue()
+
+    def worker():
+        while True:
+            job_key, _ = jobs.get()
+            statuses.set(job_key, "running")
+            statuses.set(job_key, "success", karte_url="https://example.invalid/karte")
+
+    threading.Thread(target=worker, daemon=True).start()
+    server = JobApiServer(lambda key, job: jobs.put((key, job)), statuses, port=0)
+    server.start()
+    base = f"http://127.0.0.1:{server.port}"
+
+    def call(method: str, path: str, body: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        req = urllib.request.Request(base + path, data=data, method=method,
+                                     headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(req, timeout=10) as resp:
+            return json.loads(resp.read().decode("utf-8"))
+
+    latencies = []
+    for i in range(count):
+        started = time.perf_counter()
+        job_key = call("POST", "/jobs", {"action": "homis_karte_write", "data": {"n": i}})["id"]
+        while call("GET", f"/jobs/{job_key}")["status"] not in ("success", "failed"):
+            time.sleep(0.001)
+        latencies.append((time.perf_counter() - started) * 1000)
+    server.stop()
+
+    latencies.sort()
+    print(f"{count}件: 投入→完了 p50={latencies[len(latencies) // 2]:.1f}ms "
+          f"p95={latencies[math.ceil(len(latencies) * 0.95) - 1]:.1f}ms max={latencies[-1]:.1f}ms")
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+"""
+バンドル（複数ジョブを1ファイルにまとめた形式）
+==============================================
+集団検診など大量のカルテを1ファイルで投入できるようにする。
+
+v1.0.0 - 新規作成 (2026/10/18)
+  - 旧: 1カルテ = 1 JSONファイル（40人の集団検診なら同期・スキャン・移動が40回）
+  - 新: 1ファイルに複数ジョブをまとめて投入できる
+        行ごとの結果を進捗ファイルに記録し、途中で止まっても未処理の行から再開
+v1.1.0 - 複合ジョブ（1人の患者に複数テンプレート）を追加 (2026/10/18)
+  - 旧: 1ジョブ = 1テンプレート（同じ患者のレントゲン＋往診白紙カルテでもファイル2つ）
+  - 新: "templates" に (template, data) を並べると1ジョブで順に実行
+v1.1.1 - 複合ジョブの要素をすべて検証してから実行・要素ごとのキー (2026/10/18)
+  - 旧: 要素を1つずつ検証・実行するため、3つ目の入力エラーで1・2つ目のカルテだけ作成済みになる
+        _results を要素の番号で記録（再試行までに templates を並べ替えると別の要素を飛ばす）
+  - 新: 監視側で全要素を先に検証し、1つでもNGなら何も実行せずに入力検証エラー
+        _results のキーは要素の job_id（なければ 番号 + 内容のハッシュ。compound_keys）
+
+形式（どちらも1ジョブは従来のJSONと同じ形）:
+  - XXX.jsonl : 1行 = 1ジョブ（空行は無視）
+  - XXX.json  : 先頭が [ の配列（要素 = 1ジョブ）
+
+進捗・結果:
+  - 処理中: 監視フォルダ/.progress/<バンドル名>.json
+            {"行キー": {"line": 行番号, "success", "karte_url", "error"}, ...}
+            行キー = 行番号 + 内容のハッシュ（同じ名前で中身が違うバンドルを誤って飛ばさない）
+  - 完了後: 済/<バンドル名>.results.json に移動
+
+使い方:
+    if is_bundle(path):
+        jobs = read_bundle(path)             # [(行キー, 行番号, ジョブ or None, エラー), ...]
+        progress = BundleProgress(watch_folder, original_name)
+        for key, line, job, error in jobs:
+            if progress.is_done(key): continue
+            ...処理...
+            progress.record(key, line, result)
+        progress.finish(processed_folder)
+
+複合ジョブ（1ジョブ内に複数テンプレート）:
+    {
+        "action": "homis_karte_write",
+        "data": {"homisId": "...", ...共通の変数...},
+        "templates": [
+            {"template": "xray_karte", "data": {"orderId": "...", ...}},
+            {"template": "oushin_blank_karte", "data": {...}, "job_id": "..."}
+        ]
+    }
+    各要素は 共通の data ＋ 要素の data（上書き）の通常ジョブとして順に実行する
+    通知・結果ファイルは要素ごと（orderId / job_id 単位）
+    要素ごとの結果はジョブの "_results" に残り、再試行時は終わった要素を飛ばす
+    （キーは compound_keys: 要素の job_id、なければ 番号 + 内容のハッシュ）
+    ※ 全要素を検証してから実行する（1つでも入力エラーなら1件も作成しない）
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import logging
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_DIR_NAME = ".progress"
+BUNDLE_SUFFIX = ".jsonl"
+COMPOUND_KEY = "templates"
+COMPOUND_RESULTS_KEY = "_results"
+
+BundleLine = Tuple[str, int, Optional[Dict[str, Any]], str]
+
+
+def is_bundle(path: Path, name: Optional[str] = None) -> bool:
+    """
+    バンドルか判定（.jsonl、または先頭が [ の .json）
+
+    Args:
+        path: 実際のファイルパス（取得済みのリネーム後でもよい）
+        name: 元のファイル名（省略時は path.name）
+    """
+    if (name or path.name).endswith(BUNDLE_SUFFIX):
+        return True
+    try:
+        with open(path, "rb") as f:
+            head = f.read(64).lstrip(b"\xef\xbb\xbf \t\r\n")
+    except OSError:
+        return False
+    return head.startswith(b"[")
+
+
+def _line_key(line_no: int, raw: str) -> str:
+    digest = hashlib.sha1(raw.encode("utf-8")).hexdigest()[:12]
+    return f"{line_no}:{digest}"
+
+
+def read_bundle(path: Path, name: Optional[str] = None, strict_tail: bool = False) -> List[BundleLine]:
+    """
+    バンドルを読み込む
+
+    Args:
+        strict_tail: True=JSONLの最終行が解析できなければ ValueError（書き込み途中の可能性）
+
+    Returns:
+        list: [(行キー, 行番号(1始まり), ジョブ or None, 解析エラー), ...]
+
+    Raises:
+        OSError, ValueError: ファイル全体が読めない（配列形式のJSONが壊れている等）
+    """
+    with open(path, "r", encoding="utf-8-sig") as f:
+        text = f.read()
+
+    lines: List[BundleLine] = []
+    if (name or path.name).endswith(BUNDLE_SUFFIX):
+        for line_no, raw in enumerate(text.splitlines(), start=1):
+            raw = raw.strip()
+            if not raw:
+                continue
+            try:
+                job = json.loads(raw)
+                error = "" if isinstance(job, dict) else "ジョブがオブジェクトではありません"
+            except ValueError as e:
+                job, error = None, f"JSON解析エラー: {e}"
+            lines.append((_line_key(line_no, raw), line_no, job if not error else None, error))
+        if strict_tail and lines and lines[-1][2] is None:
+            raise ValueError(f"最終行（{lines[-1][1]}行目）を解析できません: {lines[-1][3]}")
+    else:
+        items = json.loads(text)
+        if not isinstance(items, list):
+            raise ValueError("配列ではありません")
+        for line_no, job in enumerate(items, start=1):
+            raw = json.dumps(job, ensure_ascii=False, sort_keys=True)
+            error = "" if isinstance(job, dict) else "ジョブがオブジェクトではありません"
+            lines.append((_line_key(line_no, raw), line_no, job if not error else None, error))
+    return lines
+
+
+def is_compound(job: Any) -> bool:
+    """複合ジョブ（templates を持つ）か判定"""
+    return isinstance(job, dict) and COMPOUND_KEY in job
+
+
+def expand_compound(job: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    複合ジョブを1テンプレートずつの通常ジョブに展開
+
+    Raises:
+        ValueError: templates が空・要素に template がない
+    """
+    items = job.get(COMPOUND_KEY)
+    if not isinstance(items, list) or not items:
+        raise ValueError("templates が空か配列ではありません")
+
+    base = {key: value for key, value in job.items()
+            if key not in (COMPOUND_KEY, COMPOUND_RESULTS_KEY, "job_id", "_retry")}
+    shared = job.get("data") if isinstance(job.get("data"), dict) else {}
+    jobs = []
+    for index, item in enumerate(items, start=1):
+        if not isinstance(item, dict) or not item.get("template"):
+            raise ValueError(f"templates の{index}番目に template がありません")
+        sub = dict(base)
+        sub["template"] = item["template"]
+        sub["data"] = {**shared, **(item.get("data") or {})}
+        if item.get("job_id"):
+            sub["job_id"] = item["job_id"]
+        jobs.append(sub)
+    return jobs
+
+
+def compound_keys(job: Dict[str, Any]) -> List[str]:
+    """
+    複合ジョブの要素ごとのキー（"_results" 用。expand_compound と同じ順）
+    要素の job_id があればそれ、なければ 番号 + 要素の内容のハッシュ（並べ替え・書き換えで別の要素とみなす）
+    """
+    keys = []
+    for index, item in enumerate(job.get(COMPOUND_KEY) or [], start=1):
+        if isinstance(item, dict) and item.get("job_id"):
+            keys.append(str(item["job_id"]))
+        else:
+            keys.append(_line_key(index, json.dumps(item, ensure_ascii=False, sort_keys=True)))
+    return keys
+
+
+class BundleProgress:
+    """バンドルの行ごとの処理結果（1行処理するたびに保存）"""
+
+    def __init__(self, watch_folder: Path, bundle_name: str):
+        self.bundle_name = bundle_name
+        self.path = Path(watch_folder) / PROGRESS_DIR_NAME / f"{bundle_name}.json"
+        self.results: Dict[str, Dict[str, Any]] = self._load()
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if not self.path.exists():
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                results = json.load(f)
+            logger.info(f"📦 バンドルを途中から再開: {self.bundle_name}（処理済み{len(results)}行）")
+            return results
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ 進捗ファイルを読めません（最初から処理）: {self.path.name} - {e}")
+            return {}
+
+    def is_done(self, key: str) -> bool:
+        return key in self.results
+
+    @property
+    def all_success(self) -> bool:
+        return all(item.get("success") for item in self.results.values())
+
+    def record(self, key: str, line_no: int, result: Dict[str, Any]):
+        """1行分の結果を記録して保存（一時ファイル → 置き換え）"""
+        self.results[key] = {
+            "line": line_no,
+            "success": bool(result.get("success")),
+            "karte_url": result.get("karte_url") or "",
+            "error": result.get("error", ""),
+        }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.results, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, self.path)
+
+    def finish(self, processed_folder: Path):
+        """全行処理後: 結果を 済/<バンドル名>.results.json に移して進捗ファイルを消す"""
+        dest = Path(processed_folder) / f"{self.bundle_name}.results.json"
+        try:
+            if self.path.exists():
+                shutil.move(str(self.path), str(dest))
+        except OSError as e:
+            logger.warning(f"⚠️ バンドル結果ファイルを移動できません: {e}")
@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""
+ジョブのリース（複数PCでの分担処理）
+====================================
+監視フォルダ（共有Drive）を複数のPCで同時に監視できるよう、
+処理前にファイルをリネームして「このPCが処理中」であることを示す。
+
+v1.0.0 - 新規作成 (2026/10/18)
+  - 旧: 2台目のPCで監視を動かすと同じJSONを両方が処理し、カルテが二重に作成される
+  - 新: 処理直前に XXX.json → XXX.json.claimed.<ホスト名>.<PID>.<取得時刻> にリネーム（取得）
+        リネームに失敗した（他のPCが先に取得した）ファイルはスキップ
+        落ちたPCのリースは期限切れで元の名前に戻し、他のPCが拾えるようにする
+        各PCの処理件数を .nodes/<ホスト名>.<PID>.json に書き出し、ダッシュボードに表示
+
+リース:
+  - 取得時刻（UNIX秒）をファイル名に含める（更新日時は待ち時間の計測に使うので変えない）
+  - 取得から lease_seconds を過ぎても残っているファイルは期限切れとして元に戻す
+  - 同じPCの別プロセス（前回異常終了した監視）の取得済みファイルは、
+    そのPIDが生きていなければ期限を待たずに戻す
+
+※ リネームが原子的なのは同じファイルシステム上での話。Google Drive for desktop の
+   ように各PCのローカルコピーを後から同期する構成では、同期の遅れの間に2台が
+   同じファイルを取得しうる。複数台で運用する場合は、全PCが同じ実体を見る
+   NAS / SMB 共有フォルダを監視フォルダにすること。
+
+設定（config.json）:
+    "lease": {
+        "lease_seconds": 600,     # リースの有効期間（1ジョブの最大所要時間より長く）
+        "stats_interval": 60      # 処理件数を書き出す間隔（秒）
+    }
+
+使い方:
+    leases = JobLeaseManager(watch_folder)
+    claimed = leases.claim(file_path)    # 取得できなければ None
+    ...claimed を処理...
+    claimed = leases.renew(claimed)      # 長いジョブ（バンドル）は途中で延長
+    leases.release(claimed)              # 処理できなかった場合に元に戻す
+    leases.reclaim_expired()             # 監視ループの各サイクルで呼ぶ
+"""
+
+import os
+import json
+import time
+import socket
+import logging
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CLAIM_MARK = ".claimed."
+NODES_DIR_NAME = ".nodes"
+DEFAULT_LEASE_SECONDS = 600
+DEFAULT_STATS_INTERVAL = 60
+NODE_STALE_SECONDS = 600   # この時間以上更新のないノードは表示しない
+
+
+def original_name(path: Path) -> str:
+    """取得済みファイル名から元のファイル名を返す（取得済みでなければそのまま）"""
+    name = path.name
+    index = name.find(CLAIM_MARK)
+    return name[:index] if index >= 0 else name
+
+
+def _parse_claim(path: Path) -> Optional[Tuple[str, int, float]]:
+    """取得済みファイル名から (ホスト名, PID, 取得時刻) を返す"""
+    name = path.name
+    index = name.find(CLAIM_MARK)
+    if index < 0:
+        return None
+    try:
+        host, pid, claimed_at = name[index + len(CLAIM_MARK):].split(".")
+        return host, int(pid), float(claimed_at)
+    except ValueError:
+        return None
+
+
+def _pid_alive(pid: int) -> bool:
+    """同じPC上のプロセスが生きているか"""
+    import psutil
+    return psutil.pid_exists(pid)
+
+
+class JobLeaseManager:
+    """監視フォルダ内のジョブファイルの取得・返却・期限切れ回収"""
+
+    def __init__(self, watch_folder: Path, lease_seconds: float = DEFAULT_LEASE_SECONDS,
+                 stats_interval: float = DEFAULT_STATS_INTERVAL):
+        self.watch_folder = Path(watch_folder)
+        self.lease_seconds = lease_seconds
+        self.stats_interval = stats_interval
+        # ホスト名に "." が入ると元の名前が取り出せなくなるため置き換える
+        self.host = socket.gethostname().replace(".", "-")
+        self.pid = os.getpid()
+        self.node_id = f"{self.host}.{self.pid}"
+        self.started_at = time.time()
+        self._last_stats = 0.0
+
+    # ------------------------------------------------------------
+    # 取得・返却
+    # ------------------------------------------------------------
+
+    def claim(self, file_path: Path) -> Optional[Path]:
+        """
+        ファイルを取得（リネーム）する
+
+        Returns:
+            Path: 取得後のパス。他のPCが先に取得・処理した場合は None
+        """
+        claimed = file_path.with_name(
+            f"{file_path.name}{CLAIM_MARK}{self.node_id}.{int(time.time())}"
+        )
+        try:
+            os.rename(file_path, claimed)
+        except FileNotFoundError:
+            logger.info(f"⏭ 他のPCが処理中のためスキップ: {file_path.name}")
+            return None
+        except OSError as e:
+            logger.warning(f"⚠️ ファイルを取得できません（スキップ）: {file_path.name} - {e}")
+            return None
+        return claimed
+
+    def renew(self, claimed: Path) -> Optional[Path]:
+        """
+        リースを延長（取得時刻を現在時刻に付け替える）
+
+        Returns:
+            Path: 延長後のパス。期限切れで他のPCに回収されていた場合は None
+        """
+        renewed = claimed.with_name(
+            f"{original_name(claimed)}{CLAIM_MARK}{self.node_id}.{int(time.time())}"
+        )
+        if renewed == claimed:
+            return claimed
+        try:
+            os.rename(claimed, renewed)
+            return renewed
+        except OSError as e:
+            logger.warning(f"⚠️ リースを延長できません（他のPCに回収された可能性）: {claimed.name} - {e}")
+            return None
+
+    def release(self, claimed: Path) -> Optional[Path]:
+        """取得済みファイルを元の名前に戻す（他のPC・次回起動時に処理される）"""
+        original = claimed.with_name(original_name(claimed))
+        try:
+            os.rename(claimed, original)
+            return original
+        except OSError as e:
+            logger.warning(f"⚠️ ファイルを元に戻せません: {claimed.name} - {e}")
+            return None
+
+    def reclaim_expired(self) -> int:
+        """
+        期限切れ・持ち主が終了済みのリースを元の名前に戻す
+
+        Returns:
+            int: 戻したファイル数
+        """
+        if not self.watch_folder.exists():
+            return 0
+
+        count = 0
+        now = time.time()
+        for claimed in self.watch_folder.glob(f"*{CLAIM_MARK}*"):
+            claim = _parse_claim(claimed)
+            if claim is None:
+                continue
+            host, pid, claimed_at = claim
+            if (host, pid) == (self.host, self.pid) and claimed_at >= int(self.started_at):
+                continue   # 自分が処理中（PIDが再利用された前回分は回収する）
+
+            age = now - claimed_at
+            if age > self.lease_seconds:
+                reason = f"リース期限切れ（{age:.0f}秒）"
+            elif host == self.host and (pid == self.pid or not _pid_alive(pid)):
+                reason = f"このPCの終了済みプロセス（PID {pid}）"
+            else:
+                continue
+
+            if self.release(claimed):
+                logger.warning(f"♻️ リースを回収: {original_name(claimed)} ← {host}.{pid}: {reason}")
+                count += 1
+        return count
+
+    # ------------------------------------------------------------
+    # ノード別の処理件数
+    # ------------------------------------------------------------
+
+    @property
+    def nodes_folder(self) -> Path:
+        return self.watch_folder / NODES_DIR_NAME
+
+    def maybe_write_stats(self, snapshot: Dict[str, Any]) -> bool:
+        """stats_interval 秒ごとに自ノードの処理件数を書き出す（書き出したらTrue）"""
+        now = time.time()
+        if now - self._last_stats < self.stats_interval:
+            return False
+        self._last_stats = now
+
+        stats = {
+            "node": self.node_id,
+            "host": self.host,
+            "pid": self.pid,
+            "updated": now,
+            "jobs_per_hour": snapshot.get("jobs_per_hour", 0),
+            "total": snapshot.get("total", 0),
+            "total_success": snapshot.get("total_success", 0),
+        }
+        path = self.nodes_folder / f"{self.node_id}.json"
+        tmp = path.with_suffix(".json.tmp")
+        try:
+            self.nodes_folder.mkdir(parents=True, exist_ok=True)
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(stats, f, ensure_ascii=False)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning(f"⚠️ ノード統計の書き出しエラー: {e}")
+            return False
+        return True
+
+    def read_node_stats(self) -> List[Dict[str, Any]]:
+        """稼働中の全ノードの処理件数（ホスト名順）。古いノードのファイルは削除する"""
+        nodes = []
+        now = time.time()
+        for path in self.nodes_folder.glob("*.json"):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    stats = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if now - stats.get("updated", 0) > NODE_STALE_SECONDS:
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+                continue
+            nodes.append(stats)
+        return sorted(nodes, key=lambda s: s.get("node", ""))
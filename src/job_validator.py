@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""
+ジョブ事前検証モジュール
+========================
+ブラウザを起動する前に、ジョブJSONの内容をテンプレートの必須変数・型と照合する。
+
+v1.0.0 - 新規作成 (2026/10/18)
+  - 旧: homisId 未設定・未対応action・テンプレート変数の空欄（{sContent} が空など）・
+        日付形式の誤りは、Chrome起動・ログイン後にようやく判明していた
+  - 新: JSON読み込み直後にミリ秒単位で検証し、どの項目が不正かをエラーに含める
+
+テンプレート側の定義（templates/*.yaml）:
+    variables:
+      homisId:       {type: id}
+      shootingDate:  {type: date}
+      shootingTime:  {type: time}
+      sContent:      {type: text}
+      memo:          {type: text, required: false}
+
+    ※ variables がないテンプレートは target_url / steps / on_complete 内の
+       {変数名} をすべて必須（text型）として扱う
+
+型:
+    id   : 数字のみ（HOMIS患者ID）
+    date : YYYY-MM-DD（実在する日付）
+    time : HH:MM
+    text : 空でない文字列
+
+使い方:
+    from job_validator import validate_job
+    errors = validate_job(data, config)   # 空リストならOK
+"""
+
+import re
+import logging
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+import yaml
+
+from paths import TEMPLATES_DIR
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_ACTIONS = ("homis_karte_write",)
+
+_PLACEHOLDER = re.compile(r"\{(\w+)\}")
+_TIME = re.compile(r"([01]\d|2[0-3]):[0-5]\d")
+
+# テンプレートのキャッシュ {テンプレート名: (更新日時, variables定義)}
+_template_cache: Dict[str, Tuple[float, Dict[str, Dict[str, Any]]]] = {}
+
+
+def _check_type(value: Any, type_name: str) -> Optional[str]:
+    """型チェック（問題があればエラー内容、なければNone）"""
+    text = "" if value is None else str(value).strip()
+    if type_name == "id":
+        if not text.isdigit():
+            return f"数字のIDではありません: {value!r}"
+    elif type_name == "date":
+        try:
+            datetime.strptime(text, "%Y-%m-%d")
+        except ValueError:
+            return f"日付はYYYY-MM-DD形式で指定してください: {value!r}"
+    elif type_name == "time":
+        if not _TIME.fullmatch(text):
+            return f"時刻はHH:MM形式で指定してください: {value!r}"
+    return None
+
+
+def _collect_placeholders(node: Any, found: Dict[str, Dict[str, Any]]):
+    """テンプレート内の {変数名} を再帰的に収集"""
+    if isinstance(node, str):
+        for name in _PLACEHOLDER.findall(node):
+            found.setdefault(name, {"type": "text"})
+    elif isinstance(node, dict):
+        for value in node.values():
+            _collect_placeholders(value, found)
+    elif isinstance(node, list):
+        for value in node:
+            _collect_placeholders(value, found)
+
+
+def template_variables(template_name: str) -> Optional[Dict[str, Dict[str, Any]]]:
+    """
+    テンプレートの変数定義を返す（テンプレートがなければNone）
+    ファイルの更新日時が変わらない限りキャッシュを使う
+    """
+    path = TEMPLATES_DIR / f"{template_name}.yaml"
+    try:
+        mtime = path.stat().st_mtime
+    except OSError:
+        return None
+
+    cached = _template_cache.get(template_name)
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    with open(path, "r", encoding="utf-8") as f:
+        template = yaml.safe_load(f) or {}
+
+    variables = template.get("variables")
+    if variables:
+        variables = {name: (spec or {}) for name, spec in variables.items()}
+    else:
+        variables = {}
+        for key in ("target_url", "steps", "on_complete"):
+            _collect_placeholders(template.get(key), variables)
+
+    _template_cache[template_name] = (mtime, variables)
+    return variables
+
+
+def validate_job(job: Dict[str, Any], config: Dict[str, Any]) -> List[str]:
+    """
+    ジョブJSONを検証
+
+    Args:
+        job: ジョブJSON全体（action, template, data, job_id ...）
+        config: 設定（test_mode 時は homisId を検証しない＝テスト患者IDに置き換わるため）
+
+    Returns:
+        list: エラー内容のリスト（「項目名: 内容」形式）。空ならOK
+    """
+    errors = []
+
+    action = job.get("action", "")
+    if action not in SUPPORTED_ACTIONS:
+        errors.append(f"action: 未対応のアクションです: {action!r}")
+
+    data = job.get("data")
+    if not isinstance(data, dict):
+        errors.append("data: オブジェクトではありません")
+        return errors
+
+    test_mode = config.get("test_mode", True)
+    if not test_mode:
+        problem = _check_type(data.get("homisId"), "id")
+        if problem:
+            errors.append(f"homisId: {problem}")
+
+    template_name = job.get("template", "")
+    if not template_name:
+        # 従来方式（homis_writer）: 日付項目の形式だけ確認
+        if data.get("shootingDate"):
+            problem = _check_type(data["shootingDate"], "date")
+            if problem:
+                errors.append(f"shootingDate: {problem}")
+        return errors
+
+    try:
+        variables = template_variables(template_name)
+    except Exception as e:
+        errors.append(f"template: テンプレートを読み込めません: {template_name} ({e})")
+        return errors
+    if variables is None:
+        errors.append(f"template: テンプレートが見つかりません: {template_name}")
+        return errors
+
+    for name, spec in variables.items():
+        if name == "homisId":
+            continue  # 上でチェック済み（テストモードはテスト患者IDに置き換わる）
+        value = data.get(name)
+        if value is None or str(value).strip() == "":
+            if spec.get("required", True):
+                errors.append(f"{name}: 値が空です（テンプレート {template_name} で必須）")
+            continue
+        problem = _check_type(value, spec.get("type", "text"))
+        if problem:
+            errors.append(f"{name}: {problem}")
+
+    return errors
@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+"""
+ログ設定モジュール
+==================
+ログ出力を非同期化し、共有ドライブへの書き込みを処理ループから切り離す。
+
+v1.0.0 - 新規作成 (2026/10/18)
+  - 旧: logging.FileHandler で共有ドライブ（LOG_DIR）に毎行同期書き込み
+        ファイル名は起動時の日付で固定（0:00をまたぐと前日のファイルに書き続ける）
+  - 新: QueueHandler → QueueListener（別スレッド）→ ローカル（LOCAL_LOG_DIR）に書き込み
+        日付が変わったら新しいファイルに切り替え
+        共有ドライブ（LOG_DIR）へは gzip 圧縮してバックグラウンドで転送
+
+ファイル:
+  - ローカル: LOCAL_LOG_DIR/watcher_YYYYMMDD.log   （LOCAL_RETENTION_DAYS 日保持）
+  - 共有:     LOG_DIR/watcher_YYYYMMDD.log.gz      （当日分は SHIP_INTERVAL 秒ごとに更新）
+
+使い方:
+    from log_setup import setup_logging
+    setup_logging()   # 何回呼んでも1回だけ設定される
+"""
+
+import os
+import gzip
+import time
+import queue
+import atexit
+import shutil
+import logging
+import threading
+import logging.handlers
+from pathlib import Path
+from datetime import datetime, timedelta
+from typing import Optional
+
+from paths import LOG_DIR, LOCAL_LOG_DIR
+
+LOG_FORMAT = '%(asctime)s [%(levelname)s] %(message)s'
+LOG_PREFIX = "watcher_"
+
+SHIP_INTERVAL = 300          # 当日分のログを共有ドライブへ転送する間隔（秒）
+FLUSH_INTERVAL = 1.0         # ローカルファイルをフラッシュする最大間隔（秒）
+LOCAL_RETENTION_DAYS = 7     # ローカルに残す日数（転送済みのもの）
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_shipper: Optional["LogShipper"] = None
+
+
+def _log_name(day) -> str:
+    return f"{LOG_PREFIX}{day.strftime('%Y%m%d')}.log"
+
+
+class DailyFileHandler(logging.Handler):
+    """
+    日付ごとのファイルに書き込むハンドラ（QueueListenerのスレッドから呼ばれる）
+    レコードの日付が変わったら新しいファイルを開き、前日分を転送キューに渡す。
+    """
+
+    def __init__(self, folder: Path, on_rollover=None):
+        super().__init__()
+        self.folder = folder
+        self.on_rollover = on_rollover
+        self._day = None
+        self._path: Optional[Path] = None
+        self._stream = None
+        self._last_flush = 0.0
+
+    @property
+    def current_path(self) -> Optional[Path]:
+        return self._path
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            day = datetime.fromtimestamp(record.created).date()
+            if day != self._day:
+                self._rollover(day)
+            self._stream.write(self.format(record) + "\n")
+
+            # 毎行フラッシュはしない（警告以上は即時、それ以外は間隔ごと）
+            now = time.time()
+            if record.levelno >= logging.WARNING or now - self._last_flush >= FLUSH_INTERVAL:
+                self._stream.flush()
+                self._last_flush = now
+        except Exception:
+            self.handleError(record)
+
+    def _rollover(self, day):
+        """日付が変わったらファイルを切り替え"""
+        old_path = self._path
+        if self._stream:
+            self._stream.close()
+        self.folder.mkdir(parents=True, exist_ok=True)
+        self._day = day
+        self._path = self.folder / _log_name(day)
+        self._stream = open(self._path, "a", encoding="utf-8")
+        if old_path and self.on_rollover:
+            self.on_rollover(old_path)
+
+    def flush(self):
+        self.acquire()
+        try:
+            if self._stream:
+                self._stream.flush()
+                self._last_flush = time.time()
+        finally:
+            self.release()
+
+    def close(self):
+        self.acquire()
+        try:
+            if self._stream:
+                self._stream.close()
+                self._stream = None
+        finally:
+            self.release()
+        super().close()
+
+
+class LogShipper:
+    """ローカルのログを gzip 圧縮して共有ドライブ（LOG_DIR）に転送するスレッド"""
+
+    def __init__(self, handler: DailyFileHandler, local_dir: Path, remote_dir: Path):
+        self.handler = handler
+        self.local_dir = local_dir
+        self.remote_dir = remote_dir
+        self._pending: "queue.Queue[Path]" = queue.Queue()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="LogShipper", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def request(self, path: Path):
+        """転送を依頼（日付切り替え時に呼ばれる）"""
+        self._pending.put(path)
+
+    def stop(self):
+        """停止して当日分を最後に転送"""
+        self._stop.set()
+        self._pending.put(None)
+        self._thread.join(timeout=10)
+        self.ship_current()
+
+    def _run(self):
+        self._ship_leftovers()
+        next_snapshot = time.time() + SHIP_INTERVAL
+        while not self._stop.is_set():
+            try:
+                path = self._pending.get(timeout=max(0.0, next_snapshot - time.time()))
+                if path is not None:
+                    self._ship(path)
+                    self._purge_old()
+            except queue.Empty:
+                self.ship_current()
+                next_snapshot = time.time() + SHIP_INTERVAL
+
+    def ship_current(self):
+        """当日分（書き込み中）のスナップショットを転送"""
+        path = self.handler.current_path
+        if path and path.exists():
+            self.handler.flush()
+            self._ship(path)
+
+    def _ship_leftovers(self):
+        """起動時: 前回までに転送しきれなかった過去日のログを転送"""
+        today = _log_name(datetime.now())
+        for path in sorted(self.local_dir.glob(f"{LOG_PREFIX}*.log")):
+            if path.name == today:
+                continue
+            remote = self.remote_dir / (path.name + ".gz")
+            if not remote.exists() or remote.stat().st_mtime < path.stat().st_mtime:
+                self._ship(path)
+        self._purge_old()
+
+    def _ship(self, path: Path):
+        """gzip圧縮して共有ドライブに置く（一時ファイル → 置き換えで中途半端なファイルを見せない）"""
+        remote = self.remote_dir / (path.name + ".gz")
+        tmp = self.remote_dir / (path.name + ".gz.tmp")
+        try:
+            self.remote_dir.mkdir(parents=True, exist_ok=True)
+            with open(path, "rb") as src, gzip.open(tmp, "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            os.replace(tmp, remote)
+        except Exception as e:
+            # ログ転送の失敗でログを出すと再帰するため、標準エラーにだけ出す
+            print(f"ログ転送エラー: {path.name} - {e}")
+            try:
+                tmp.unlink()
+            except OSError:
+                pass
+
+    def _purge_old(self):
+        """転送済みで保持期間を過ぎたローカルログを削除"""
+        limit = (datetime.now() - timedelta(days=LOCAL_RETENTION_DAYS)).strftime("%Y%m%d")
+        for path in self.local_dir.glob(f"{LOG_PREFIX}*.log"):
+            day = path.stem[len(LOG_PREFIX):]
+            if day < limit and (self.remote_dir / (path.name + ".gz")).exists():
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+
+
+def setup_logging(level: int = logging.INFO):
+    """
+    ルートロガーに非同期ログを設定（2回目以降は何もしない）
+
+    コンソール出力とローカルファイル書き込みは QueueListener のスレッドで行い、
+    呼び出し元（監視ループ等）は QueueHandler でキューに積むだけになる。
+    """
+    global _listener, _shipper
+    if _listener is not None:
+        return
+
+    formatter = logging.Formatter(LOG_FORMAT)
+
+    console = logging.StreamHandler()
+    console.setFormatter(formatter)
+
+    file_handler = DailyFileHandler(LOCAL_LOG_DIR)
+    file_handler.setFormatter(formatter)
+
+    if LOCAL_LOG_DIR.resolve() != LOG_DIR.resolve():
+        _shipper = LogShipper(file_handler, LOCAL_LOG_DIR, LOG_DIR)
+        file_handler.on_rollover = _shipper.request
+        _shipper.start()
+
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(-1)
+    _listener = logging.handlers.QueueListener(
+        log_queue, console, file_handler, respect_handler_level=True
+    )
+    _listener.start()
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """キューに残ったログを書き出し、当日分を共有ドライブに転送して終了"""
+    global _listener, _shipper
+    if _listener is not None:
+        _listener.stop()   # キューを全て処理してから停止
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+    if _shipper is not None:
+        _shipper.stop()
+        _shipper = None
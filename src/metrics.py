@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""
+処理メトリクス集計モジュール
+============================
+フォルダ監視（watcher.py）の処理状況を集計し、GUIのダッシュボードに渡す。
+
+v1.0.0 - 新規作成 (2026/10/18)
+v1.1.0 - 複数PC運用時のノード別処理件数（job_lease.py が書き出したもの）を追加 (2026/10/18)
+v1.2.0 - ジョブあたりのWebDriverコマンド数・時間（種類別）を追加 (2026/10/18)
+
+集計する項目:
+  - 待ち件数（スキャンで見つかった未処理ファイル数）
+  - 直近1時間の処理件数・成功率
+  - エンドツーエンド遅延（ファイル作成 → 処理完了）の p50 / p95
+  - 工程別の平均所要時間（parse / homis / post）
+  - ブラウザの状態
+  - ノード別の処理件数/時（複数PCで監視している場合）
+  - ジョブあたりのWebDriverコマンド数・時間（browser_session.CommandCounter の集計）
+
+使い方:
+    from metrics import WatcherMetrics
+
+    metrics = WatcherMetrics()
+    timer = metrics.start_job(queued_at=file_mtime)
+    ...JSON読み込み...
+    timer.lap("parse")
+    ...Homis書き込み...
+    timer.lap("homis")
+    timer.commands = session.commands.take()   # ブラウザを使ったジョブのみ
+    metrics.finish_job(timer, success=True)
+
+    snapshot = metrics.snapshot()   # 別スレッド（GUI）から読んでもOK
+
+※ 書き込みは監視スレッド、読み出しはGUIスレッドから行うため、
+   すべての操作をロックで保護している。
+"""
+
+import math
+import time
+import threading
+from collections import deque
+from typing import Dict, Any, Optional, Tuple
+
+# 集計に使う直近の件数・期間
+RECENT_JOBS = 500        # 遅延・成功率の計算に使う直近の件数
+RECENT_STAGES = 200      # 工程別平均に使う直近の件数
+THROUGHPUT_WINDOW = 3600  # 処理件数/時の集計期間（秒）
+
+# 工程名（表示順）
+STAGES = ("parse", "homis", "post")
+
+
+class JobTimer:
+    """1ジョブ分の工程タイマー（lap() ごとに前回からの経過時間を記録）"""
+
+    def __init__(self, queued_at: Optional[float] = None):
+        now = time.time()
+        self.started_at = now
+        # 作成時刻が未来（時計ずれ）や不明の場合は処理開始時刻を使う
+        self.queued_at = queued_at if queued_at and queued_at <= now else now
+        self._last = now
+        self.stages: Dict[str, float] = {}
+        # WebDriverコマンド {コマンド名: (回数, 秒)}（ブラウザを使わなかったジョブは空）
+        self.commands: Dict[str, Tuple[int, float]] = {}
+
+    def lap(self, stage: str):
+        """前回の lap() からの経過時間を stage の所要時間として記録"""
+        now = time.time()
+        self.stages[stage] = self.stages.get(stage, 0.0) + (now - self._last)
+        self._last = now
+
+
+class WatcherMetrics:
+    """監視処理のメトリクス（スレッドセーフ）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._completed = deque(maxlen=RECENT_JOBS)  # (完了時刻, 成功, 遅延秒)
+        self._stages = {stage: deque(maxlen=RECENT_STAGES) for stage in STAGES}
+        self._commands = deque(maxlen=RECENT_STAGES)  # ジョブごとの {コマンド名: (回数, 秒)}
+        self._queue_depth = 0
+        self._browser_state = "未起動"
+        self._nodes = []
+        self._total = 0
+        self._total_success = 0
+
+    # ------------------------------------------------------------
+    # 記録（監視スレッドから呼ぶ）
+    # ------------------------------------------------------------
+
+    def set_queue_depth(self, depth: int):
+        """待ち件数を設定（スキャン直後に呼ぶ）"""
+        with self._lock:
+            self._queue_depth = max(0, depth)
+
+    def set_browser_state(self, state: str):
+        """ブラウザの状態を設定（表示用の文字列）"""
+        with self._lock:
+            self._browser_state = state
+
+    def set_nodes(self, nodes: list):
+        """稼働中ノードの処理件数を設定（JobLeaseManager.read_node_stats() の結果）"""
+        with self._lock:
+            self._nodes = list(nodes)
+
+    def start_job(self, queued_at: Optional[float] = None) -> JobTimer:
+        """ジョブ開始（queued_at: ファイル作成時刻。不明ならNone）"""
+        return JobTimer(queued_at)
+
+    def finish_job(self, timer: JobTimer, success: bool):
+        """ジョブ完了を記録（最後の lap 以降は post 工程として計上）"""
+        timer.lap("post")
+        now = time.time()
+        with self._lock:
+            self._completed.append((now, success, now - timer.queued_at))
+            for stage, seconds in timer.stages.items():
+                if stage in self._stages:
+                    self._stages[stage].append(seconds)
+            if timer.commands:
+                self._commands.append(dict(timer.commands))
+            self._queue_depth = max(0, self._queue_depth - 1)
+            self._total += 1
+            if success:
+                self._total_success += 1
+
+    # ------------------------------------------------------------
+    # 読み出し（GUIスレッドから呼ぶ）
+    # ------------------------------------------------------------
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        現在の集計値を返す
+
+        Returns:
+            dict: queue_depth, jobs_per_hour, success_rate(0-100 or None),
+                  latency_p50, latency_p95（秒 or None）,
+                  stages({工程名: 平均秒 or None}), browser_state,
+                  nodes([{node, host, jobs_per_hour, ...}]),
+                  webdriver({commands_per_job, seconds_per_job,
+                             by_command: {コマンド名: {per_job, avg_ms}}}。データなしは None),
+                  total, total_success（起動後の累計）
+        """
+        now = time.time()
+        with self._lock:
+            completed = list(self._completed)
+            stages = {stage: list(values) for stage, values in self._stages.items()}
+            commands = list(self._commands)
+            queue_depth = self._queue_depth
+            browser_state = self._browser_state
+            nodes = list(self._nodes)
+            total = self._total
+            total_success = self._total_success
+
+        recent = [c for c in completed if now - c[0] <= THROUGHPUT_WINDOW]
+        latencies = sorted(c[2] for c in completed)
+
+        return {
+            "queue_depth": queue_depth,
+            "jobs_per_hour": len(recent),
+            "success_rate": (
+                100.0 * sum(1 for c in recent if c[1]) / len(recent) if recent else None
+            ),
+            "latency_p50": _percentile(latencies, 50),
+            "latency_p95": _percentile(latencies, 95),
+            "stages": {
+                stage: (sum(values) / len(values) if values else None)
+                for stage, values in stages.items()
+            },
+            "browser_state": browser_state,
+            "nodes": nodes,
+            "webdriver": _summarize_commands(commands),
+            "total": total,
+            "total_success": total_success,
+        }
+
+
+def _summarize_commands(jobs: list) -> Optional[Dict[str, Any]]:
+    """ジョブごとのWebDriverコマンド集計を平均する（回数の多い順）"""
+    if not jobs:
+        return None
+    totals: Dict[str, list] = {}
+    for job in jobs:
+        for command, (count, seconds) in job.items():
+            item = totals.setdefault(command, [0, 0.0])
+            item[0] += count
+            item[1] += seconds
+    ordered = sorted(totals.items(), key=lambda item: item[1][0], reverse=True)
+    return {
+        "commands_per_job": sum(count for count, _ in totals.values()) / len(jobs),
+        "seconds_per_job": sum(seconds for _, seconds in totals.values()) / len(jobs),
+        "by_command": {
+            command: {"per_job": count / len(jobs), "avg_ms": 1000 * seconds / count}
+            for command, (count, seconds) in ordered
+        },
+    }
+
+
+def _percentile(sorted_values: list, pct: float) -> Optional[float]:
+    """ソート済みリストのパーセンタイル（nearest-rank方式）"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
@@ -5,14 +5,18 @@
 HOMISカルテライターの全パスを一元管理する。
 
 v2.0.2 - 新規作成 (2026/06/19)
+v2.2.0 - LOCAL_LOG_DIR 追加（ログはローカルに書いて共有ドライブへ非同期転送） (2026/10/18)
 
 パス設計:
   - CODE_DIR: コードの場所（共有ドライブ）= Path(__file__).parent
   - STATE_DIR: 状態ファイルの場所（ローカル C:\HomisKarteWriter）
     heartbeat.txt, homis_writer.pid, last_restart.txt, watchdog.log
   - LOG_DIR: ログの場所 = CODE_DIR / "logs"（共有ドライブ）
+    ※ v2.2.0: 直接は書かず、log_setup.py が gzip 圧縮して転送する
+  - LOCAL_LOG_DIR: ログの書き込み先 = STATE_DIR / "logs_local"（ローカル）
   - CONFIG_FILE: 設定ファイル = STATE_DIR / "config.json"（ローカル）
     ※ ローカルの config.json を正として読む
+  - TEMPLATES_DIR: YAMLテンプレート = CODE_DIR / "templates"
 
 使い方:
     from paths import CODE_DIR, STATE_DIR, LOG_DIR, CONFIG_FILE
@@ -36,6 +40,10 @@ else:
 LOG_DIR = CODE_DIR / "logs"
 LOG_DIR.mkdir(exist_ok=True)
 
+# ログの書き込み先（ローカル）。共有ドライブへは log_setup.py が転送する
+LOCAL_LOG_DIR = STATE_DIR / "logs_local"
+LOCAL_LOG_DIR.mkdir(exist_ok=True)
+
 # 設定ファイル（ローカル優先、なければ共有ドライブ）
 _local_config = STATE_DIR / "config.json"
 _code_config = CODE_DIR / "config.json"
@@ -44,6 +52,9 @@ if _local_config.exists():
 else:
     CONFIG_FILE = _code_config
 
+# テンプレート（YAML）の場所
+TEMPLATES_DIR = CODE_DIR / "templates"
+
 # 状態ファイルのパス
 HEARTBEAT_FILE = STATE_DIR / "heartbeat.txt"
 PID_FILE = STATE_DIR / "homis_writer.pid"
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""
+失敗ジョブの再試行・デッドレター
+================================
+失敗の種類ごとに再試行回数と待ち時間（指数バックオフ）を決め、
+再試行しないもの・回数を使い切ったものはデッドレターフォルダに移す。
+
+v1.0.0 - 新規作成 (2026/10/18)
+  - 旧: ブラウザ処理の失敗は即「済」へ（Homisの一時的な不調でも人が戻すまで未処理）
+        想定外のエラーはフォルダに残るが、再起動まで二度と処理されない
+  - 新: 一時的な失敗は待ち時間を倍々にしながら自動で再試行
+        人の確認が必要なものは デッドレターフォルダ（既定: 監視フォルダ/失敗）に
+        エラー内容（<ファイル名>.error.json）と一緒に移す
+v1.1.0 - 複合ジョブの要素ごとの結果をデッドレターに残す (2026/10/18)
+v1.2.0 - 画面遷移の失敗（navigation）・ステップ失敗（step_failed）を分けて再試行 (2026/10/18)
+
+失敗の種類（error_class）:
+    transient   : ブラウザのエラー・従来方式（homis_writer）の失敗（既定: 5回まで）
+    navigation  : 患者ページへ移動できない（Homisの停止・タイムアウト。既定: 5回まで）
+    login       : ログイン失敗（既定: 3回まで、長めに待つ）
+    step_failed : 重要ステップの失敗・テンプレート実行エラー（Homisには届いている。
+                  入力データ・画面側の問題なので、既定: 2回まで・間隔は長め）
+    unexpected  : 監視処理内の想定外のエラー（既定: 3回まで）
+    url_missing : カルテ作成済み・URL取得失敗・保存ステップ後のセッション切れ
+                  → 再試行しない（再実行すると二重カルテ）
+    ui_changed  : Homisの画面構成の変更を検出（既定: 5回まで、10分〜1時間待つ）
+    invalid     : 入力検証エラー・壊れたJSON・未対応action・読み込めない状態が続くファイル → 再試行しない
+
+再試行の仕組み:
+    ジョブJSONに "_retry": {"attempts": 試行回数, "history": [...]} を追記して
+    XXX.json.retry.<再試行時刻(UNIX秒)> というファイル名で監視フォルダに置く。
+    時刻を過ぎたら元の名前に戻し、通常のジョブとして処理される（複数PC・再起動後も有効）。
+    ※ バンドル（.jsonl）の行は再試行しない（結果は行ごとに results.json に残る）
+    ※ 複合ジョブ（templates）は要素ごとの結果を "_results" に残し、再試行時は終わった要素を飛ばす
+
+設定（config.json）:
+    "retry": {
+        "dead_letter_folder": "",        # 空なら 監視フォルダ/失敗
+        "policies": {
+            "transient":  {"max_attempts": 5, "base_delay": 30,  "max_delay": 900},
+            "navigation": {"max_attempts": 5, "base_delay": 30,  "max_delay": 900},
+            "login":      {"max_attempts": 3, "base_delay": 300, "max_delay": 1800},
+            "step_failed": {"max_attempts": 2, "base_delay": 300, "max_delay": 300},
+            "unexpected": {"max_attempts": 3, "base_delay": 60,  "max_delay": 900},
+            "ui_changed": {"max_attempts": 5, "base_delay": 600, "max_delay": 3600}
+        }
+    }
+    max_attempts は初回を含む試行回数。待ち時間 = base_delay × 2^(試行回数-1)（max_delay まで）
+"""
+
+import os
+import json
+import time
+import shutil
+import logging
+from pathlib import Path
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+RETRY_MARK = ".retry."
+RETRY_KEY = "_retry"
+DEAD_LETTER_DIR_NAME = "失敗"
+MAX_HISTORY = 10
+
+DEFAULT_POLICIES: Dict[str, Dict[str, float]] = {
+    "transient": {"max_attempts": 5, "base_delay": 30, "max_delay": 900},
+    "navigation": {"max_attempts": 5, "base_delay": 30, "max_delay": 900},
+    "login": {"max_attempts": 3, "base_delay": 300, "max_delay": 1800},
+    "step_failed": {"max_attempts": 2, "base_delay": 300, "max_delay": 300},
+    "unexpected": {"max_attempts": 3, "base_delay": 60, "max_delay": 900},
+    "ui_changed": {"max_attempts": 5, "base_delay": 600, "max_delay": 3600},
+}
+
+
+class RetryPolicy:
+    """失敗ジョブの再試行スケジュールとデッドレター"""
+
+    def __init__(self, watch_folder: Path, config: Optional[Dict[str, Any]] = None):
+        config = config or {}
+        self.watch_folder = Path(watch_folder)
+        dead_letter = config.get("dead_letter_folder", "")
+        self.dead_letter_folder = Path(dead_letter) if dead_letter else self.watch_folder / DEAD_LETTER_DIR_NAME
+        self.policies = {name: dict(policy) for name, policy in DEFAULT_POLICIES.items()}
+        for name, policy in config.get("policies", {}).items():
+            self.policies.setdefault(name, {}).update(policy)
+
+    @staticmethod
+    def attempts_of(job: Dict[str, Any]) -> int:
+        """これまでの試行回数（初回は0）"""
+        return int(job.get(RETRY_KEY, {}).get("attempts", 0))
+
+    def max_attempts(self, error_class: str) -> int:
+        return int(self.policies.get(error_class, {}).get("max_attempts", 1))
+
+    def retry_delay(self, error_class: str, attempts: int) -> Optional[float]:
+        """
+        次の再試行までの秒数（再試行しない・回数を使い切った場合は None）
+
+        Args:
+            attempts: 今回を含む試行回数
+        """
+        policy = self.policies.get(error_class)
+        if not policy or attempts >= policy.get("max_attempts", 1):
+            return None
+        delay = policy.get("base_delay", 30) * (2 ** (attempts - 1))
+        return min(delay, policy.get("max_delay", delay))
+
+    # ------------------------------------------------------------
+    # ファイル経由のジョブ
+    # ------------------------------------------------------------
+
+    def schedule(self, file_path: Path, name: str, job: Dict[str, Any],
+                 result: Dict[str, Any], attempts: int, delay: float) -> Path:
+        """
+        試行回数を追記したジョブを XXX.json.retry.<時刻> として監視フォルダに置き、
+        処理中のファイル（file_path）を削除する
+        """
+        due = int(time.time() + delay)
+        job = with_attempt(job, result, attempts)
+        target = self.watch_folder / f"{name}{RETRY_MARK}{due}"
+        tmp = self.watch_folder / f".{name}{RETRY_MARK}{due}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(job, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, target)
+        file_path.unlink()
+        return target
+
+    def release_due(self) -> int:
+        """再試行時刻を過ぎたファイルを元の名前に戻す（戻した件数を返す）"""
+        if not self.watch_folder.exists():
+            return 0
+        count = 0
+        now = time.time()
+        for path in self.watch_folder.glob(f"*{RETRY_MARK}*"):
+            name, _, due = path.name.rpartition(RETRY_MARK)
+            try:
+                if float(due) > now:
+                    continue
+            except ValueError:
+                continue
+            target = path.with_name(name)
+            if target.exists():
+                continue   # 同名の新しいジョブが来ている（そちらの処理後に戻す）
+            try:
+                os.rename(path, target)
+            except OSError:
+                continue   # 他のPCが先に戻した
+            logger.info(f"🔁 再試行します: {name}")
+            count += 1
+        return count
+
+    def dead_letter(self, file_path: Path, name: str, result: Dict[str, Any], attempts: int) -> Path:
+        """デッドレターフォルダに移し、<ファイル名>.error.json にエラー内容を残す"""
+        self.dead_letter_folder.mkdir(parents=True, exist_ok=True)
+        dest = self.dead_letter_folder / name
+        if dest.exists():
+            dest = self.dead_letter_folder / f"{Path(name).stem}_{datetime.now():%Y%m%d%H%M%S}{Path(name).suffix}"
+        shutil.move(str(file_path), str(dest))
+
+        info = {
+            "file": dest.name,
+            "error_class": result.get("error_class", ""),
+            "error": result.get("error", ""),
+            "attempts": attempts,
+            "karte_url": result.get("karte_url") or "",
+            "failed_at": datetime.now().isoformat(timespec="seconds"),
+        }
+        if result.get("results"):
+            info["results"] = result["results"]   # 複合ジョブの要素ごとの結果
+        try:
+            with open(dest.with_name(dest.name + ".error.json"), "w", encoding="utf-8") as f:
+                json.dump(info, f, ensure_ascii=False, indent=2)
+        except OSError as e:
+            logger.warning(f"⚠️ エラー内容を書き出せません: {dest.name} - {e}")
+        return dest
+
+
+def with_attempt(job: Dict[str, Any], result: Dict[str, Any], attempts: int) -> Dict[str, Any]:
+    """試行回数と失敗履歴を追記したジョブ（元のdictは変更しない）"""
+    retry = dict(job.get(RETRY_KEY, {}))
+    history = list(retry.get("history", []))
+    history.append({
+        "at": datetime.now().isoformat(timespec="seconds"),
+        "error_class": result.get("error_class", ""),
+        "error": result.get("error", ""),
+    })
+    retry["attempts"] = attempts
+    retry["history"] = history[-MAX_HISTORY:]
+    return {**job, RETRY_KEY: retry}
@@ -5,35 +5,86 @@
 YAMLテンプレートを読み込み、ブラウザ操作を実行
 
 v1.0.0 - 初版 (2026/01/26)
+v1.1.0 - ブラウザ起動を browser_session.py に移動、セッション共有に対応 (2026/10/18)
+v1.2.0 - 失敗時に error / error_class を返す（再試行の判断用） (2026/10/18)
+v1.3.0 - ステップ途中のセッション切れを検出し、その場で再ログインして再開 (2026/10/18)
+  - 旧: ログイン判定は最初のページ移動直後のみ。途中で切れると残りのステップが
+        1つずつタイムアウト → ジョブ全体を失敗・再試行
+  - 新: 画面遷移・失敗のたびにログイン画面か確認（browser_actions.SessionExpired）
+        再ログイン → 対象URLに戻り、直前のチェックポイント（checkpoint: true のステップ。
+        なければ最初のステップ）から再開。再ログインは1ジョブ auth.max_relogins 回（既定1回）まで
+v1.4.0 - 重要ステップの失敗で即中止・ステップ間の依存関係 (2026/10/18)
+  - 旧: ステップが失敗しても続行 → 後続ステップが1つずつ要素待ちタイムアウト（10秒）＋wait_after
+        を消費した末に、URLなしの「成功」になる
+  - 新: critical: true のステップが失敗したら即中止（どのステップかをエラーに含める）
+        depends_on: 前提ステップ名（複数可）が失敗・スキップされていたら待たずにスキップ
+        どちらも指定のないステップは従来どおり失敗しても続行
+v1.5.0 - 画面構成の確認（フィンガープリント）を追加 (2026/10/18)
+  - 旧: Homisの画面変更に気づけず、全ステップが要素待ちでタイムアウト → 数時間後にURLなしで発覚
+  - 新: 対象ページで fingerprint（テンプレートに定義した必須要素）の有無を
+        execute_script 1回で確認。ブラウザ起動（リサイクル含む）ごとに1回だけ行う
+        要素が見つからなければ error_class="ui_changed" で中止（監視側がキューを一時停止）
+v1.6.0 - 同じ患者ページの再利用 (2026/10/18)
+  - 旧: ジョブごとに target_url へ移動して3秒待機（同じ患者の連続ジョブでも再読み込み）
+  - 新: 直前のジョブが同じページで正常に終わっていて、fingerprint の要素がそろっていれば
+        移動・待機を省く（監視側が同じ homisId のジョブを続けて処理する）
+        config.json の "reuse_patient_page": false で無効
+v1.7.0 - 患者ページを移動するたびに新しいブラウザコンテキストで開く (2026/10/18)
+  - 前の患者のモーダル・フォーム・アラートを持ち越さない（browser_session.new_context）
+  - 同じ患者ページを再利用するときはコンテキストもそのまま
+v1.8.0 - 事前起動（warm_up）を追加 (2026/10/18)
+  - 業務開始前に、ブラウザ起動とログインだけを先に済ませる（browser_warmup.py）
+v1.8.1 - 失敗の種類を細分化（サーキットブレーカーの判断用） (2026/10/18)
+  - 旧: ページ移動の失敗・重要ステップの失敗・実行エラーはすべて transient
+  - 新: 対象URLへ移動できない → navigation（Homisに届かない。ブレーカーの連続失敗に数える）
+        重要ステップの失敗・実行エラー → step_failed（Homisには届いている。データ・画面側の問題）
+        ブラウザを起動できない → transient
+v1.8.2 - 保存ステップを押した後のセッション切れでは再開しない (2026/10/18)
+  - 旧: 保存ボタン（click）の後でセッション切れを検出すると、再ログインして
+        チェックポイント（なければ最初のステップ）から保存まで再実行 → 二重カルテ
+  - 新: 保存ステップ（commit: true。なければ最後のステップ）を実行した後の
+        セッション切れは error_class="url_missing"（再試行しない・人が確認）で中止
 """
 
 import yaml
 import logging
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from webdriver_manager.chrome import ChromeDriverManager
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import WebDriverException
 
-from browser_actions import BrowserActions
+from browser_actions import BrowserActions, SessionExpired, DEFAULT_WAIT_MODE
+from browser_session import BrowserSession
+from paths import TEMPLATES_DIR
 
 logger = logging.getLogger(__name__)
 
-# テンプレートディレクトリ
-TEMPLATES_DIR = Path(__file__).parent / "templates"
+# フィンガープリント不一致時の再確認（読み込み途中の誤検出を避ける）
+FINGERPRINT_RETRIES = 2
+FINGERPRINT_RETRY_DELAY = 1.0
+
+# 見つからないセレクタの一覧を返す（1回のWebDriverコマンドで全要素を確認）
+_FINGERPRINT_SCRIPT = "return arguments[0].filter(function (s) { return !document.querySelector(s); });"
 
 
 class TemplateEngine:
     """テンプレートエンジン"""
     
-    def __init__(self, config: Dict[str, Any], headless: bool = False):
+    def __init__(self, config: Dict[str, Any], headless: bool = False,
+                 session: Optional[BrowserSession] = None):
+        """
+        Args:
+            config: 設定辞書
+            headless: True=非表示モード（session未指定時のみ使用）
+            session: 共有ブラウザセッション。指定時はジョブ後もブラウザを閉じない
+        """
         self.config = config
         self.headless = headless
+        self.session = session
+        self._owns_session = session is None
         self.driver = None
         self.actions = None
     
@@ -55,30 +106,25 @@ class TemplateEngine:
             return None
     
     def _init_driver(self):
-        """WebDriverを初期化"""
+        """WebDriverを初期化（セッションから取得）"""
         if self.driver:
             return
         
-        options = Options()
-        if self.headless:
-            options.add_argument("--headless")
-        options.add_argument("--no-sandbox")
-        options.add_argument("--disable-dev-shm-usage")
-        options.add_argument("--window-size=1200,900")
-        
-        service = Service(ChromeDriverManager().install())
-        self.driver = webdriver.Chrome(service=service, options=options)
-        self.actions = BrowserActions(self.driver)
-        
-        logger.info(f"Chromeブラウザを起動しました（headless={self.headless}）")
+        if self.session is None:
+            self.session = BrowserSession(self.config, headless=self.headless)
+        self.driver = self.session.get_driver()
+        self.actions = BrowserActions(self.driver, wait_mode=self.config.get("wait_mode", DEFAULT_WAIT_MODE))
     
     def _close_driver(self):
-        """WebDriverを終了"""
-        if self.driver:
-            self.driver.quit()
-            self.driver = None
-            self.actions = None
-            logger.info("ブラウザを終了しました")
+        """WebDriverを終了（共有セッションの場合は閉じずに返却）"""
+        if not self.session:
+            return
+        if self._owns_session:
+            self.session.close()
+        else:
+            self.session.job_finished()
+        self.driver = None
+        self.actions = None
     
     def _do_login(self, auth_config: Dict[str, Any], target_url: str) -> bool:
         """ログイン処理（必要に応じて）- homis_writerと同じ方式"""
@@ -136,6 +182,149 @@ class TemplateEngine:
             traceback.print_exc()
             return False
 
+    def warm_up(self, url: str) -> bool:
+        """
+        ジョブの前にブラウザを起動し、ログインまで済ませておく（共有セッション用）
+        
+        Returns:
+            bool: ログイン済みの状態にできたらTrue
+        """
+        try:
+            self._init_driver()
+            self.session.new_context()
+            self.driver.get(url)
+            return self._do_login({"detect_login": True}, url)
+        except WebDriverException as e:
+            logger.warning(f"事前起動エラー: {e}")
+            self.session.mark_unhealthy(str(e))
+            return False
+        finally:
+            if self.session is not None:
+                self.session.job_finished(count=False)
+            self.driver = None
+            self.actions = None
+
+    def _can_reuse_page(self, target_url: str, template: Dict[str, Any]) -> bool:
+        """
+        前のジョブのページをそのまま使えるか
+        （同じURLで正常終了していて、今もそのURLにいて、fingerprint の要素がそろっている）
+        """
+        previous, self.session.current_page = self.session.current_page, None
+        if not self.config.get("reuse_patient_page", True) or previous != target_url:
+            return False
+        try:
+            if self.driver.current_url != target_url:
+                return False
+            selectors = template.get("fingerprint") or []
+            return not (selectors and self.driver.execute_script(_FINGERPRINT_SCRIPT, selectors))
+        except WebDriverException:
+            return False
+    
+    def _check_fingerprint(self, template_name: str, template: Dict[str, Any]) -> List[str]:
+        """
+        画面構成を確認（fingerprint の要素が対象ページにあるか）
+        同じブラウザ（世代）で確認済みなら何もしない
+        
+        Returns:
+            list: 見つからないセレクタ（空なら一致）
+        """
+        selectors = template.get("fingerprint") or []
+        if not selectors or self.session.verified.get(template_name) == self.session.generation:
+            return []
+        
+        import time
+        missing = self.driver.execute_script(_FINGERPRINT_SCRIPT, selectors)
+        for _ in range(FINGERPRINT_RETRIES):
+            if not missing:
+                break
+            time.sleep(FINGERPRINT_RETRY_DELAY)
+            missing = self.driver.execute_script(_FINGERPRINT_SCRIPT, missing)
+        
+        if missing:
+            return list(missing)
+        self.session.verified[template_name] = self.session.generation
+        logger.info(f"画面構成を確認しました（{len(selectors)}要素）")
+        return []
+    
+    def _run_steps(self, steps: List[Dict[str, Any]], data: Dict[str, Any],
+                   auth_config: Dict[str, Any], target_url: str,
+                   result: Dict[str, Any]) -> bool:
+        """
+        ステップを順に実行
+        - 通常のステップは失敗しても続行（エラー耐性）
+        - critical: true のステップが失敗したら即中止
+        - depends_on の前提ステップが失敗・スキップされていたら待たずにスキップ
+        - セッション切れを検出したら再ログインし、直前のチェックポイントから再開
+          （保存ステップを実行した後は再開しない。保存済みかもしれないので人が確認する）
+        
+        Returns:
+            bool: False=中止（result に error / error_class を設定）
+        """
+        index_of = {step.get("name"): i for i, step in enumerate(steps) if step.get("name")}
+        dependencies = []
+        for i, step in enumerate(steps):
+            names = step.get("depends_on") or []
+            names = [names] if isinstance(names, str) else list(names)
+            unknown = [name for name in names if index_of.get(name, i) >= i]
+            if unknown:
+                result.update(error=f"テンプレート不正: 「{step.get('name', 'unknown')}」の depends_on が"
+                                    f"前のステップを指していません: {unknown}", error_class="invalid")
+                return False
+            dependencies.append([index_of[name] for name in names])
+        commits = [i for i, step in enumerate(steps) if step.get("commit")]
+        commit_index = commits[0] if commits else len(steps) - 1
+        
+        max_relogins = auth_config.get("max_relogins", 1)
+        relogins = 0
+        checkpoint = 0
+        failed = set()   # 失敗・スキップしたステップ（番号）
+        index = 0
+        while index < len(steps):
+            step = steps[index]
+            name = step.get("name", "unknown")
+            if step.get("checkpoint"):
+                checkpoint = index
+            
+            missing = [steps[i].get("name") for i in dependencies[index] if i in failed]
+            if missing:
+                logger.warning(f"⏭ ステップをスキップ: {name}（前提の「{'」「'.join(missing)}」が失敗）")
+                failed.add(index)
+                index += 1
+                continue
+            
+            try:
+                succeeded = self.actions.execute_action(step, data)
+            except SessionExpired as e:
+                if index >= commit_index:
+                    # 保存ボタンは押せている可能性がある → やり直すと二重カルテ
+                    saved = steps[commit_index].get("name", "unknown")
+                    logger.error(f"保存ステップ「{saved}」の実行後にセッション切れ（{name}）: {e} — 再実行しません")
+                    result.update(error=f"保存ステップ「{saved}」の実行後にセッション切れ"
+                                        f"（カルテが作成済みか確認してください）", error_class="url_missing")
+                    return False
+                relogins += 1
+                if relogins > max_relogins:
+                    logger.error(f"セッション切れが続くため中止: {e}")
+                    result.update(error="セッション切れ後の再ログインに失敗", error_class="login")
+                    return False
+                resume = steps[checkpoint].get("name", "unknown")
+                logger.warning(f"🔑 セッション切れを検出: {e} — 再ログインして「{resume}」から再開")
+                if not self._do_login(auth_config, target_url):
+                    result.update(error="セッション切れ後の再ログインに失敗", error_class="login")
+                    return False
+                failed = {i for i in failed if i < checkpoint}
+                index = checkpoint
+                continue
+            
+            if not succeeded:
+                logger.error(f"ステップ失敗: {name}")
+                if step.get("critical"):
+                    result.update(error=f"ステップ失敗: {name}", error_class="step_failed")
+                    return False
+                failed.add(index)
+            index += 1
+        return True
+    
     def execute(self, template_name: str, data: Dict[str, Any]) -> Dict[str, Any]:
         """
         テンプレートを実行
@@ -146,6 +335,8 @@ class TemplateEngine:
         
         Returns:
             dict: {"success": bool, "karte_url": str or None}
+                  失敗時は "error"（内容）, "error_class"
+                  （navigation / login / step_failed / transient / invalid / ui_changed）も入る
         """
         result = {"success": False, "karte_url": None}
         
@@ -153,35 +344,59 @@ class TemplateEngine:
             # テンプレート読み込み
             template = self.load_template(template_name)
             if not template:
+                result.update(error=f"テンプレートを読み込めません: {template_name}", error_class="invalid")
                 return result
             
             # ドライバー初期化
-            self._init_driver()
+            try:
+                self._init_driver()
+            except Exception as e:
+                logger.error(f"❌ ブラウザを起動できません: {e}")
+                result.update(error=f"ブラウザを起動できません: {e}", error_class="transient")
+                return result
             
             # 対象URLに移動
             target_url = template.get("target_url", "")
             for key, value in data.items():
                 target_url = target_url.replace("{" + key + "}", str(value) if value else "")
             
-            logger.info(f"ページに移動: {target_url}")
-            self.driver.get(target_url)
-            
             import time
-            time.sleep(3)
+            if self._can_reuse_page(target_url, template):
+                logger.info(f"同じ患者ページを再利用（再読み込みなし）: {target_url}")
+            else:
+                logger.info(f"ページに移動: {target_url}")
+                try:
+                    self.session.new_context()   # 前の患者の画面状態を持ち越さない
+                    self.driver.get(target_url)
+                except WebDriverException as e:
+                    logger.error(f"❌ ページに移動できません: {e}")
+                    result.update(error=f"ページに移動できません: {e}", error_class="navigation")
+                    if not self._owns_session:
+                        self.session.mark_unhealthy(str(e))
+                    return result
+                time.sleep(3)
             
             # ログイン処理
             auth_config = template.get("auth", {})
             if auth_config:
                 if not self._do_login(auth_config, target_url):
                     logger.error("ログイン失敗")
+                    result.update(error="ログイン失敗", error_class="login")
                     return result
             
-            # ステップを実行
-            steps = template.get("steps", [])
-            for step in steps:
-                if not self.actions.execute_action(step, data):
-                    logger.error(f"ステップ失敗: {step.get('name', 'unknown')}")
-                    # 失敗しても続行（エラー耐性）
+            # 画面構成の確認（Homisの画面変更を全ステップのタイムアウト前に検出）
+            missing = self._check_fingerprint(template_name, template)
+            if missing:
+                result.update(error=f"画面構成の変更を検出（見つからない要素: {', '.join(missing)}）",
+                              error_class="ui_changed")
+                logger.error(f"❌ {result['error']}")
+                return result
+            
+            # ステップを実行（途中でセッションが切れたら再ログインして再開）
+            self.actions.detect_login = bool(auth_config.get("detect_login"))
+            if not self._run_steps(template.get("steps", []), data, auth_config, target_url, result):
+                logger.error(f"❌ テンプレート実行中止: {result['error']}")
+                return result
             
             # 完了後処理
             on_complete = template.get("on_complete", [])
@@ -194,7 +409,11 @@ class TemplateEngine:
                 clear_clipboard()
             
             for action in on_complete:
-                self.actions.execute_action(action, data)
+                try:
+                    self.actions.execute_action(action, data)
+                except SessionExpired as e:
+                    # 保存後は再実行できない（二重カルテ）ため、URL取得失敗として扱う
+                    logger.error(f"❌ {action.get('name', 'unknown')} 失敗: {e}")
             
             # OKボタンがあれば押す（アラート処理）
             try:
@@ -225,6 +444,7 @@ class TemplateEngine:
             
             result["success"] = True
             logger.info("✅ テンプレート実行成功")
+            self.session.current_page = target_url
             
             # テストモード時: 同じブラウザの新しいタブでURLを開く
             test_mode = self.config.get("test_mode", False)
@@ -238,11 +458,18 @@ class TemplateEngine:
             logger.error(f"❌ テンプレート実行エラー: {e}")
             import traceback
             traceback.print_exc()
+            result.update(error=f"テンプレート実行エラー: {e}", error_class="step_failed")
+            # 共有セッションの場合、ブラウザが壊れている可能性があるので次のジョブ前にリサイクル
+            if self.session and not self._owns_session:
+                self.session.mark_unhealthy(str(e))
         
         finally:
             import time
             test_mode = self.config.get("test_mode", False)
-            if test_mode:
+            if not self._owns_session:
+                # 共有セッション: ブラウザは閉じずに次のジョブで再利用
+                self._close_driver()
+            elif test_mode:
                 # テストモード: ブラウザを閉じずにそのまま（ユーザーが確認できるように）
                 logger.info("🧪 テストモード: ブラウザを開いたままにします")
             else:
@@ -18,9 +18,10 @@ import json
 import time
 import logging
 import shutil
+import threading
 from pathlib import Path
 from datetime import datetime
-from typing import Optional, Dict, List
+from typing import Any, Optional, Dict, List, Tuple, Callable, Set
 
 # ============================================================
 # バージョン情報
@@ -31,29 +32,37 @@ MODULE_VERSION_DATE = "2026-01-26"
 # ============================================================
 # パス設定（paths.py で一元管理）
 # ============================================================
-from paths import CODE_DIR, STATE_DIR, LOG_DIR, CONFIG_FILE
+from paths import CODE_DIR, STATE_DIR, LOG_DIR, LOCAL_LOG_DIR, CONFIG_FILE
+from metrics import WatcherMetrics
+from browser_session import BrowserSession
+from config_service import ConfigService
+from job_validator import validate_job
+from archive_compactor import ArchiveCompactor
+from job_lease import JobLeaseManager, original_name
+from job_api import JobApiServer, JobStatusStore, api_file_name, API_FILE_PREFIX, API_ID_KEY
+from job_bundle import (
+    is_bundle, read_bundle, BundleProgress, BUNDLE_SUFFIX,
+    is_compound, expand_compound, compound_keys, COMPOUND_RESULTS_KEY,
+)
+from file_readiness import ReadinessGate, FileNotReady, read_stable
+from retry_policy import RetryPolicy
+from circuit_breaker import CircuitBreaker, http_probe, OPEN, CLOSED, BREAKER_ERROR_CLASSES
+from browser_warmup import WarmupSchedule
 
 SRC_DIR = CODE_DIR  # 後方互換
 
 # ============================================================
 # ログ設定
 # ============================================================
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s [%(levelname)s] %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler(
-            LOG_DIR / f"watcher_{datetime.now().strftime('%Y%m%d')}.log",
-            encoding="utf-8"
-        )
-    ]
-)
+# v2.2.0: 非同期ログ（ローカルに書き込み、共有ドライブへは圧縮してバックグラウンド転送）
+from log_setup import setup_logging
+setup_logging()
 logger = logging.getLogger(__name__)
 # 起動時にパス情報をログ出力（どのコードが動いているか追跡用）
 logger.info(f"CODE_DIR: {CODE_DIR}")
 logger.info(f"STATE_DIR: {STATE_DIR}")
 logger.info(f"LOG_DIR: {LOG_DIR}")
+logger.info(f"LOCAL_LOG_DIR: {LOCAL_LOG_DIR}")
 logger.info(f"CONFIG_FILE: {CONFIG_FILE}")
 
 # ============================================================
@@ -86,9 +95,123 @@ DEFAULT_CONFIG = {
     
     # Google Chat通知設定
     "chat_webhook_url": "",          # Google Chat Webhook URL
+    
+    # ブラウザリサイクル設定（Chromeを使い回し、しきい値超過でブラウザだけ再起動）
+    "browser_recycle": {
+        "max_memory_mb": 1500,       # chromedriver + Chrome のメモリ合計（MB）
+        "max_jobs": 50,              # 起動後の処理件数
+    },
+    
+    # 要素待ちの方式（polling=従来のWebDriverWait / observer=ブラウザ内で監視して即応答）
+    # ※ observer は実際のHomisでベンチマーク（python browser_actions.py --bench）を取るまでオプトイン
+    "wait_mode": "polling",
+    
+    # 同じ患者のジョブを続けて処理し、患者ページの再読み込みを省く
+    "reuse_patient_page": True,
+    
+    # ジョブ間の分離（tab=1つのタブを使い続ける / context=患者ページごとに新しいブラウザコンテキスト）
+    # ※ context は2つ目以降のコンテキストがログイン済みで開けることを本番で確認するまでオプトイン
+    "job_isolation": "tab",
+    
+    # Chromeプロファイルの永続化（キャッシュ・Cookieを再起動後も使う。chrome_profile.py 参照）
+    "chrome_profile": {
+        "enabled": False,
+        "slots": 2,                  # 同じPCで同時に動かす監視プロセスの数まで
+        "max_size_mb": 500,          # 超えたら起動前にキャッシュを削除
+        "max_age_days": 14,          # 使われていないスロットを削除するまでの日数
+    },
+    
+    # 業務時間前のブラウザ事前起動・アイドル時の解放（browser_warmup.py 参照）
+    "browser_warmup": {
+        "enabled": False,            # True で有効（効果を確認するまでオプトイン）
+        "work_start": "08:30",
+        "work_end": "19:00",
+        "prewarm_minutes": 10,       # 業務開始の何分前から起動・ログインしておくか
+        "idle_release_minutes": 60,  # この時間使われなければChromeを終了（0=解放しない）
+    },
+    
+    # アプリ終了・再起動後も Chrome を残して再接続する（chrome_supervisor.py 参照）
+    "chrome_attach": {
+        "enabled": False,
+        "chrome_path": "",           # 空なら標準のインストール先から探す
+    },
+    
+    # 済フォルダのアーカイブ設定（古いJSONを日付別ZIP + 索引にまとめる）
+    "archive": {
+        "enabled": True,
+        "days": 14,                  # この日数より古いファイルをアーカイブ
+    },
+    
+    # 複数PCでの分担処理（ファイルをリネームして取得するリース方式）
+    "lease": {
+        "lease_seconds": 600,        # 取得から何秒で期限切れとして他のPCに戻すか
+        "stats_interval": 60,        # ノード別処理件数の書き出し間隔（秒）
+    },
+    
+    # ジョブ投入HTTP API（フォルダ経由より低遅延。job_api.py 参照）
+    "api": {
+        "enabled": False,
+        "host": "127.0.0.1",
+        "port": 8765,
+        "token": "",                 # 設定時は X-Api-Token ヘッダーで認証
+    },
+    
+    # 失敗ジョブの再試行・デッドレター（retry_policy.py 参照）
+    "retry": {
+        "dead_letter_folder": "",    # 空なら 監視フォルダ/失敗
+        "policies": {},              # 失敗の種類ごとの上書き（例: {"login": {"max_attempts": 1}}）
+    },
+    
+    # Homis障害時のサーキットブレーカー（circuit_breaker.py 参照）
+    "circuit_breaker": {
+        "failure_threshold": 3,      # 画面遷移・ログインの連続失敗この回数で処理を止める（ステップ失敗は数えない）
+        "probe_interval": 30,        # 停止中にHomisへHTTP確認する間隔（秒）
+        "probe_timeout": 5,
+        "ui_change_hold": 600,       # Homisの画面変更を検出したときの停止時間（秒）
+    },
+    
+    # 書き込み途中のファイル対策（file_readiness.py 参照）
+    "readiness": {
+        "stable_seconds": 2,         # サイズ・更新日時がこの秒数変わらなければ処理
+        "parse_retries": 3,          # 解析エラー時に書き込み中か確認する回数
+        "retry_delay": 1.0,          # 確認の間隔（秒）
+        "max_deferrals": 20,         # 読めない・書き込み中で後回しにする回数の上限（超えたらデッドレター）
+        "max_defer_seconds": 1800,   # 最初に後回しにしてからこの秒数を超えたらデッドレター
+    },
 }
 
 
+def _load_json(path: Path) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _patient_key(job: Any) -> str:
+    """ジョブの患者ID（homisId）。まとめ処理の並べ替え用（不明・data が不正なら空文字）"""
+    data = job.get("data") if isinstance(job, dict) else None
+    return str(data.get("homisId") or "") if isinstance(data, dict) else ""
+
+
+def group_by_patient(items: list, key: Callable[[Any], str]) -> list:
+    """
+    同じ患者のジョブが連続するように並べ替える（患者ページの再読み込みを省くため）
+    各患者の最初のジョブの位置は変えず、後ろにある同じ患者のジョブを手前に寄せる
+    """
+    first: Dict[str, int] = {}
+    order = []
+    for index, item in enumerate(items):
+        patient = key(item) or f"#{index}"   # 不明なものはまとめない
+        order.append(first.setdefault(patient, index))
+    return [item for _, item in sorted(zip(order, items), key=lambda pair: pair[0])]
+
+
+def _peek_patient(path: Path) -> str:
+    try:
+        return _patient_key(_load_json(path))
+    except (OSError, ValueError):
+        return ""   # バンドル・書き込み中などは並べ替えの対象外
+
+
 def load_config() -> dict:
     """設定ファイルを読み込み"""
     if CONFIG_FILE.exists():
@@ -133,15 +256,148 @@ class FolderWatcher:
         # {groupId: {"count": 処理済数, "expected": 予想数（不明なら-1）, "last_update": 最終更新時刻}}
         self.group_pending: dict = {}
         
+        # 失敗ジョブの再試行・デッドレター
+        self.retry_policy = RetryPolicy(self.watch_folder, config.get("retry", {}))
+        self._job_written = False
+        
+        # Homis障害時はブラウザを動かさずにHTTP確認で復旧を待つ
+        self.breaker = self._create_breaker()
+        self._outage_notified = False
+        
+        # 書き込み途中のファイルを処理しないための判定
+        readiness = config.get("readiness", {})
+        self.readiness = ReadinessGate(
+            readiness.get("stable_seconds", 2),
+            max_deferrals=readiness.get("max_deferrals", 20),
+            max_defer_seconds=readiness.get("max_defer_seconds", 1800),
+        )
+        
+        # 処理メトリクス（GUIダッシュボード用）
+        self.metrics = WatcherMetrics()
+        
+        # 共有ブラウザセッション（テンプレートエンジン用、初回ジョブか事前起動で起動）
+        self.browser_session: Optional[BrowserSession] = None
+        self.warmup = WarmupSchedule(config.get("browser_warmup", {}))
+        
+        # 済フォルダのアーカイブ（バックグラウンドで1時間ごと）
+        self.compactor = self._create_compactor()
+        
+        # 複数PCでの分担処理（処理前にファイルを取得＝リネーム）
+        self.leases = self._create_leases()
+        
+        # 設定ホットリロード（config.json の変更をサイクルの合間に反映）
+        self.config_service = ConfigService(CONFIG_FILE, load_config, current=config)
+        self.config_service.add_listener(self.apply_config)
+        
+        # 待機中のループを起こすためのイベント（停止時・API投入時など）
+        self._wake = threading.Event()
+        
+        # ジョブ投入API（受け付けたジョブは監視フォルダに書き出す、状態は job_id ごとに保持）
+        self.api_server: Optional[JobApiServer] = None
+        self.job_statuses = JobStatusStore()
+        
+        # stop() でブラウザを閉じているスレッド
+        self._closer: Optional[threading.Thread] = None
+        
         # 起動時点でフォルダにあるファイルを記録（これらは処理しない）
         self._record_existing_files()
     
+    def apply_config(self, config: dict, changed: Set[str]):
+        """
+        稼働中に新しい設定を反映（ConfigServiceから監視ループの合間に呼ばれる）
+        処理待ちファイル・グループ追跡・起動済みブラウザはそのまま引き継ぐ
+        """
+        # 参照を丸ごと差し替え（通知先URL等は各処理で self.config から読むので即反映）
+        self.config = config
+        self.poll_interval = config.get("poll_interval_seconds", 10)
+        self.test_mode = config.get("test_mode", True)
+        
+        if changed & {"watch_folder", "processed_folder"}:
+            self.watch_folder = Path(config.get("watch_folder", ""))
+            self.processed_folder = self._get_processed_folder()
+            logger.info(f"📂 監視フォルダ: {self.watch_folder} / 処理済み: {self.processed_folder}")
+        
+        if changed & {"watch_folder", "processed_folder", "archive"}:
+            self.compactor = self._create_compactor()
+        if changed & {"watch_folder", "lease"}:
+            self.leases = self._create_leases()
+        if changed & {"watch_folder", "retry"}:
+            self.retry_policy = RetryPolicy(self.watch_folder, config.get("retry", {}))
+        if changed & {"homis_url", "circuit_breaker"}:
+            self.breaker = self._create_breaker()
+        if "readiness" in changed:
+            readiness = config.get("readiness", {})
+            self.readiness.stable_seconds = readiness.get("stable_seconds", 2)
+            self.readiness.max_deferrals = readiness.get("max_deferrals", 20)
+            self.readiness.max_defer_seconds = readiness.get("max_defer_seconds", 1800)
+        if "api" in changed:
+            self._stop_api()   # 次のサイクルで新しい設定で開始
+        if "browser_warmup" in changed:
+            self.warmup = WarmupSchedule(config.get("browser_warmup", {}))
+        
+        if self.browser_session is not None:
+            self.browser_session.apply_config(config)
+        
+        mode_str = "🧪 テストモード" if self.test_mode else "🚀 本番モード"
+        logger.info(f"🔧 設定反映完了（{mode_str}, ポーリング{self.poll_interval}秒）")
+    
+    def _create_compactor(self) -> Optional[ArchiveCompactor]:
+        """設定に応じて済フォルダのアーカイブ処理を作成（無効ならNone）"""
+        archive = self.config.get("archive", {})
+        if not archive.get("enabled", True):
+            return None
+        return ArchiveCompactor(self.processed_folder, days=archive.get("days", 14))
+    
+    def _create_leases(self) -> JobLeaseManager:
+        """設定に応じてジョブのリース管理を作成"""
+        lease = self.config.get("lease", {})
+        return JobLeaseManager(
+            self.watch_folder,
+            lease_seconds=lease.get("lease_seconds", 600),
+            stats_interval=lease.get("stats_interval", 60),
+        )
+    
+    def _create_breaker(self) -> CircuitBreaker:
+        """設定に応じてサーキットブレーカーを作成"""
+        breaker = self.config.get("circuit_breaker", {})
+        homis_url = self.config.get("homis_url", "https://homis.jp/homic/")
+        probe_timeout = breaker.get("probe_timeout", 5)
+        return CircuitBreaker(
+            lambda: http_probe(homis_url, probe_timeout),
+            failure_threshold=breaker.get("failure_threshold", 3),
+            probe_interval=breaker.get("probe_interval", 30),
+            on_change=self._on_breaker_change,
+        )
+    
+    def _on_breaker_change(self, state: str, reason: str):
+        """遮断中はブラウザを終了し、停止・復旧をChatに1回ずつ通知"""
+        webhook_url = self.config.get("chat_webhook_url", "")
+        if state == OPEN:
+            self.close_browser()
+            self.metrics.set_browser_state("Homis停止中（復旧待ち）")
+            if self._outage_notified:
+                return
+            self._outage_notified = True
+            message = (f"⛔ Homisの処理を一時停止しました（{reason}）\n"
+                       f"💡 ジョブは監視フォルダに残っています。復旧を確認したら自動で再開します。")
+        elif state == CLOSED and self._outage_notified:
+            self._outage_notified = False
+            message = "✅ Homisの復旧を確認し、処理を再開しました"
+        else:
+            return
+        if webhook_url:
+            try:
+                from chat_notifier import send_chat_notification
+                send_chat_notification(webhook_url, message)
+            except Exception as e:
+                logger.warning(f"⚠️ Chat通知送信失敗: {e}")
+    
     def _record_existing_files(self):
         """起動時点で監視フォルダに存在するファイルを確認
         ※v1.3.0: 既存ファイルも処理対象にする（残留ファイルを拾う）
         """
         if self.watch_folder.exists():
-            existing = [f for f in self.watch_folder.glob("*.json") if not f.name.startswith(".")]
+            existing = [f for f in self._job_files() if not f.name.startswith(".")]
             if existing:
                 logger.info(f"📂 起動時に{len(existing)}件の未処理ファイルを検出 → 処理対象にします")
         
@@ -159,6 +415,12 @@ class FolderWatcher:
         
         return folder
     
+    def _job_files(self) -> List[Path]:
+        """監視フォルダ内のジョブファイル（単体JSON + バンドル）"""
+        return sorted(
+            list(self.watch_folder.glob("*.json")) + list(self.watch_folder.glob(f"*{BUNDLE_SUFFIX}"))
+        )
+    
     def scan_folder(self) -> List[Path]:
         """
         監視フォルダをスキャンしてJSONファイル一覧を取得
@@ -169,156 +431,533 @@ class FolderWatcher:
             return []
         
         json_files = []
-        for file in self.watch_folder.glob("*.json"):
+        for file in self._job_files():
             if file.name.startswith("."):  # 隠しファイルはスキップ
                 continue
             if file.name in self.processed_files:  # 処理済み/起動時存在はスキップ
                 continue
             json_files.append(file)
         
-        return json_files
+        self.metrics.set_queue_depth(len(json_files))
+        
+        # 書き込み（同期）が終わったファイルだけを処理対象にする
+        return self.readiness.filter(json_files)
+    
+    def process_file(self, file_path: Path) -> Optional[bool]:
+        """
+        JSONファイルを処理（メトリクス記録付き）
+        Returns: True=成功, False=失敗, None=書き込み中のため後回し
+        """
+        try:
+            if is_bundle(file_path, original_name(file_path)):
+                return self._process_bundle(file_path)
+            
+            try:
+                queued_at = file_path.stat().st_mtime
+            except OSError:
+                queued_at = None
+            
+            self._job_timer = self.metrics.start_job(queued_at)
+            success = self._process_file(file_path)
+            self.metrics.finish_job(self._job_timer, success)
+            return success
+        except FileNotReady as e:
+            self._defer_not_ready(file_path, e)
+            return None
     
-    def process_file(self, file_path: Path) -> bool:
+    def _defer_not_ready(self, file_path: Path, reason: Exception):
         """
-        JSONファイルを処理
-        Returns: True=成功, False=失敗
+        書き込み途中のファイルを元に戻し、書き込み完了後に改めて処理する
+        ずっと読めない（同期ツールのロックが外れない等）ファイルはデッドレターへ移す
         """
-        logger.info(f"📄 ファイル処理開始: {file_path.name}")
+        name = original_name(file_path)
+        exhausted = self.readiness.defer(name)
+        if exhausted:
+            logger.error(f"❌ 読み込めない状態が続くため処理を中止: {name}（{exhausted}）")
+            try:
+                self._finish_file(file_path, {
+                    "success": False, "karte_url": None,
+                    "error": f"ファイルを読み込めません（{exhausted}）: {reason}",
+                    "error_class": "invalid",
+                }, attempts=1)
+                return
+            except OSError as e:
+                logger.error(f"ファイル移動エラー: {name} - {e}")
+        else:
+            logger.info(f"⏳ 書き込み中のため後で処理します: {name}（{reason}）")
+        self.processed_files.discard(name)
+        self.leases.release(file_path)
+    
+    def _read_stable(self, file_path: Path, parse):
+        """書き込み途中なら FileNotReady、壊れていれば ValueError"""
+        readiness = self.config.get("readiness", {})
+        return read_stable(
+            file_path, parse,
+            retries=readiness.get("parse_retries", 3),
+            delay=readiness.get("retry_delay", 1.0),
+        )
+    
+    def _process_file(self, file_path: Path) -> bool:
+        """JSONファイルを処理（本体）"""
+        name = original_name(file_path)
+        logger.info(f"📄 ファイル処理開始: {name}")
         
         # 即座に処理済みセットに追加（二重検知防止）
-        self.processed_files.add(file_path.name)
+        self.processed_files.add(name)
         
+        # JSONを読み込み（書き込み途中なら FileNotReady で後回し）
         try:
-            # JSONを読み込み
-            with open(file_path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            
-            # アクション確認
-            action = data.get("action", "")
-            if action != "homis_karte_write":
-                logger.warning(f"未対応のアクション: {action}")
-                self._move_to_processed(file_path, success=False)
+            data = self._read_stable(file_path, _load_json)
+        except ValueError as e:
+            logger.error(f"JSON解析エラー: {name} - {e}")
+            self._finish_file(file_path, {
+                "success": False, "karte_url": None,
+                "error": f"JSON解析エラー: {e}", "error_class": "invalid",
+            }, attempts=1)
+            return False
+        self._job_timer.lap("parse")
+        
+        # API経由のジョブは受け付けたIDで状態を返す
+        status_key = data.get(API_ID_KEY) or data.get("job_id")
+        if data.get(API_ID_KEY):
+            self.job_statuses.set(status_key, "running")
+        
+        attempts = self.retry_policy.attempts_of(data) + 1
+        try:
+            result = self._execute_job(data, name, attempts)
+        except Exception as e:
+            logger.error(f"処理エラー: {name} - {e}")
+            import traceback
+            traceback.print_exc()
+            result = self._unexpected_result(e, attempts)
+        
+        if status_key:
+            self._set_job_status(status_key, result)
+        
+        try:
+            if result.get("retry"):
+                self.retry_policy.schedule(file_path, name, data, result, attempts, result["retry_delay"])
+                self.processed_files.discard(name)
+            else:
+                self._finish_file(file_path, result, attempts)
+        except OSError as e:
+            # 移動できない場合は取得を解除（他のPC・次回起動時に処理される）
+            logger.error(f"ファイル移動エラー: {name} - {e}")
+            self.leases.release(file_path)
+        return result["success"]
+    
+    def _unexpected_result(self, error: Exception, attempts: int) -> dict:
+        """想定外のエラーの結果（カルテ作成前なら再試行、作成後は二重カルテを避けて人の確認へ）"""
+        result = {"success": False, "karte_url": None, "error": f"処理エラー: {error}",
+                  "error_class": "unexpected"}
+        if self._job_written:
+            result["error"] = f"カルテ作成後に処理エラー（再試行しません）: {error}"
+            return result
+        delay = self.retry_policy.retry_delay("unexpected", attempts)
+        if delay is not None:
+            result.update(retry=True, retry_delay=delay)
+        return result
+    
+    def _finish_file(self, file_path: Path, result: dict, attempts: int):
+        """処理を終えたファイルの移動先: 成功→済、人の確認が必要なもの→デッドレター"""
+        if result["success"] and not result.get("error_class"):
+            self._move_to_processed(file_path, success=True)
+            return
+        name = original_name(file_path)
+        dest = self.retry_policy.dead_letter(file_path, name, result, attempts)
+        self.processed_files.add(name)
+        logger.warning(f"📥 デッドレターに移動: {name} → {dest.parent.name}/（{result.get('error', '')}）")
+    
+    def _process_bundle(self, file_path: Path) -> Optional[bool]:
+        """
+        バンドル（.jsonl / 配列JSON）を1行ずつ処理
+        行ごとの結果を進捗ファイルに残し、中断後は未処理の行から再開する
+        Returns: True=全行成功, False=失敗を含む, None=Homis停止中のため中断
+        """
+        name = original_name(file_path)
+        logger.info(f"📦 バンドル処理開始: {name}")
+        self.processed_files.add(name)
+        
+        try:
+            queued_at = file_path.stat().st_mtime
+            try:
+                # 最終行が解析できない → 書き込み途中の可能性があるので変化を確認
+                lines = self._read_stable(file_path, lambda p: read_bundle(p, name, strict_tail=True))
+            except ValueError:
+                if not name.endswith(BUNDLE_SUFFIX):
+                    raise
+                lines = read_bundle(file_path, name)   # 書き込み済みで最終行だけ壊れている
+        except (OSError, ValueError) as e:
+            logger.error(f"JSON解析エラー: {name} - {e}")
+            self._finish_file(file_path, {
+                "success": False, "karte_url": None,
+                "error": f"JSON解析エラー: {e}", "error_class": "invalid",
+            }, attempts=1)
+            return False
+        
+        progress = BundleProgress(self.watch_folder, name)
+        pending = [line for line in lines if not progress.is_done(line[0])]
+        pending = group_by_patient(pending, lambda line: _patient_key(line[2]))
+        logger.info(f"📦 {len(lines)}件中 {len(pending)}件を処理します")
+        
+        for key, line_no, data, error in pending:
+            if not self.breaker.allow():
+                # Homis停止中: 進捗を残して返却（復旧後に続きから）
+                self.processed_files.discard(name)
+                self.leases.release(file_path)
+                return None
+            label = f"{name}#{line_no}"
+            self._job_timer = self.metrics.start_job(queued_at)
+            self._job_timer.lap("parse")
+            success = False
+            try:
+                if data is None:
+                    logger.error(f"❌ {label}: {error}")
+                    result = {"success": False, "karte_url": None, "error": error}
+                else:
+                    result = self._execute_job(data, label)
+                    if data.get("job_id"):
+                        self._set_job_status(data["job_id"], result)
+                success = result["success"]
+            except Exception as e:
+                # 想定外のエラー: ここまでの進捗を残してバンドルを返却（他のPC・次回起動時に続きから）
+                logger.error(f"処理エラー: {label} - {e}")
+                import traceback
+                traceback.print_exc()
+                self.processed_files.discard(name)
+                self.leases.release(file_path)
                 return False
+            finally:
+                self.metrics.finish_job(self._job_timer, success)
             
-            # v7.7.6: 集団検診かどうかをチェック
-            is_group = data.get("isGroup", False)
-            group_id = data.get("groupId", "")
+            if self.breaker.state == OPEN and not result["success"]:
+                continue   # 遮断のきっかけになった行は記録せず、復旧後にやり直す
+            progress.record(key, line_no, result)
             
+            # 長いバンドルの処理中に他のPCにリースを回収されないよう延長
+            file_path = self.leases.renew(file_path)
+            if file_path is None:
+                return False
+        
+        success = progress.all_success
+        progress.finish(self.processed_folder)
+        self._move_to_processed(file_path, success=success)
+        logger.info(f"📦 バンドル処理完了: {name}（{'全件成功' if success else '失敗あり'}）")
+        return success
+    
+    def _execute_job(self, data: dict, label: str, attempts: Optional[int] = None) -> dict:
+        """
+        ジョブ本体（事前検証 → Homis書き込み → GAS・結果ファイル・Chat通知）
+        単体ファイル（API経由で書き出したものを含む）・バンドルの行・複合ジョブの要素で共通
+        
+        Args:
+            data: ジョブJSON
+            label: ログ表示用の名前（ファイル名など）
+            attempts: 今回を含む試行回数（None=再試行しない。バンドルの行など）
+        
+        Returns:
+            dict: {"success": bool, "karte_url": str or None, "error": str,
+                   "error_class": 失敗の種類（retry_policy.py 参照）,
+                   "retry": True なら通知せずに再試行待ち（"retry_delay" 秒後）,
+                   "results": 複合ジョブのみ。要素ごとの結果のリスト}
+        """
+        self._job_written = False
+        
+        # アクション確認
+        action = data.get("action", "")
+        if action != "homis_karte_write":
+            logger.warning(f"未対応のアクション: {action}")
+            return {"success": False, "karte_url": None, "error": f"未対応のアクション: {action}",
+                    "error_class": "invalid"}
+        
+        if is_compound(data):
+            return self._execute_compound(data, label, attempts)
+        
+        # v7.7.6: 集団検診かどうかをチェック
+        is_group = data.get("isGroup", False)
+        group_id = data.get("groupId", "")
+        
+        # 事前検証（ブラウザを起動する前に必須項目・型をチェック）
+        errors = validate_job(data, self.config)
+        if errors:
+            logger.error(f"❌ 入力検証エラー: {label}")
+            for err in errors:
+                logger.error(f"  - {err}")
+            result = {
+                "success": False,
+                "karte_url": None,
+                "error": "入力検証エラー: " + " / ".join(errors),
+                "error_class": "invalid",
+            }
+        else:
             # Homis書き込み
-            result = self._write_to_homis(data)
+            if self.browser_session is not None:
+                self.browser_session.commands.take()   # ジョブ間（リサイクル等）の分は数えない
+            self.breaker.begin_job()   # 試行中なら結果が出るまで次のジョブを止める
+            try:
+                result = self._write_to_homis(data)
+            except Exception:
+                self.breaker.end_job()
+                raise
+        self._job_timer.lap("homis")
+        self._record_commands(label)
+        
+        if result["success"]:
+            self._job_written = True   # 以降のエラーでは再試行しない（二重カルテ防止）
+            self.breaker.record_success()
+        else:
+            # 一時的な失敗は通知せずに再試行待ち（最終的に失敗したときだけ通知する）
+            result.setdefault("error_class", "transient")
+            if result["error_class"] == "ui_changed":
+                # 画面変更はHTTP確認では復旧を判断できないため、長めに止めてから1件で再確認
+                hold = self.config.get("circuit_breaker", {}).get("ui_change_hold", 600)
+                self.breaker.trip(result.get("error", ""), hold_seconds=hold)
+            elif result["error_class"] in BREAKER_ERROR_CLASSES:
+                self.breaker.record_failure(result.get("error", ""))
+            elif result["error_class"] == "step_failed":
+                # Homisの画面には届いている（入力データ・画面側の問題）ので遮断には数えない
+                self.breaker.record_success("ステップ失敗（Homisは応答）")
+            else:
+                self.breaker.end_job()
+            delay = (self.retry_policy.retry_delay(result["error_class"], attempts)
+                     if attempts is not None else None)
+            if delay is not None:
+                max_attempts = self.retry_policy.max_attempts(result["error_class"])
+                logger.warning(
+                    f"🔁 処理失敗（{result['error_class']}）: {label} — "
+                    f"{delay:.0f}秒後に再試行します（{attempts}/{max_attempts}回目）"
+                )
+                result.update(retry=True, retry_delay=delay)
+                return result
+        
+        # orderIdはdata.data内にある
+        karte_data = data.get("data", {})
+        order_id = karte_data.get("orderId", "")
+        
+        # job_idはdata直下にある（往診カルテの場合のみ存在）
+        job_id = data.get("job_id", "")
+
+        if result["success"]:
+            logger.info(f"✅ 処理成功: {label}")
             
-            # orderIdはdata.data内にある
-            karte_data = data.get("data", {})
-            order_id = karte_data.get("orderId", "")
+            # カルテURL
+            karte_url = result.get("karte_url", "")
             
-            # job_idはdata直下にある（往診カルテの場合のみ存在）
-            job_id = data.get("job_id", "")
-
-            if result["success"]:
-                logger.info(f"✅ 処理成功: {file_path.name}")
-                
-                # カルテURL
-                karte_url = result.get("karte_url", "")
-                
-                # v2.0.4: 成功 + 空URL → GAS通知スキップ（karte_idなし誤通知を防ぐ）
-                # ※ JSONは済へ移動して再処理しない（二重カルテ防止）
-                # ※ Chatでエラーアラートを送信（運用向け）
-                if not karte_url and order_id and not job_id:
-                    patient_name = karte_data.get("patientName", "不明")
-                    logger.error(
-                        f"⚠️ カルテ作成済み・URL取得失敗: {patient_name} / "
-                        f"orderId={order_id} — GAS通知をスキップします"
-                    )
-                    # 運用向けChatアラート
-                    webhook_url = self.config.get("chat_webhook_url", "")
-                    if webhook_url:
-                        try:
-                            from chat_notifier import notify_error
-                            notify_error(
-                                webhook_url,
-                                f"⚠️ カルテ作成済み・URL取得失敗\n"
-                                f"👤 {patient_name}\n"
-                                f"📋 orderId: {order_id}\n"
-                                f"💡 HOMISにカルテは作成されていますが、"
-                                f"URLを取得できなかったためChat撮影完了通知は送信されません。\n"
-                                f"🔧 SSのAE列を手動確認してください。"
-                            )
-                        except Exception as e:
-                            logger.warning(f"⚠️ エラーChatアラート送信失敗: {e}")
-                    
-                    # 集団検診の場合はグループ追跡だけ行う（通知はしない）
-                    if is_group and group_id:
-                        self._track_group(group_id)
-                    
-                    # 済へ移動（再処理しない）
-                    self._move_to_processed(file_path, success=True)
-                    return True
-                
-                # GAS連携（既存：レントゲンナビ向け）
-                # ※往診カルテ（job_idあり）はレントゲンナビGASに通知しない
-                if order_id and not job_id:
-                    if is_group and group_id:
-                        # 集団検診の場合：個別通知はスキップ、グループ追跡のみ
-                        self._notify_gas(order_id, karte_url)
-                        self._track_group(group_id)
-                        logger.info(f"📊 集団検診グループ追跡: {group_id}")
-                    else:
-                        # 通常オーダーの場合：通常通り通知
-                        self._notify_gas(order_id, karte_url)
-                
-                # 往診カルテ用：結果ファイル書き込み（job_idがある場合のみ）
-                if job_id:
-                    self._write_result_file(job_id, karte_url or "", success=True)
-                    # 往診専用チャット通知（成功）
-                    karte_data_for_notify = data.get("data", {})
-                    self._notify_oushin_chat(
-                        success=True,
-                        homis_id=karte_data_for_notify.get("homisId", ""),
-                        visit_date=karte_data_for_notify.get("visitDate", ""),
-                        doctor_name=karte_data_for_notify.get("doctorName", ""),
-                        karte_url=karte_url or "",
-                        next_visit_date=karte_data_for_notify.get("nextVisitDate", "")
-                    )
-                
-                # 処理済みフォルダに移動
-                self._move_to_processed(file_path, success=True)
-                return True
-            else:
-                logger.error(f"❌ 処理失敗: {file_path.name}")
-                
-                # 失敗時もGAS連携（空のURLで通知）
-                # ※往診カルテ（job_idあり）はレントゲンナビGASに通知しない
-                if order_id and not job_id:
-                    self._notify_gas(order_id, "")
-                    if is_group and group_id:
-                        self._track_group(group_id)
-                
-                # 往診カルテ用：失敗も結果ファイルに書き込む
-                if job_id:
-                    err_msg = result.get("error", "HOMIS操作が失敗しました")
-                    self._write_result_file(job_id, "", success=False, error=err_msg)
-                    # 往診専用チャット通知（失敗）
-                    karte_data_for_notify = data.get("data", {})
-                    self._notify_oushin_chat(
-                        success=False,
-                        homis_id=karte_data_for_notify.get("homisId", ""),
-                        visit_date=karte_data_for_notify.get("visitDate", ""),
-                        doctor_name=karte_data_for_notify.get("doctorName", ""),
-                        error=err_msg
-                    )
+            # v2.0.4: 成功 + 空URL → GAS通知スキップ（karte_idなし誤通知を防ぐ）
+            # ※ JSONは済へ移動して再処理しない（二重カルテ防止）
+            # ※ Chatでエラーアラートを送信（運用向け）
+            if not karte_url and order_id and not job_id:
+                result.update(error="カルテ作成済み・URL取得失敗", error_class="url_missing")
+                patient_name = karte_data.get("patientName", "不明")
+                logger.error(
+                    f"⚠️ カルテ作成済み・URL取得失敗: {patient_name} / "
+                    f"orderId={order_id} — GAS通知をスキップします"
+                )
+                # 運用向けChatアラート
+                webhook_url = self.config.get("chat_webhook_url", "")
+                if webhook_url:
+                    try:
+                        from chat_notifier import notify_error
+                        notify_error(
+                            webhook_url,
+                            f"⚠️ カルテ作成済み・URL取得失敗\n"
+                            f"👤 {patient_name}\n"
+                            f"📋 orderId: {order_id}\n"
+                            f"💡 HOMISにカルテは作成されていますが、"
+                            f"URLを取得できなかったためChat撮影完了通知は送信されません。\n"
+                            f"🔧 SSのAE列を手動確認してください。"
+                        )
+                    except Exception as e:
+                        logger.warning(f"⚠️ エラーChatアラート送信失敗: {e}")
                 
-                self._move_to_processed(file_path, success=False)
-                return False
+                # 集団検診の場合はグループ追跡だけ行う（通知はしない）
+                if is_group and group_id:
+                    self._track_group(group_id)
                 
-        except json.JSONDecodeError as e:
-            logger.error(f"JSON解析エラー: {file_path.name} - {e}")
-            self._move_to_processed(file_path, success=False)
-            return False
-        except Exception as e:
-            logger.error(f"処理エラー: {file_path.name} - {e}")
-            import traceback
-            traceback.print_exc()
-            return False
+                # 呼び出し元でデッドレターへ移動（再処理しない。SSの手動確認が必要）
+                return result
+            
+            # GAS連携（既存：レントゲンナビ向け）
+            # ※往診カルテ（job_idあり）はレントゲンナビGASに通知しない
+            if order_id and not job_id:
+                if is_group and group_id:
+                    # 集団検診の場合：個別通知はスキップ、グループ追跡のみ
+                    self._notify_gas(order_id, karte_url)
+                    self._track_group(group_id)
+                    logger.info(f"📊 集団検診グループ追跡: {group_id}")
+                else:
+                    # 通常オーダーの場合：通常通り通知
+                    self._notify_gas(order_id, karte_url)
+            
+            # 往診カルテ用：結果ファイル書き込み（job_idがある場合のみ）
+            if job_id:
+                self._write_result_file(job_id, karte_url or "", success=True)
+                # 往診専用チャット通知（成功）
+                karte_data_for_notify = data.get("data", {})
+                self._notify_oushin_chat(
+                    success=True,
+                    homis_id=karte_data_for_notify.get("homisId", ""),
+                    visit_date=karte_data_for_notify.get("visitDate", ""),
+                    doctor_name=karte_data_for_notify.get("doctorName", ""),
+                    karte_url=karte_url or "",
+                    next_visit_date=karte_data_for_notify.get("nextVisitDate", "")
+                )
+            
+            return result
+        else:
+            logger.error(f"❌ 処理失敗: {label}")
+            
+            # 失敗時もGAS連携（空のURLで通知）
+            # ※往診カルテ（job_idあり）はレントゲンナビGASに通知しない
+            if order_id and not job_id:
+                self._notify_gas(order_id, "")
+                if is_group and group_id:
+                    self._track_group(group_id)
+            
+            # 往診カルテ用：失敗も結果ファイルに書き込む
+            if job_id:
+                err_msg = result.get("error", "HOMIS操作が失敗しました")
+                self._write_result_file(job_id, "", success=False, error=err_msg)
+                # 往診専用チャット通知（失敗）
+                karte_data_for_notify = data.get("data", {})
+                self._notify_oushin_chat(
+                    success=False,
+                    homis_id=karte_data_for_notify.get("homisId", ""),
+                    visit_date=karte_data_for_notify.get("visitDate", ""),
+                    doctor_name=karte_data_for_notify.get("doctorName", ""),
+                    error=err_msg
+                )
+            
+            return result
+    
+    # ============================================================
+    # ジョブ投入API
+    # ============================================================
+    
+    def submit_job(self, job_key: str, data: dict):
+        """
+        API経由のジョブを監視フォルダに api_<id>.json として書き出し、監視ループを起こす
+        （APIサーバーのスレッドから呼ばれる）
+        以降はフォルダ経由のジョブと同じく取得・再試行・デッドレターの対象になり、
+        再起動・異常終了の後も処理される
+        
+        Raises:
+            FileExistsError: 同じIDのジョブが監視フォルダに残っている（処理中・再試行待ちを含む）
+            OSError: 書き出せない
+        """
+        import glob
+        name = api_file_name(job_key)
+        if any(self.watch_folder.glob(glob.escape(name) + "*")):
+            raise FileExistsError(name)
+        tmp = self.watch_folder / f".{name}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({**data, API_ID_KEY: job_key}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.watch_folder / name)
+        self.readiness.trust(name)   # 書き込み完了待ちをせずに次のスキャンで処理
+        self._wake.set()
+    
+    def _api_queued(self) -> int:
+        """API経由で受け付けて未処理のジョブ数（/health 用。再試行待ちを含む）"""
+        return sum(1 for _ in self.watch_folder.glob(f"{API_FILE_PREFIX}*.json*"))
+    
+    def _start_api(self):
+        """設定で有効ならAPIサーバーを開始（開始済みなら何もしない）"""
+        api = self.config.get("api", {})
+        if self.api_server is not None or not api.get("enabled", False):
+            return
+        server = JobApiServer(
+            self.submit_job, self.job_statuses,
+            host=api.get("host", "127.0.0.1"),
+            port=api.get("port", 8765),
+            token=api.get("token", ""),
+            queued=self._api_queued,
+        )
+        try:
+            server.start()
+        except OSError as e:
+            logger.error(f"⚠️ ジョブ投入APIを開始できません（フォルダ監視は続行）: {e}")
+            return
+        self.api_server = server
+    
+    def _execute_compound(self, data: dict, label: str, attempts: Optional[int]) -> dict:
+        """
+        複合ジョブ（templates）を要素ごとに _execute_job で順に実行し、結果をまとめる
+        通知・結果ファイルは要素ごと（orderId / job_id 単位）に _execute_job 内で行う
+        要素の結果は data["_results"] に残す（再試行時は終わった要素を飛ばし、二重カルテを防ぐ）
+        全要素を先に検証し、1つでも入力エラーがあれば1件も実行しない
+        """
+        try:
+            jobs = expand_compound(data)
+        except ValueError as e:
+            logger.error(f"❌ 入力検証エラー: {label} - {e}")
+            return {"success": False, "karte_url": None, "error": f"入力検証エラー: {e}",
+                    "error_class": "invalid"}
+        
+        keys = compound_keys(data)
+        errors = [f"templates の job_id が重複しています: {key}" for key in sorted(set(keys)) if keys.count(key) > 1]
+        for index, job in enumerate(jobs, start=1):
+            errors.extend(f"[{index} {job['template']}] {err}" for err in validate_job(job, self.config))
+        if errors:
+            logger.error(f"❌ 入力検証エラー（複合ジョブは1件も実行しません）: {label}")
+            for err in errors:
+                logger.error(f"  - {err}")
+            return {"success": False, "karte_url": None, "error": "入力検証エラー: " + " / ".join(errors),
+                    "error_class": "invalid"}
+        
+        done = data.setdefault(COMPOUND_RESULTS_KEY, {})
+        retrying = None
+        for index, (key, job) in enumerate(zip(keys, jobs), start=1):
+            if key in done and not done[key]["retry"]:
+                continue   # 前回までに終わった要素（成功・再試行しない失敗）
+            result = self._execute_job(job, f"{label} [{index}/{len(jobs)} {job['template']}]", attempts)
+            done[key] = {
+                "template": job["template"],
+                "order_id": job["data"].get("orderId", ""),
+                "job_id": job.get("job_id", ""),
+                "success": result["success"],
+                "karte_url": result.get("karte_url") or "",
+                "error": result.get("error", ""),
+                "error_class": result.get("error_class", ""),
+                "retry": bool(result.get("retry")),
+            }
+            if result.get("retry"):
+                retrying = result   # 順番を守るため、残りの要素は再試行時に回す
+                break
+        
+        results = [done[key] for key in keys if key in done]
+        failed = [item for item in results if not item["success"] or item["error_class"]]
+        summary = {
+            "success": len(results) == len(jobs) and all(item["success"] for item in results),
+            "karte_url": next((item["karte_url"] for item in results if item["karte_url"]), None),
+            "results": results,
+        }
+        if retrying is not None:
+            summary.update(error=retrying.get("error", ""), error_class=retrying["error_class"],
+                           retry=True, retry_delay=retrying["retry_delay"])
+        elif failed:
+            summary.update(
+                error=" / ".join(f"{item['template']}: {item['error']}" for item in failed),
+                error_class=failed[0]["error_class"] or "transient",
+            )
+        ok = sum(1 for item in results if item["success"] and not item["error_class"])
+        logger.info(f"🧩 複合ジョブ: {label} {ok}/{len(jobs)}件完了")
+        return summary
+    
+    def _stop_api(self):
+        if self.api_server is not None:
+            self.api_server.stop()
+            self.api_server = None
+    
+    def _set_job_status(self, job_key: str, result: dict):
+        if result.get("retry"):
+            status = "retrying"
+        else:
+            status = "success" if result["success"] else "failed"
+        self.job_statuses.set(
+            job_key, status,
+            karte_url=result.get("karte_url"), error=result.get("error", ""),
+            error_class=result.get("error_class", ""), results=result.get("results"),
+        )
     
     def _track_group(self, group_id: str):
         """v7.7.6: 集団検診グループを追跡"""
@@ -382,22 +1021,23 @@ class FolderWatcher:
         
         if not homis_id:
             logger.error("Homis患者IDが指定されていません")
-            return {"success": False, "karte_url": None}
+            return {"success": False, "karte_url": None, "error": "Homis患者IDが未指定",
+                    "error_class": "invalid"}
         
         # テンプレート指定がある場合はテンプレートエンジンを使用
         if template_name:
             logger.info(f"📋 テンプレート使用: {template_name}")
             try:
                 from template_engine import TemplateEngine
-                headless = self.config.get("headless", False)
-                engine = TemplateEngine(self.config, headless=headless)
+                engine = TemplateEngine(self.config, session=self._get_browser_session())
                 result = engine.execute(template_name, karte_data)
                 return result
             except Exception as e:
                 logger.error(f"テンプレートエンジンエラー: {e}")
                 import traceback
                 traceback.print_exc()
-                return {"success": False, "karte_url": None}
+                return {"success": False, "karte_url": None, "error": f"テンプレートエンジンエラー: {e}",
+                        "error_class": "step_failed"}
         
         # 従来のhomis_writerを使用（後方互換性）
         logger.info("📋 従来方式（homis_writer）を使用")
@@ -417,6 +1057,45 @@ class FolderWatcher:
         
         return result
     
+    def _record_commands(self, label: str):
+        """このジョブのWebDriverコマンド数をメトリクスに記録（ブラウザを使ったジョブのみ）"""
+        if self.browser_session is None:
+            return
+        commands = self.browser_session.commands.take()
+        if not commands:
+            return
+        # 複合ジョブは要素ごとに呼ばれるため、同じジョブの分は合算する
+        merged = self._job_timer.commands
+        for command, (count, seconds) in commands.items():
+            previous_count, previous_seconds = merged.get(command, (0, 0.0))
+            merged[command] = (previous_count + count, previous_seconds + seconds)
+        total = sum(count for count, _ in commands.values())
+        seconds = sum(seconds for _, seconds in commands.values())
+        top = sorted(commands.items(), key=lambda item: item[1][0], reverse=True)[:5]
+        logger.info(
+            f"🔢 WebDriverコマンド: {label} {total}回 {seconds:.1f}秒"
+            f"（{' / '.join(f'{command} {count}' for command, (count, _) in top)}）"
+        )
+    
+    def _get_browser_session(self) -> BrowserSession:
+        """共有ブラウザセッションを取得（なければ作成）"""
+        if self.browser_session is None:
+            self.browser_session = BrowserSession(
+                self.config,
+                headless=self.config.get("headless", False),
+                on_state=self.metrics.set_browser_state,
+            )
+        return self.browser_session
+    
+    def close_browser(self, timeout: Optional[float] = None, keep_browser: bool = True) -> bool:
+        """
+        共有ブラウザを終了（timeout秒以内に実行中ジョブが終わらなければFalse）
+        keep_browser: chrome_attach 有効時は Chrome を残して切断だけ行う（False で Chrome ごと終了）
+        """
+        if self.browser_session is None:
+            return True
+        return self.browser_session.close(timeout=timeout, keep_browser=keep_browser)
+    
     def _notify_gas(self, order_id: str, karte_url: str):
         """GASにカルテURLを通知"""
         gas_url = self.config.get("gas_web_app_url", "")
@@ -521,17 +1200,130 @@ class FolderWatcher:
             logger.warning(f"⚠️ 往診チャット通知エラー（続行）: {e}")
 
     def _move_to_processed(self, file_path: Path, success: bool = True):
-        """処理済みフォルダに移動（ファイル名はそのまま）"""
+        """処理済みフォルダに移動（ファイル名は取得前の元の名前に戻す）"""
         try:
-            # ファイル名はそのままで移動
-            dest = self.processed_folder / file_path.name
+            name = original_name(file_path)
+            dest = self.processed_folder / name
             
             shutil.move(str(file_path), str(dest))
-            self.processed_files.add(file_path.name)
-            logger.info(f"📁 済フォルダに移動: {file_path.name}")
+            self.processed_files.add(name)
+            logger.info(f"📁 済フォルダに移動: {name}")
         except Exception as e:
             logger.error(f"ファイル移動エラー: {e}")
     
+    def run_cycle(self, on_files: Optional[Callable[[List[Path]], None]] = None,
+                  on_result: Optional[Callable[[Path, bool], None]] = None) -> List[Tuple[Path, bool]]:
+        """
+        監視ループの1サイクル（設定反映 → スキャン → 処理 → グループ完了チェック）
+        CLI（start）とGUI（_run_watcher）の両方から呼ぶ
+        
+        Args:
+            on_files: 新規ファイル検出時に呼ばれる（引数: ファイル一覧）
+            on_result: 1ファイル処理するごとに呼ばれる（引数: ファイル, 成功/失敗）
+        
+        Returns:
+            list: [(ファイル, 成功/失敗), ...]
+        """
+        self.config_service.poll()
+        self._start_api()
+        
+        # 落ちたPC・前回のプロセスが取得したままのファイルを戻す
+        self.leases.reclaim_expired()
+        
+        # 再試行時刻を過ぎた失敗ジョブを戻す
+        self.retry_policy.release_due()
+        
+        results = []
+        files = self.scan_folder()
+        if files and not self.breaker.allow():
+            files = []   # Homis停止中はフォルダに残す（取得しない）
+        if len(files) > 1:
+            # API経由のジョブを先に処理（フォルダ経由より低遅延）
+            files.sort(key=lambda path: not path.name.startswith(API_FILE_PREFIX))
+            files = group_by_patient(files, _peek_patient)
+        if files:
+            logger.info(f"📬 新規ファイル検出: {len(files)}件")
+            if on_files:
+                on_files(files)
+            for file in files:
+                if not self.breaker.allow():
+                    break   # 処理中にHomis停止を検知（残りはフォルダに残す）
+                
+                # 処理直前に取得（他のPCが先に取得していればスキップ）
+                claimed = self.leases.claim(file)
+                if claimed is None:
+                    continue
+                success = self.process_file(claimed)
+                if success is None:
+                    continue   # 書き込み中（次のサイクル以降に処理）
+                results.append((file, success))
+                if on_result:
+                    on_result(file, success)
+        
+        # ノード別処理件数の共有（書き出したときだけ全ノード分を読み直す）
+        if self.leases.maybe_write_stats(self.metrics.snapshot()):
+            self.metrics.set_nodes(self.leases.read_node_stats())
+        
+        # v7.7.6: 集団検診グループの完了チェック
+        self.check_groups()
+        
+        # 済フォルダのアーカイブ（実行間隔内なら何もしない）
+        if self.compactor is not None:
+            self.compactor.maybe_start()
+        
+        # ブラウザの事前起動・アイドル解放（ジョブはこれまでどおり必要なときにブラウザを起動する）
+        active = bool(results)
+        self._maintain_browser(active)
+        return results
+    
+    def _maintain_browser(self, active: bool):
+        """
+        業務時間・使用状況に合わせてブラウザを事前起動・解放する（監視スレッドで呼ぶ）
+        事前起動もこのスレッドで行うため、ジョブと同時にブラウザを操作することはない
+        """
+        now = datetime.now()
+        if active:
+            self.warmup.activity()
+        session = self.browser_session
+        if session is not None and session.driver is not None:
+            last_used = datetime.fromtimestamp(session.last_used) if session.last_used else None
+            if not active and self.warmup.should_release(now, last_used):
+                logger.info(f"💤 ブラウザを{self.warmup.idle_release_minutes}分使っていないため終了します")
+                if self.close_browser(timeout=0, keep_browser=False):
+                    self.warmup.released(now)
+            return
+        if self.breaker.state == OPEN or not self.warmup.should_prewarm(now):
+            return
+        
+        logger.info("🌅 ブラウザを事前起動してログインしておきます")
+        try:
+            from template_engine import TemplateEngine
+            engine = TemplateEngine(self.config, session=self._get_browser_session())
+            ok = engine.warm_up(self.config.get("homis_url", "https://homis.jp/homic/"))
+        except Exception as e:
+            logger.warning(f"事前起動エラー: {e}")
+            ok = False
+        if ok:
+            self.warmup.succeeded()
+            logger.info("🌅 事前起動完了（次のジョブは起動・ログインなしで開始）")
+        else:
+            self.warmup.failed(now)
+            logger.warning("⚠️ 事前起動に失敗しました（5分後に再試行。ジョブは通常どおり処理）")
+    
+    def wait_next_cycle(self):
+        """次のサイクルまで待機（stop() 等で起こされたら即座に戻る）"""
+        timeout = self.poll_interval
+        # 書き込み完了待ちのファイルがあれば、判定できる時刻に起きる
+        pending = self.readiness.next_check_in()
+        if pending is not None:
+            timeout = min(timeout, pending + 0.1)
+        # Homis停止中は次の復旧確認の時刻に起きる
+        probe = self.breaker.next_probe_in()
+        if probe is not None:
+            timeout = min(timeout, probe + 0.1)
+        self._wake.wait(timeout)
+        self._wake.clear()
+    
     def start(self):
         """監視を開始"""
         self.running = True
@@ -555,27 +1347,31 @@ class FolderWatcher:
         
         try:
             while self.running:
-                # フォルダをスキャン
-                files = self.scan_folder()
-                
-                if files:
-                    logger.info(f"📬 新規ファイル検出: {len(files)}件")
-                    for file in files:
-                        self.process_file(file)
-                
-                # v7.7.6: 集団検診グループの完了チェック
-                self.check_groups()
-                
-                # 待機
-                time.sleep(self.poll_interval)
+                self.run_cycle()
+                self.wait_next_cycle()
                 
         except KeyboardInterrupt:
             logger.info("👋 監視を終了します")
             self.running = False
+        finally:
+            self._stop_api()
+            self.close_browser()
     
-    def stop(self):
-        """監視を停止"""
+    def stop(self) -> Optional[threading.Thread]:
+        """
+        監視を停止（ブラウザは実行中ジョブの終了後にバックグラウンドで閉じる）
+        
+        Returns:
+            ブラウザを閉じているスレッド（閉じるものがなければ None）
+            閉じている途中でもう一度呼ばれた場合は同じスレッドを返す
+        """
         self.running = False
+        self._wake.set()
+        self._stop_api()
+        if self.browser_session is not None and not (self._closer and self._closer.is_alive()):
+            self._closer = threading.Thread(target=self.close_browser, name="BrowserClose", daemon=True)
+            self._closer.start()
+        return self._closer
 
 
 def main():
@@ -149,6 +149,11 @@ def create_homis_json(data):
     
     return json_data, file_name
 
+# バンドル形式（1行 = 1ジョブのJSONL）。集団検診など複数件を1ファイルで投入する
+def create_homis_bundle(items, bundle_name):
+    lines = [json.dumps(create_homis_json(item)[0], ensure_ascii=False) for item in items]
+    return "\n".join(lines) + "\n", f"{bundle_name}.jsonl"
+
 # --- テスト実行 ---
 print("=== JSON生成テスト開始 ===")
 
@@ -193,4 +198,9 @@ json_group, file_group = create_homis_json(group_data)
 print(f"\n--- [集団検診] {file_group} ---")
 print(json.dumps(json_group, indent=2, ensure_ascii=False))
 
+# 3. バンドル（通常 + 集団を1ファイルに）
+bundle_text, bundle_file = create_homis_bundle([normal_data, group_data], "XP_bundle_20260130")
+print(f"\n--- [バンドル] {bundle_file} ---")
+print(bundle_text)
+
 print("\n=== テスト完了 ===")
@@ -0,0 +1,17 @@
+# -*- coding: utf-8 -*-
+"""
+テスト共通設定
+==============
+src/ のモジュールを `import watcher` のように直接 import できるようにする
+（本番と同じく src/ をカレントにして動かす前提のため）
+
+実行方法（リポジトリのルートで）:
+    python -m pytest -q
+"""
+
+import sys
+from pathlib import Path
+
+SRC_DIR = Path(__file__).resolve().parent.parent / "src"
+if str(SRC_DIR) not in sys.path:
+    sys.path.insert(0, str(SRC_DIR))
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""archive_compactor: 済フォルダのアーカイブ・検索"""
+
+import json
+import os
+import time
+
+from archive_compactor import ArchiveCompactor
+
+
+def _put(folder, name, content, days_old=0):
+    path = folder / name
+    path.write_text(content, encoding="utf-8")
+    mtime = time.time() - days_old * 86400
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def _job(order_id, homis_id="100", job_id=""):
+    job = {"action": "homis_karte_write", "data": {"orderId": order_id, "homisId": homis_id}}
+    if job_id:
+        job["job_id"] = job_id
+    return json.dumps(job)
+
+
+def test_lookup_loose_file_by_contents(tmp_path):
+    _put(tmp_path, "XP_patient.json", _job("ORD-1", job_id="J-1"))
+    compactor = ArchiveCompactor(tmp_path)
+
+    for key in ("ORD-1", "100", "J-1", "XP_pat"):
+        found = compactor.lookup(key)
+        assert [item["file"] for item in found] == ["XP_patient.json"], key
+        assert found[0]["location"] == tmp_path.name
+    assert compactor.lookup("ORD-2") == []
+
+
+def test_lookup_loose_bundle_and_compound(tmp_path):
+    _put(tmp_path, "kenshin.jsonl", _job("ORD-1") + "\n\n" + _job("ORD-2", homis_id="200") + "\n")
+    compound = {"action": "homis_karte_write", "data": {"homisId": "300"},
+                "templates": [{"template": "xray_karte", "data": {"orderId": "ORD-3"}}]}
+    _put(tmp_path, "compound.json", json.dumps(compound))
+    compactor = ArchiveCompactor(tmp_path)
+
+    found = compactor.lookup("ORD-2")
+    assert [item["file"] for item in found] == ["kenshin.jsonl"]
+    assert len(found[0]["job"]) == 2
+    assert [item["file"] for item in compactor.lookup("ORD-3")] == ["compound.json"]
+
+
+def test_compact_archives_json_and_jsonl(tmp_path):
+    _put(tmp_path, "old.json", _job("ORD-1"), days_old=30)
+    _put(tmp_path, "old.jsonl", _job("ORD-2") + "\n" + _job("ORD-3") + "\n", days_old=30)
+    _put(tmp_path, "broken.json", "{not json", days_old=30)
+    _put(tmp_path, "new.json", _job("ORD-4"))
+    compactor = ArchiveCompactor(tmp_path, days=14)
+
+    assert compactor.compact() == 3
+    assert sorted(p.name for p in tmp_path.iterdir() if p.is_file()) == ["new.json"]
+
+    (index_path,) = compactor.archive_folder.glob("*.index.json")
+    index = {entry["file"]: entry for entry in json.loads(index_path.read_text(encoding="utf-8"))}
+    assert index["old.jsonl"]["orderId"] == ["ORD-2", "ORD-3"]
+    assert index["old.json"]["orderId"] == "ORD-1"
+    assert index["broken.json"] == {"file": "broken.json"}
+
+    found = compactor.lookup("ORD-3")
+    assert [item["file"] for item in found] == ["old.jsonl"]
+    assert found[0]["location"].startswith("archive/")
+    assert found[0]["job"][1]["data"]["orderId"] == "ORD-3"
+    assert [item["file"] for item in compactor.lookup("ORD-4")] == ["new.json"]
+
+
+def test_compact_is_idempotent(tmp_path):
+    _put(tmp_path, "old.json", _job("ORD-1"), days_old=30)
+    compactor = ArchiveCompactor(tmp_path, days=14)
+    assert compactor.compact() == 1
+    assert compactor.compact() == 0
+    assert len(compactor.lookup("ORD-1")) == 1
+
+
+def _day_of(path):
+    from datetime import datetime
+    return datetime.fromtimestamp(path.stat().st_mtime).strftime("%Y%m%d")
+
+
+def test_skips_day_locked_by_another_node(tmp_path):
+    old = _put(tmp_path, "old.json", _job("ORD-1"), days_old=30)
+    compactor = ArchiveCompactor(tmp_path, days=14)
+    compactor.archive_folder.mkdir()
+    lock = compactor.archive_folder / f"{_day_of(old)}.lock"
+    lock.write_text("other-pc.1", encoding="utf-8")
+
+    assert compactor.compact() == 0
+    assert old.exists() and lock.read_text(encoding="utf-8") == "other-pc.1"
+
+
+def test_takes_over_stale_lock_and_cleans_leftovers(tmp_path):
+    import archive_compactor
+    old = _put(tmp_path, "old.json", _job("ORD-1"), days_old=30)
+    compactor = ArchiveCompactor(tmp_path, days=14)
+    compactor.archive_folder.mkdir()
+    day = _day_of(old)
+    lock = compactor.archive_folder / f"{day}.lock"
+    lock.write_text("crashed-pc.1", encoding="utf-8")
+    stale = time.time() - archive_compactor.LOCK_STALE_SECONDS - 1
+    os.utime(lock, (stale, stale))
+    leftover = compactor.archive_folder / f"{day}.zip.crashed-pc.1.tmp"
+    leftover.write_bytes(b"partial")
+
+    assert compactor.compact() == 1
+    assert sorted(p.name for p in compactor.archive_folder.iterdir()) == [f"{day}.index.json", f"{day}.zip"]
+
+
+def test_two_nodes_share_a_folder(tmp_path):
+    for i in range(5):
+        _put(tmp_path, f"old{i}.json", _job(f"ORD-{i}"), days_old=30)
+    first, second = ArchiveCompactor(tmp_path, days=14), ArchiveCompactor(tmp_path, days=14)
+    second.node_id = "other-pc.2"
+
+    # 1台目が圧縮している間（ロック中）に2台目が来ても飛ばす
+    original = first._compact_day
+
+    def compact_day(day, files):
+        assert second.compact() == 0
+        return original(day, files)
+    first._compact_day = compact_day
+
+    assert first.compact() == 5
+    assert second.compact() == 0
+    assert len(first.lookup("ORD-3")) == 1
+    assert not list(first.archive_folder.glob("*.lock"))
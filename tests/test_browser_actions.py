@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""browser_actions: 条件待ち（wait_for / wait_until）・要素待ちの方式（observer / polling）"""
+
+import pytest
+from selenium.common.exceptions import (
+    JavascriptException, NoAlertPresentException, NoSuchElementException, TimeoutException,
+)
+
+import browser_actions
+from browser_actions import BrowserActions
+
+
+class FakeElement:
+    def __init__(self, displayed=True):
+        self.displayed = displayed
+
+    def is_displayed(self):
+        return self.displayed
+
+
+class FakeDriver:
+    """確認のたびに状態を1つ進めるWebDriver（最後の状態はそのまま続く）"""
+
+    def __init__(self, elements=(), network=(), url="https://homis/p", text=""):
+        self.elements = list(elements)     # find_element の結果（None=見つからない）
+        self.network = list(network)       # _NETWORK_STATE_SCRIPT の結果
+        self.current_url = url
+        self.text = text
+        self.alert_shown = False
+        self.scripts = []
+        self.switch_to = self
+
+    @staticmethod
+    def _next(queue):
+        return queue.pop(0) if len(queue) > 1 else queue[0]
+
+    def find_element(self, by, selector):
+        element = self._next(self.elements) if self.elements else None
+        if element is None:
+            raise NoSuchElementException(selector)
+        return element
+
+    def execute_script(self, script, *args):
+        self.scripts.append(script)
+        if script == browser_actions._NETWORK_STATE_SCRIPT:
+            return self._next(self.network)
+        return args[0] in self.text
+
+    @property
+    def alert(self):
+        if not self.alert_shown:
+            raise NoAlertPresentException()
+        return object()
+
+
+@pytest.fixture(autouse=True)
+def fast_poll(monkeypatch):
+    monkeypatch.setattr(browser_actions, "WAIT_POLL_SECONDS", 0.01)
+
+
+def wait_for(driver, **condition):
+    actions = BrowserActions(driver, timeout=1)
+    return actions.execute_action(dict({"name": "待つ", "action": "wait_for"}, **condition), {"id": "7"})
+
+
+def test_visible_waits_for_element():
+    driver = FakeDriver(elements=[None, FakeElement(displayed=False), FakeElement()])
+    assert wait_for(driver, visible="#act_date")
+    assert len(driver.elements) == 1 and driver.elements[0].displayed   # 非表示の間は成立しない
+
+
+def test_visible_times_out():
+    assert not wait_for(FakeDriver(elements=[None]), visible="#act_date", timeout=100)
+
+
+def test_gone():
+    driver = FakeDriver(elements=[FakeElement(), FakeElement(), None])
+    assert wait_for(driver, gone=".loading")
+    assert not wait_for(FakeDriver(elements=[FakeElement()]), gone=".loading", timeout=100)
+
+
+def test_url_contains_expands_variables():
+    assert wait_for(FakeDriver(url="https://homis/?patient_id=7"), url_contains="patient_id={id}")
+    assert not wait_for(FakeDriver(url="https://homis/"), url_contains="patient_id={id}", timeout=100)
+
+
+def test_alert_and_text():
+    driver = FakeDriver(text="保存しました")
+    assert wait_for(driver, text="保存しました")
+    assert not wait_for(driver, alert=True, timeout=100)
+    driver.alert_shown = True
+    assert wait_for(driver, alert=True)
+
+
+def test_network_idle_waits_for_requests_and_quiet_period():
+    states = [["loading", 0, 3], ["complete", 1, 3], ["complete", 0, 4], ["complete", 0, 5]]
+    driver = FakeDriver(network=states)
+    assert wait_for(driver, network_idle=True, idle_ms=50)
+    assert driver.network == [["complete", 0, 5]]   # 通信中・件数の増加中は成立しない
+
+
+def test_network_idle_times_out_while_request_in_flight():
+    driver = FakeDriver(network=[["complete", 1, 5]])   # jQuery以外のXHR / fetchが実行中
+    assert not wait_for(driver, network_idle=True, idle_ms=10, timeout=200)
+
+
+def test_network_state_script_counts_xhr_and_fetch_past_buffer_limit():
+    script = browser_actions._NETWORK_STATE_SCRIPT
+    assert "XMLHttpRequest.prototype.send" in script and "window.fetch" in script
+    assert "PerformanceObserver" in script
+
+
+def test_wait_until_runs_after_action():
+    driver = FakeDriver(elements=[None], network=[["complete", 0, 1]])
+    actions = BrowserActions(driver, timeout=1)
+    step = {"name": "待機", "action": "wait", "ms": 0, "wait_until": {"network_idle": True, "idle_ms": 10}}
+    assert actions.execute_action(step, {})
+    assert browser_actions._NETWORK_STATE_SCRIPT in driver.scripts
+
+
+def test_missing_condition_fails_step():
+    assert not wait_for(FakeDriver(), timeout=100)
+    with pytest.raises(ValueError):
+        BrowserActions(FakeDriver())._wait_condition({"timeout": 100}, {})
+
+
+def test_timeout_raises_from_wait_condition():
+    with pytest.raises(TimeoutException):
+        BrowserActions(FakeDriver(elements=[None]))._wait_condition({"visible": "#x", "timeout": 50}, {})
+
+
+class ObserverDriver(FakeDriver):
+    """execute_async_script（ブラウザ内の要素待ち）の結果を返す。例外なら送出"""
+
+    def __init__(self, observed, **kwargs):
+        super().__init__(**kwargs)
+        self.observed = observed
+        self.async_calls = []
+        self.script_timeouts = []
+        self.finds = 0
+
+    def execute_async_script(self, script, *args):
+        self.async_calls.append(args)
+        if isinstance(self.observed, Exception):
+            raise self.observed
+        return self.observed
+
+    def set_script_timeout(self, seconds):
+        self.script_timeouts.append(seconds)
+
+    def find_element(self, by, selector):
+        self.finds += 1
+        return super().find_element(by, selector)
+
+
+def observer(driver):
+    return BrowserActions(driver, timeout=1, wait_mode=browser_actions.WAIT_MODE_OBSERVER)
+
+
+def test_observer_returns_element_with_one_command():
+    element = FakeElement()
+    driver = ObserverDriver(element)
+    assert observer(driver)._await_element(browser_actions.By.XPATH, "//a", "clickable", 2) is element
+    assert driver.async_calls == [("//a", True, "clickable", 2000)] and driver.finds == 0
+    assert driver.script_timeouts == []   # 既定のスクリプトタイムアウトで足りる
+
+
+def test_observer_timeout_does_not_poll_again():
+    driver = ObserverDriver(None, elements=[FakeElement()])
+    with pytest.raises(TimeoutException):
+        observer(driver)._await_element(browser_actions.By.CSS_SELECTOR, "#x", "visible", 1)
+    assert driver.finds == 0
+
+
+def test_observer_falls_back_to_polling_when_script_interrupted():
+    driver = ObserverDriver(JavascriptException("document unloaded while waiting for result"),
+                            elements=[None, FakeElement()])
+    assert observer(driver).execute_action({"name": "待つ", "action": "wait_for", "visible": "#act_date"}, {})
+    assert len(driver.async_calls) == 1 and driver.finds == 2
+
+
+def test_observer_extends_script_timeout_for_long_waits():
+    driver = ObserverDriver(FakeElement())
+    actions = observer(driver)
+    for timeout in (60, 40, 90):
+        actions._await_element(browser_actions.By.CSS_SELECTOR, "#x", "present", timeout)
+    margin = browser_actions.SCRIPT_TIMEOUT_MARGIN
+    assert driver.script_timeouts == [60 + margin, 90 + margin]   # 延ばすときだけ設定する
+
+
+def test_polling_mode_does_not_use_async_script():
+    driver = ObserverDriver(AssertionError("polling では呼ばない"), elements=[FakeElement()])
+    actions = BrowserActions(driver, timeout=1)
+    assert actions._await_element(browser_actions.By.CSS_SELECTOR, "#x", "present", 1)
+    assert driver.async_calls == []
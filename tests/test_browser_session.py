@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""browser_session: ジョブごとのブラウザコンテキストとログインCookieの引き継ぎ・コマンド数の集計"""
+
+import time
+
+import pytest
+
+from browser_session import BrowserSession, CommandCounter, _transferable_cookies
+
+LOGIN_COOKIE = {"name": "PHPSESSID", "value": "abc", "domain": "homis.jp", "path": "/",
+                "secure": True, "httpOnly": True}
+
+
+class FakeDriver:
+    """CDPのコンテキスト・Cookieを真似るだけのWebDriver（Chromeと同じく期限切れCookieは捨てる）"""
+
+    def __init__(self):
+        self.cookies = {None: []}   # {コンテキストID（None=既定）: [Cookie]}
+        self.targets = {"base": None}   # {タブ: コンテキストID}
+        self.current = "base"
+        self.login_calls = 0
+        self.switch_to = self
+
+    @property
+    def window_handles(self):
+        return list(self.targets)
+
+    def window(self, handle):
+        self.current = handle
+
+    def execute_cdp_cmd(self, command, params):
+        context = params.get("browserContextId")
+        if command == "Target.createBrowserContext":
+            context = f"ctx{len(self.cookies)}"
+            self.cookies[context] = []
+            return {"browserContextId": context}
+        if command == "Target.createTarget":
+            target = f"tab{len(self.targets)}"
+            self.targets[target] = context
+            return {"targetId": target}
+        if command == "Target.disposeBrowserContext":
+            del self.cookies[context]
+            self.targets = {t: c for t, c in self.targets.items() if c != context}
+            return {}
+        if command == "Storage.setCookies":
+            for cookie in params["cookies"]:
+                if "expires" in cookie and cookie["expires"] < time.time():
+                    continue   # 期限切れ → 保存されない
+                self.cookies[context].append(dict(cookie))
+            return {}
+        if command == "Storage.getCookies":
+            # 実際のChromeと同じく、セッションCookieは session=true, expires=-1 で返る
+            return {"cookies": [dict(c, session="expires" not in c, expires=c.get("expires", -1), size=10)
+                                for c in self.cookies[context]]}
+        raise AssertionError(command)
+
+    def login(self):
+        self.login_calls += 1
+        self.cookies[self.targets[self.current]].append(dict(LOGIN_COOKIE))
+
+    def logged_in(self):
+        return any(c["name"] == "PHPSESSID" for c in self.cookies[self.targets[self.current]])
+
+
+def _session(**config):
+    session = BrowserSession(config)
+    session.driver = FakeDriver()
+    session._base_handle = "base"
+    return session
+
+
+def test_default_isolation_is_single_tab():
+    session = _session()
+    assert session.isolation == "tab"
+    assert session.new_context() is False and session.driver.current == "base"
+
+
+def test_second_context_is_logged_in_without_login():
+    session = _session(job_isolation="context")
+    driver = session.driver
+
+    assert session.new_context()
+    assert not driver.logged_in()
+    driver.login()
+
+    for _ in range(2):
+        assert session.new_context()
+        assert driver.logged_in()
+    assert driver.login_calls == 1
+    assert len(driver.cookies) == 2   # 古いコンテキストは破棄済み（既定 + 使用中）
+
+
+def test_profile_write_back_keeps_session_cookie():
+    session = _session(job_isolation="context")
+    session.profiles = object()   # 永続プロファイル使用中（既定のコンテキストに書き戻す）
+    session.new_context()
+    session.driver.login()
+    session.new_context()
+    assert [c["name"] for c in session.driver.cookies[None]] == ["PHPSESSID"]
+
+
+def test_transferable_cookies():
+    future = time.time() + 3600
+    cookies = _transferable_cookies([
+        dict(LOGIN_COOKIE, session=True, expires=-1, size=10),
+        dict(LOGIN_COOKIE, name="remember", session=False, expires=future),
+        dict(LOGIN_COOKIE, name="odd", expires=-5),
+    ])
+    assert "expires" not in cookies[0] and "session" not in cookies[0] and "size" not in cookies[0]
+    assert cookies[1]["expires"] == future
+    assert "expires" not in cookies[2]
+
+
+class CountedDriver:
+    def execute(self, driver_command, params=None):
+        if driver_command == "findElement" and params and params.get("value") == "#missing":
+            raise RuntimeError("no such element")
+        return {"value": None}
+
+
+def test_command_counter_counts_and_resets():
+    counter = CommandCounter()
+    driver = CountedDriver()
+    counter.attach(driver)
+    driver.execute("findElement", {"value": "#karteNew"})
+    driver.execute("clickElement")
+    with pytest.raises(RuntimeError):
+        driver.execute("findElement", {"value": "#missing"})   # 失敗したコマンドも数える
+
+    counts = counter.take()
+    assert {command: count for command, (count, _) in counts.items()} == {"findElement": 2, "clickElement": 1}
+    assert all(seconds >= 0 for _, seconds in counts.values())
+    assert counter.take() == {}
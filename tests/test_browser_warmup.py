@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""browser_warmup: 事前起動・アイドル解放の判定"""
+
+from datetime import datetime, timedelta
+
+from browser_warmup import WarmupSchedule
+
+CONFIG = {"enabled": True, "work_start": "08:30", "work_end": "19:00",
+          "prewarm_minutes": 10, "idle_release_minutes": 60}
+DAY = datetime(2026, 10, 19)
+
+
+def at(hhmm):
+    hour, minute = map(int, hhmm.split(":"))
+    return DAY.replace(hour=hour, minute=minute)
+
+
+def test_disabled_by_default():
+    warmup = WarmupSchedule({})
+    assert not warmup.should_prewarm(at("09:00"))
+    assert not warmup.should_release(at("12:00"), at("09:00"))
+
+
+def test_prewarm_only_in_hours():
+    warmup = WarmupSchedule(CONFIG)
+    assert not warmup.should_prewarm(at("08:19"))
+    assert warmup.should_prewarm(at("08:20"))
+    assert warmup.should_prewarm(at("18:59"))
+    assert not warmup.should_prewarm(at("19:00"))
+    assert not warmup.should_prewarm(at("02:00"))
+
+
+def test_release_then_no_prewarm_until_next_day():
+    warmup = WarmupSchedule(CONFIG)
+    assert warmup.should_release(at("11:00"), at("10:00"))
+    assert not warmup.should_release(at("10:59"), at("10:00"))
+    warmup.released(at("11:00"))
+    assert not warmup.should_prewarm(at("12:00"))
+    assert warmup.should_prewarm(at("08:20") + timedelta(days=1))
+
+
+def test_activity_clears_release():
+    warmup = WarmupSchedule(CONFIG)
+    warmup.released(at("11:00"))
+    warmup.activity()
+    assert warmup.should_prewarm(at("12:00"))
+
+
+def test_failure_waits_before_retry():
+    warmup = WarmupSchedule(CONFIG)
+    warmup.failed(at("09:00"))
+    assert not warmup.should_prewarm(at("09:04"))
+    assert warmup.should_prewarm(at("09:05"))
+    warmup.succeeded()
+    assert warmup.should_prewarm(at("09:01"))
+
+
+def test_watcher_does_not_prewarm_on_job_activity(tmp_path, monkeypatch):
+    import copy
+    import watcher
+
+    config = copy.deepcopy(watcher.DEFAULT_CONFIG)
+    config.update(watch_folder=str(tmp_path), browser_warmup=dict(CONFIG))
+    w = watcher.FolderWatcher(config)
+    launched = []
+    monkeypatch.setattr(w, "_get_browser_session", lambda: launched.append(1))
+    monkeypatch.setattr(w.warmup, "in_hours", lambda now: False)
+
+    w._maintain_browser(True)   # ジョブあり・業務時間外 → ジョブ自身が起動するので事前起動しない
+    assert launched == []
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""chrome_profile: プロファイルのスロット取得・ロック・キャッシュ削除・古いスロットの削除"""
+
+import os
+import time
+
+import pytest
+
+import chrome_profile
+from chrome_profile import ProfileSlots
+
+ALIVE = {1001, 1002, 1003}
+
+
+@pytest.fixture(autouse=True)
+def processes(monkeypatch):
+    alive = set(ALIVE)
+    monkeypatch.setattr(chrome_profile, "_pid_alive", lambda pid: pid in alive)
+    return alive
+
+
+def slots_for(root, pid, **options):
+    slots = ProfileSlots(root, **options)
+    slots.pid = pid
+    return slots
+
+
+def test_each_process_gets_its_own_slot(tmp_path):
+    first, second, third = (slots_for(tmp_path, pid, slots=2) for pid in (1001, 1002, 1003))
+    assert first.acquire() == tmp_path / "slot1"
+    assert first.acquire() == tmp_path / "slot1"   # 取得済みならそのまま
+    assert second.acquire() == tmp_path / "slot2"
+    assert third.acquire() is None   # 全スロット使用中 → 使い捨てプロファイル
+
+    first.release()
+    assert not (tmp_path / "slot1.lock").exists()
+    assert third.acquire() == tmp_path / "slot1"
+
+
+def test_lock_of_finished_process_is_taken_over(tmp_path, processes):
+    slots_for(tmp_path, 1001, slots=1).acquire()
+    processes.discard(1001)   # 異常終了（release されていない）
+    assert slots_for(tmp_path, 1002, slots=1).acquire() == tmp_path / "slot1"
+
+
+def test_unreadable_lock_is_kept(tmp_path):
+    tmp_path.joinpath("slot1.lock").write_text("", encoding="utf-8")   # 作成途中
+    assert slots_for(tmp_path, 1001, slots=1).acquire() is None
+
+
+def test_trim_removes_only_cache_over_limit(tmp_path):
+    profile_dir = tmp_path / "slot1"
+    cache = profile_dir / "Default" / "Cache"
+    cache.mkdir(parents=True)
+    (cache / "data_1").write_bytes(b"x" * 2048)
+    (profile_dir / "Default" / "Cookies").write_bytes(b"c" * 10)
+
+    slots_for(tmp_path, 1001, max_size_mb=1).trim(profile_dir)
+    assert cache.exists()   # 上限以下なら何もしない
+
+    slots_for(tmp_path, 1001, max_size_mb=0.001).trim(profile_dir)
+    assert not cache.exists() and (profile_dir / "Default" / "Cookies").exists()
+
+
+def test_cleanup_removes_idle_and_extra_slots(tmp_path):
+    for name in ("slot1", "slot2", "slot3", "slot4", "other"):
+        (tmp_path / name).mkdir()
+    slots_for(tmp_path, 1002, slots=4).acquire()   # slot1 を別プロセスが使用中
+    old = time.time() - 30 * 86400
+    for name in ("slot1", "slot2"):
+        os.utime(tmp_path / name, (old, old))
+
+    removed = slots_for(tmp_path, 1001, slots=3, max_age_days=14).cleanup()
+    assert sorted(path.name for path in removed) == ["slot2", "slot4"]
+    assert (tmp_path / "slot1").exists() and (tmp_path / "slot3").exists() and (tmp_path / "other").exists()
+    assert not (tmp_path / "slot2.lock").exists()
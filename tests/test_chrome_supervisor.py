@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""chrome_supervisor: 起動済みChromeへの再接続・起動し直し（実際のChromeは起動しない）"""
+
+import json
+
+import pytest
+
+import chrome_supervisor
+from browser_session import BrowserSession
+from chrome_supervisor import ChromeSupervisor
+
+CHROME_PID = 4321
+
+
+class FakeProcess:
+    pid = 5555
+
+    def poll(self):
+        return None
+
+
+@pytest.fixture
+def supervisor(tmp_path, monkeypatch):
+    monkeypatch.setattr(chrome_supervisor, "_is_chrome", lambda pid: pid == CHROME_PID)
+    monkeypatch.setattr(chrome_supervisor, "debugger_ready", lambda port, timeout=None: port == 9222)
+    supervisor = ChromeSupervisor(tmp_path / "slot1")
+    supervisor.launched = []
+    supervisor.stopped = []
+
+    def stop():
+        supervisor.stopped.append(supervisor.pid)
+        supervisor.pid = supervisor.port = None
+        supervisor.state_file.unlink(missing_ok=True)
+    monkeypatch.setattr(supervisor, "stop", stop)
+    monkeypatch.setattr(supervisor, "_launch", lambda headless: supervisor.launched.append(headless))
+    return supervisor
+
+
+def write_state(supervisor, pid=CHROME_PID, port=9222, headless=False):
+    supervisor.state_file.write_text(json.dumps({"pid": pid, "port": port, "headless": headless}),
+                                     encoding="utf-8")
+
+
+def test_attaches_to_surviving_chrome(supervisor):
+    write_state(supervisor)
+    assert supervisor.ensure(headless=False)
+    assert supervisor.address == "127.0.0.1:9222" and supervisor.pid == CHROME_PID
+    assert supervisor.launched == [] and supervisor.stopped == []
+
+
+def test_launches_without_state(supervisor):
+    assert not supervisor.ensure(headless=True)
+    assert supervisor.launched == [True]
+
+
+@pytest.mark.parametrize("state, stopped", [
+    ({"headless": True}, [CHROME_PID]),      # 起動オプションが変わった → 終了して起動し直す
+    ({"port": 9999}, [CHROME_PID]),          # デバッグポートが応答しない
+    ({"pid": 999999}, [None]),               # PCの再起動などで別のプロセスになったPIDは終了しない
+])
+def test_restarts_unusable_chrome(supervisor, state, stopped):
+    write_state(supervisor, **state)
+    assert not supervisor.ensure(headless=False)
+    assert supervisor.stopped == stopped and supervisor.launched == [False]
+    assert not supervisor.state_file.exists()
+
+
+def test_launch_records_state(tmp_path, monkeypatch):
+    popen_args = []
+    monkeypatch.setattr(chrome_supervisor, "find_chrome", lambda path: "/opt/chrome")
+    monkeypatch.setattr(chrome_supervisor, "_free_port", lambda: 9222)
+    monkeypatch.setattr(chrome_supervisor, "debugger_ready", lambda port, timeout=None: True)
+    monkeypatch.setattr(chrome_supervisor.subprocess, "Popen",
+                        lambda args, **kwargs: popen_args.append(args) or FakeProcess())
+    supervisor = ChromeSupervisor(tmp_path / "slot1")
+    supervisor._launch(headless=True)
+
+    args = popen_args[0]
+    assert args[:2] == ["/opt/chrome", "--headless"]
+    assert "--remote-debugging-port=9222" in args and f"--user-data-dir={tmp_path / 'slot1'}" in args
+    state = json.loads(supervisor.state_file.read_text(encoding="utf-8"))
+    assert (state["pid"], state["port"], state["headless"]) == (FakeProcess.pid, 9222, True)
+
+
+def test_launch_without_chrome(tmp_path, monkeypatch):
+    monkeypatch.setattr(chrome_supervisor, "find_chrome", lambda path: None)
+    with pytest.raises(FileNotFoundError):
+        ChromeSupervisor(tmp_path / "slot1")._launch(headless=False)
+
+
+class FakeDriver:
+    def __init__(self):
+        self.quits = 0
+
+    def quit(self):
+        self.quits += 1
+
+
+@pytest.mark.parametrize("keep_browser, stopped", [(True, []), (False, [CHROME_PID])])
+def test_session_quit_keeps_attached_chrome(supervisor, keep_browser, stopped):
+    session = BrowserSession({})
+    session.driver = driver = FakeDriver()
+    supervisor.pid = CHROME_PID
+    session.supervisor = supervisor
+    session._quit(keep_browser=keep_browser)
+    # アプリ終了では切断だけ（Chromeは残す）、リサイクルでは Chrome ごと終了
+    assert driver.quits == 1 and supervisor.stopped == stopped
+    assert session.driver is None and session.supervisor is None
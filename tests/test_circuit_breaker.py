@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""circuit_breaker: 遮断・HTTP確認・試行の状態遷移"""
+
+import pytest
+
+import circuit_breaker
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+class Probe:
+    def __init__(self):
+        self.up = False
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.up
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(circuit_breaker.time, "time", lambda: now[0])
+    return now
+
+
+def _open(breaker):
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure("タイムアウト")
+    assert breaker.state == OPEN
+
+
+def test_opens_after_threshold(clock):
+    changes = []
+    breaker = CircuitBreaker(Probe(), failure_threshold=3,
+                             on_change=lambda state, reason: changes.append(state))
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CLOSED and breaker.allow()
+    breaker.record_failure("タイムアウト")
+    assert breaker.state == OPEN and changes == [OPEN]
+
+
+def test_success_resets_failure_count(clock):
+    breaker = CircuitBreaker(Probe(), failure_threshold=2)
+    breaker.record_failure()
+    breaker.record_success("ステップ失敗（Homisは応答）")
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+
+
+def test_probes_only_after_interval(clock):
+    probe = Probe()
+    breaker = CircuitBreaker(probe, failure_threshold=1, probe_interval=30)
+    _open(breaker)
+
+    assert not breaker.allow() and probe.calls == 0
+    assert breaker.next_probe_in() == 30
+    clock[0] += 30
+    assert not breaker.allow() and probe.calls == 1   # まだ応答なし → 次は30秒後
+    assert breaker.next_probe_in() == 30
+
+    probe.up = True
+    clock[0] += 30
+    assert breaker.allow() and breaker.state == HALF_OPEN
+    assert breaker.next_probe_in() is None
+
+
+def _half_open(clock, breaker, probe):
+    _open(breaker)
+    probe.up = True
+    clock[0] += breaker.probe_interval
+    assert breaker.allow() and breaker.state == HALF_OPEN
+
+
+def test_half_open_allows_single_trial(clock):
+    probe = Probe()
+    breaker = CircuitBreaker(probe, failure_threshold=1)
+    _half_open(clock, breaker, probe)
+
+    breaker.begin_job()
+    assert not breaker.allow()   # 試行中は次のジョブを止める
+    breaker.record_success()
+    assert breaker.state == CLOSED and breaker.allow()
+
+
+def test_half_open_failure_reopens(clock):
+    probe = Probe()
+    breaker = CircuitBreaker(probe, failure_threshold=3)
+    _half_open(clock, breaker, probe)
+
+    breaker.begin_job()
+    breaker.record_failure("ログイン失敗")   # 試行中は1回の失敗で遮断
+    assert breaker.state == OPEN and not breaker.allow()
+
+
+def test_end_job_keeps_half_open_for_next_trial(clock):
+    probe = Probe()
+    breaker = CircuitBreaker(probe, failure_threshold=1)
+    _half_open(clock, breaker, probe)
+
+    breaker.begin_job()
+    breaker.end_job()   # 判断材料にならない結果（入力検証エラー等）
+    assert breaker.state == HALF_OPEN and breaker.allow()
+
+
+def test_begin_job_outside_trial_does_not_block(clock):
+    breaker = CircuitBreaker(Probe())
+    breaker.begin_job()
+    assert breaker.allow()
+
+
+def test_trip_holds_for_given_seconds(clock):
+    probe = Probe()
+    probe.up = True
+    breaker = CircuitBreaker(probe, probe_interval=30)
+    breaker.trip("画面構成の変更", hold_seconds=600)
+
+    clock[0] += 599
+    assert not breaker.allow() and probe.calls == 0
+    clock[0] += 1
+    assert breaker.allow() and breaker.state == HALF_OPEN
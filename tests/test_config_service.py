@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""config_service: 設定の検証・ホットリロード"""
+
+import json
+import os
+
+from config_service import ConfigService, validate_config
+
+VALID = {"watch_folder": "/tmp/homis", "poll_interval_seconds": 10}
+
+
+def test_valid_config_has_no_errors():
+    assert validate_config(dict(VALID)) == []
+
+
+def test_missing_watch_folder():
+    errors = validate_config({"poll_interval_seconds": 10})
+    assert any("watch_folder" in e for e in errors)
+
+
+def test_rejects_bad_values():
+    config = dict(VALID, poll_interval_seconds=0, headless="yes", wait_mode="fast",
+                  job_isolation="window", homis_url="homis.local",
+                  schedule={"restart_time": "24:00"}, api={"port": 70000})
+    errors = validate_config(config)
+    for key in ("poll_interval_seconds", "headless", "wait_mode", "job_isolation",
+                "homis_url", "schedule.restart_time", "api.port"):
+        assert any(e.startswith(key) for e in errors), key
+
+
+def test_bool_is_not_a_number():
+    errors = validate_config(dict(VALID, lease={"lease_seconds": True}))
+    assert any(e.startswith("lease.lease_seconds") for e in errors)
+
+
+def test_warmup_hours_must_be_ordered():
+    errors = validate_config(dict(VALID, browser_warmup={"work_start": "19:00", "work_end": "08:30"}))
+    assert any("work_start は work_end より前" in e for e in errors)
+
+
+def test_warmup_hours_non_string_does_not_raise():
+    errors = validate_config(dict(VALID, browser_warmup={"work_start": 830, "work_end": "19:00"}))
+    assert any(e.startswith("browser_warmup.work_start") for e in errors)
+
+
+def test_retry_policies_must_be_numeric():
+    errors = validate_config(dict(VALID, retry={"policies": {"transient": {"max_attempts": "3"}}}))
+    assert any(e.startswith("retry.policies.transient.max_attempts") for e in errors)
+
+
+def _write(path, config, mtime):
+    path.write_text(json.dumps(config), encoding="utf-8")
+    os.utime(path, (mtime, mtime))
+
+
+def _service(tmp_path):
+    path = tmp_path / "config.json"
+    _write(path, VALID, 1000)
+    loader = lambda: json.loads(path.read_text(encoding="utf-8"))
+    service = ConfigService(path, loader)
+    calls = []
+    service.add_listener(lambda config, changed: calls.append((config, changed)))
+    return path, service, calls
+
+
+def test_poll_without_change_does_nothing(tmp_path):
+    _, service, calls = _service(tmp_path)
+    assert service.poll() is False
+    assert calls == []
+
+
+def test_poll_applies_changed_keys(tmp_path):
+    path, service, calls = _service(tmp_path)
+    _write(path, dict(VALID, poll_interval_seconds=30), 2000)
+
+    assert service.poll() is True
+    assert calls[0][1] == {"poll_interval_seconds"}
+    assert service.current["poll_interval_seconds"] == 30
+    # 同じ更新日時では再反映しない
+    assert service.poll() is False
+
+
+def test_invalid_config_keeps_current(tmp_path):
+    path, service, calls = _service(tmp_path)
+    _write(path, dict(VALID, poll_interval_seconds=-1), 2000)
+
+    assert service.poll() is False
+    assert calls == []
+    assert service.current["poll_interval_seconds"] == 10
+
+
+def test_unreadable_config_keeps_current(tmp_path):
+    path, service, calls = _service(tmp_path)
+    path.write_text("{broken", encoding="utf-8")
+    os.utime(path, (2000, 2000))
+
+    assert service.poll() is False
+    assert service.current == VALID
+
+
+def test_listener_error_does_not_stop_others(tmp_path):
+    path, service, calls = _service(tmp_path)
+    service._listeners.insert(0, lambda config, changed: 1 / 0)
+    _write(path, dict(VALID, headless=True), 2000)
+
+    assert service.poll() is True
+    assert calls[0][1] == {"headless"}
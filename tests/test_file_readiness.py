@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""file_readiness: 書き込み完了の判定・読めないファイルの後回し"""
+
+import json
+
+import pytest
+
+import file_readiness
+from file_readiness import FileNotReady, ReadinessGate, read_stable
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(file_readiness.time, "time", clock.time)
+    monkeypatch.setattr(file_readiness.time, "sleep", clock.sleep)
+    return clock
+
+
+def _write(path, text="{}"):
+    path.write_text(text, encoding="utf-8")
+    return path
+
+
+def test_file_passes_after_stable_seconds(tmp_path, clock):
+    path = _write(tmp_path / "a.json")
+    gate = ReadinessGate(stable_seconds=2)
+
+    assert gate.filter([path]) == []
+    assert gate.next_check_in() == pytest.approx(2)
+    clock.now += 2
+    assert gate.filter([path]) == [path]
+    assert gate.next_check_in() is None
+
+
+def test_change_restarts_observation(tmp_path, clock):
+    path = _write(tmp_path / "a.json")
+    gate = ReadinessGate(stable_seconds=2)
+    gate.filter([path])
+    clock.now += 2
+    _write(path, '{"action": "x"}')
+    assert gate.filter([path]) == []
+
+
+def test_empty_file_and_sync_marker_are_held(tmp_path, clock):
+    empty = _write(tmp_path / "empty.json", "")
+    syncing = _write(tmp_path / "b.json")
+    _write(tmp_path / "b.json.tmp")
+    gate = ReadinessGate(stable_seconds=0)
+    assert gate.filter([empty, syncing]) == []
+
+
+def test_defer_gives_up_after_max_deferrals(tmp_path, clock):
+    path = _write(tmp_path / "a.json")
+    gate = ReadinessGate(stable_seconds=0, max_deferrals=3, max_defer_seconds=3600)
+    for _ in range(2):
+        assert gate.filter([path]) == [path]
+        assert gate.defer(path.name) is None
+    assert gate.defer(path.name).startswith("3回")
+    # 上限で記録は消える（次に後回しにすると数え直し）
+    assert gate.defer(path.name) is None
+
+
+def test_defer_gives_up_after_max_age(tmp_path, clock):
+    path = _write(tmp_path / "a.json")
+    gate = ReadinessGate(stable_seconds=0, max_deferrals=100, max_defer_seconds=60)
+    gate.filter([path])
+    assert gate.defer(path.name) is None
+    clock.now += 61
+    gate.filter([path])
+    assert gate.defer(path.name) is not None
+
+
+def test_defer_record_dropped_when_file_disappears(tmp_path, clock):
+    path = _write(tmp_path / "a.json")
+    other = _write(tmp_path / "b.json")
+    gate = ReadinessGate(stable_seconds=0, max_deferrals=2)
+    gate.filter([path, other])
+    assert gate.defer(path.name) is None
+    gate.filter([other])   # a.json は処理済み・他のPCが取得
+    assert gate.defer(path.name) is None
+
+
+def test_read_stable_os_error_is_not_ready(tmp_path, clock):
+    def locked(path):
+        raise PermissionError("locked by sync client")
+    with pytest.raises(FileNotReady):
+        read_stable(_write(tmp_path / "a.json"), locked)
+
+
+def test_read_stable_broken_file_raises_value_error(tmp_path, clock):
+    path = _write(tmp_path / "a.json", "{broken")
+    with pytest.raises(ValueError):
+        read_stable(path, lambda p: json.loads(p.read_text(encoding="utf-8")), retries=2, delay=1)
+
+
+def test_read_stable_changing_file_is_not_ready(tmp_path, clock):
+    path = _write(tmp_path / "a.json", "{bro")
+
+    def parse(p):
+        text = p.read_text(encoding="utf-8")
+        _write(p, text + "ken")   # 解析中にも書き込みが続いている
+        return json.loads(text)
+    with pytest.raises(FileNotReady):
+        read_stable(path, parse, retries=2, delay=1)
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""gui: ログ欄への反映・終了処理・他のスレッドからのGUI更新（Tkのウィンドウは作らずに確認）"""
+
+import queue
+import threading
+
+import pytest
+
+import gui
+from gui import HomisCardGeneratorGUI
+
+
+class FakeRoot:
+    """root.after は記録するだけ（run_after で順に実行）"""
+
+    def __init__(self):
+        self.scheduled = []
+        self.withdrawn = False
+        self.destroyed = False
+
+    def after(self, ms, func, *args):
+        self.scheduled.append((ms, func, args))
+        return len(self.scheduled)
+
+    def after_cancel(self, timer_id):
+        pass
+
+    def withdraw(self):
+        self.withdrawn = True
+
+    def destroy(self):
+        self.destroyed = True
+
+    def run_after(self):
+        ms, func, args = self.scheduled.pop(0)
+        func(*args)
+
+
+class FakeText:
+    def __init__(self):
+        self.lines = []
+        self.inserts = 0
+
+    def insert(self, index, text, tag):
+        self.inserts += 1
+        self.lines.extend((line, tag) for line in text.splitlines())
+
+    def index(self, index):
+        return f"{len(self.lines) + 1}.0"
+
+    def delete(self, start, end):
+        del self.lines[:int(end.split(".")[0]) - 1]
+
+    def see(self, index):
+        pass
+
+
+class FakeWatcher:
+    def __init__(self, closer=None):
+        self.closer = closer
+        self.stops = 0
+
+    def stop(self):
+        self.stops += 1
+        return self.closer
+
+    def close_browser(self, timeout=None):
+        raise AssertionError("GUIスレッドでブラウザを閉じてはいけない")
+
+
+@pytest.fixture
+def app():
+    app = object.__new__(HomisCardGeneratorGUI)
+    app.root = FakeRoot()
+    app.log_text = FakeText()
+    app._log_queue = queue.Queue()
+    app.watcher = None
+    app.tray_icon = None
+    app.is_running = True
+    app._quitting = False
+    app._shutdown_timer_id = None
+    return app
+
+
+def test_quit_waits_for_browser_close_off_the_gui_thread(app):
+    release = threading.Event()
+    closer = threading.Thread(target=release.wait, daemon=True)
+    closer.start()
+    app.watcher = FakeWatcher(closer)
+
+    app._cleanup_and_quit()
+    assert app.root.withdrawn and not app.root.destroyed   # すぐ戻る（ウィンドウは隠すだけ）
+    app._cleanup_and_quit()   # 日次リスタート等での二重呼び出し
+    assert app.watcher.stops == 1
+
+    app.root.run_after()
+    assert not app.root.destroyed
+    release.set()
+    closer.join()
+    app.root.run_after()
+    assert app.root.destroyed
+
+
+def test_quit_gives_up_after_deadline(app, monkeypatch):
+    closer = threading.Thread(target=threading.Event().wait, daemon=True)
+    closer.start()
+    app.watcher = FakeWatcher(closer)
+    now = [1000.0]
+    monkeypatch.setattr(gui.time, "time", lambda: now[0])
+
+    app._cleanup_and_quit()
+    now[0] += app.QUIT_BROWSER_WAIT_MS / 1000
+    app.root.run_after()
+    assert app.root.destroyed
+
+
+def test_quit_without_browser(app):
+    app.watcher = FakeWatcher(None)
+    app._cleanup_and_quit()
+    assert app.root.destroyed and app.root.scheduled == []
+
+
+def test_config_reload_is_applied_on_gui_thread(app, monkeypatch):
+    applied = []
+    monkeypatch.setattr(app, "_reload_ui", lambda: applied.append(threading.current_thread()), raising=False)
+    worker = threading.Thread(target=app._on_config_reloaded, args=({"headless": True}, {"headless"}))
+    worker.start()
+    worker.join()
+    assert applied == [] and app.root.scheduled == []   # 監視スレッドでは何も触らない
+
+    app._drain_log_queue()
+    assert applied == [threading.current_thread()] and app.config == {"headless": True}
+    assert "設定変更を反映しました: headless" in app.log_text.lines[0][0]
+
+
+def test_gui_call_errors_do_not_stop_log_drain(app):
+    app._call_on_gui(lambda: 1 / 0)
+    app._add_log("続き")
+    app._drain_log_queue()
+    assert app.log_text.lines[0][0].endswith("続き")
+    assert app.root.scheduled[-1][1] == app._drain_log_queue
+
+
+def test_log_drain_groups_lines_by_tag(app):
+    for message, level in [("a", "INFO"), ("b", "INFO"), ("c", "ERROR"), ("d", "UNKNOWN")]:
+        app._add_log(message, level)
+    app._drain_log_queue()
+    assert [(line[-1], tag) for line, tag in app.log_text.lines] == [
+        ("a", "info"), ("b", "info"), ("c", "error"), ("d", "info")]
+    assert app.log_text.inserts == 3   # 同じタグが続く行は1回で挿入
+
+
+def test_log_drain_takes_at_most_one_batch(app):
+    for i in range(app.LOG_DRAIN_BATCH + 10):
+        app._add_log(str(i))
+    app._drain_log_queue()
+    assert len(app.log_text.lines) == app.LOG_DRAIN_BATCH
+    assert app._log_queue.qsize() == 10   # 残りは次の反映で（GUIを止めない）
+    app._drain_log_queue()
+    assert app._log_queue.empty()
+
+
+def test_log_lines_are_capped(app):
+    app.LOG_MAX_LINES = 5
+    for i in range(8):
+        app._add_log(str(i))
+    app._drain_log_queue()
+    assert [line[-1] for line, _ in app.log_text.lines] == ["3", "4", "5", "6", "7"]
+
+
+def test_log_drain_stops_after_window_destroyed(app):
+    def broken(*args):
+        raise gui.tk.TclError("application has been destroyed")
+    app.log_text.insert = broken
+    app._add_log("a")
+    app._drain_log_queue()
+    assert app.root.scheduled == []
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""job_api: ジョブ投入API・監視フォルダへの書き出しと処理"""
+
+import copy
+import json
+import urllib.error
+import urllib.request
+
+import pytest
+
+import watcher
+from job_api import JobApiServer, JobStatusStore, api_file_name, API_ID_KEY
+
+JOB = {"action": "homis_karte_write", "template": "oushin_blank_karte",
+       "data": {"homisId": "123", "visitDate": "2026-10-18", "doctorName": "山田"}}
+
+
+@pytest.fixture
+def api():
+    submitted = []
+    server = JobApiServer(lambda key, job: submitted.append((key, job)), JobStatusStore(),
+                          port=0, token="secret", queued=lambda: len(submitted))
+    server.start()
+    server.submitted = submitted
+    yield server
+    server.stop()
+
+
+def call(server, method, path, body=None, token="secret"):
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    headers = {"Content-Type": "application/json"}
+    if token:
+        headers["X-Api-Token"] = token
+    req = urllib.request.Request(f"http://127.0.0.1:{server.port}{path}", data=data,
+                                 method=method, headers=headers)
+    try:
+        with urllib.request.urlopen(req, timeout=5) as resp:
+            return resp.status, json.loads(resp.read().decode("utf-8"))
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read().decode("utf-8"))
+
+
+def test_submit_and_status(api):
+    status, body = call(api, "POST", "/jobs", dict(JOB, job_id="J-1"))
+    assert (status, body) == (202, {"id": "J-1", "status": "queued"})
+    assert api.submitted == [("J-1", dict(JOB, job_id="J-1"))]
+    assert call(api, "GET", "/jobs/J-1")[1]["status"] == "queued"
+    assert call(api, "POST", "/jobs", dict(JOB, job_id="J-1"))[0] == 409   # 処理中
+    assert call(api, "GET", "/health") == (200, {"status": "ok", "queued": 1})
+
+
+def test_generated_id(api):
+    status, body = call(api, "POST", "/jobs", JOB)
+    assert status == 202 and body["id"].startswith("api_")
+    assert "job_id" not in api.submitted[0][1]
+
+
+@pytest.mark.parametrize("body", [[1, 2], {"data": {}}, {"action": ""}])
+def test_rejects_bad_job(api, body):
+    assert call(api, "POST", "/jobs", body)[0] == 400
+    assert api.submitted == []
+
+
+def test_token_and_unknown_paths(api):
+    assert call(api, "GET", "/health", token="")[0] == 401
+    assert call(api, "POST", "/jobs", JOB, token="wrong")[0] == 401
+    assert call(api, "GET", "/jobs/missing")[0] == 404
+    assert call(api, "GET", "/other")[0] == 404
+
+
+@pytest.mark.parametrize("error, code", [(FileExistsError("x"), 409), (PermissionError("x"), 503)])
+def test_submit_failure_is_not_accepted(error, code):
+    def submit(key, job):
+        raise error
+    server = JobApiServer(submit, JobStatusStore())
+    status, body = server.handle_submit(dict(JOB, job_id="J-2"))
+    assert status == code and server.statuses.get("J-2") is None
+
+
+def test_api_file_name_is_safe():
+    assert api_file_name("J-1") == "api_J-1.json"
+    assert api_file_name("../a b/c") == "api_.._a_b_c.json"
+
+
+# --- 監視プロセス側（受け付けたジョブは監視フォルダに書き出される） ---
+
+def make_watcher(tmp_path, monkeypatch, outcomes):
+    config = copy.deepcopy(watcher.DEFAULT_CONFIG)
+    config.update(watch_folder=str(tmp_path), test_mode=False)
+    w = watcher.FolderWatcher(config)
+    w.calls = []
+
+    def write(data):
+        w.calls.append(data)
+        return outcomes.pop(0) if outcomes else {"success": True, "karte_url": "https://homis/k/1"}
+    monkeypatch.setattr(w, "_write_to_homis", write)
+    monkeypatch.setattr(w, "_notify_gas", lambda *args: None)
+    monkeypatch.setattr(w, "_write_result_file", lambda *args, **kwargs: None)
+    monkeypatch.setattr(w, "_notify_oushin_chat", lambda *args, **kwargs: None)
+    monkeypatch.setattr(w, "_maintain_browser", lambda active: None)
+    return w
+
+
+def test_submitted_job_is_spooled_and_processed(tmp_path, monkeypatch):
+    w = make_watcher(tmp_path, monkeypatch, [])
+    w.submit_job("api_1", JOB)
+    spooled = json.loads((tmp_path / "api_api_1.json").read_text(encoding="utf-8"))
+    assert spooled[API_ID_KEY] == "api_1" and spooled["data"] == JOB["data"]
+    with pytest.raises(FileExistsError):
+        w.submit_job("api_1", JOB)
+
+    results = w.run_cycle()   # 書き込み完了待ちなしで処理される
+    assert [(path.name, ok) for path, ok in results] == [("api_api_1.json", True)]
+    assert w.job_statuses.get("api_1")["status"] == "success"
+    assert (tmp_path / "済" / "api_api_1.json").exists()
+    assert w._api_queued() == 0
+
+
+def test_spooled_job_survives_restart(tmp_path, monkeypatch):
+    first = make_watcher(tmp_path, monkeypatch, [])
+    first.submit_job("J-9", dict(JOB, job_id="J-9"))   # 処理前に終了した
+
+    second = make_watcher(tmp_path, monkeypatch, [])
+    second.readiness.stable_seconds = 0
+    results = second.run_cycle()
+    assert len(results) == 1 and second.calls[0]["job_id"] == "J-9"
+    assert second.job_statuses.get("J-9")["status"] == "success"
+
+
+def test_failed_api_job_is_retried_from_disk(tmp_path, monkeypatch):
+    w = make_watcher(tmp_path, monkeypatch, [{"success": False, "karte_url": None,
+                                              "error": "移動できません", "error_class": "navigation"}])
+    w.submit_job("api_2", JOB)
+    w.run_cycle()
+    assert w.job_statuses.get("api_2")["status"] == "retrying"
+    retry_files = list(tmp_path.glob("api_api_2.json.retry.*"))
+    assert len(retry_files) == 1   # 再起動しても残る
+    assert json.loads(retry_files[0].read_text(encoding="utf-8"))["_retry"]["attempts"] == 1
+    assert w._api_queued() == 1
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""job_bundle: バンドルの読み込み・行ごとの進捗"""
+
+import json
+
+import pytest
+
+from job_bundle import BundleProgress, compound_keys, expand_compound, is_bundle, read_bundle
+
+JOB_A = {"action": "homis_karte_write", "data": {"homisId": "1"}}
+JOB_B = {"action": "homis_karte_write", "data": {"homisId": "2"}}
+
+
+def _jsonl(path, *lines):
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return path
+
+
+def test_is_bundle(tmp_path):
+    assert is_bundle(_jsonl(tmp_path / "a.jsonl", json.dumps(JOB_A)))
+    array = tmp_path / "b.json"
+    array.write_text("\ufeff  " + json.dumps([JOB_A, JOB_B]), encoding="utf-8")
+    assert is_bundle(array)
+    single = tmp_path / "c.json"
+    single.write_text(json.dumps(JOB_A), encoding="utf-8")
+    assert not is_bundle(single)
+    # 取得済み（リネーム後）のファイルは元の名前で判定
+    assert is_bundle(single, name="c.jsonl")
+
+
+def test_read_jsonl_skips_blank_and_reports_bad_lines(tmp_path):
+    path = _jsonl(tmp_path / "a.jsonl", json.dumps(JOB_A), "", "{broken", "[1]", json.dumps(JOB_B))
+    lines = read_bundle(path)
+
+    assert [line_no for _, line_no, _, _ in lines] == [1, 3, 4, 5]
+    assert lines[0][2] == JOB_A and lines[0][3] == ""
+    assert lines[1][2] is None and lines[1][3].startswith("JSON解析エラー")
+    assert lines[2][2] is None and lines[2][3] == "ジョブがオブジェクトではありません"
+    assert lines[3][2] == JOB_B
+
+
+def test_line_key_depends_on_contents(tmp_path):
+    first = read_bundle(_jsonl(tmp_path / "a.jsonl", json.dumps(JOB_A)))[0][0]
+    second = read_bundle(_jsonl(tmp_path / "a.jsonl", json.dumps(JOB_B)))[0][0]
+    assert first.startswith("1:") and first != second
+
+
+def test_strict_tail_rejects_partial_last_line(tmp_path):
+    path = _jsonl(tmp_path / "a.jsonl", json.dumps(JOB_A), '{"action": "homis')
+    with pytest.raises(ValueError):
+        read_bundle(path, strict_tail=True)
+    assert len(read_bundle(path)) == 2
+
+
+def test_read_array_bundle(tmp_path):
+    path = tmp_path / "b.json"
+    path.write_text(json.dumps([JOB_A, "x"]), encoding="utf-8")
+    lines = read_bundle(path)
+    assert lines[0][2] == JOB_A and lines[1][2] is None
+    path.write_text(json.dumps(JOB_A), encoding="utf-8")
+    with pytest.raises(ValueError):
+        read_bundle(path, name="b.json")
+
+
+def test_progress_resumes_and_finishes(tmp_path):
+    watch, processed = tmp_path / "watch", tmp_path / "済"
+    watch.mkdir()
+    processed.mkdir()
+    path = _jsonl(watch / "kenshin.jsonl", json.dumps(JOB_A), json.dumps(JOB_B))
+    (key_a, line_a, _, _), (key_b, _, _, _) = read_bundle(path)
+
+    progress = BundleProgress(watch, "kenshin.jsonl")
+    progress.record(key_a, line_a, {"success": True, "karte_url": "https://homis/k/1"})
+
+    # 途中で止まっても、同じバンドル名なら処理済みの行から再開できる
+    resumed = BundleProgress(watch, "kenshin.jsonl")
+    assert resumed.is_done(key_a) and not resumed.is_done(key_b)
+    resumed.record(key_b, 2, {"success": False, "error": "ステップ失敗"})
+    assert not resumed.all_success
+
+    resumed.finish(processed)
+    assert not resumed.path.exists()
+    results = json.loads((processed / "kenshin.jsonl.results.json").read_text(encoding="utf-8"))
+    assert results[key_a]["karte_url"] == "https://homis/k/1"
+    assert results[key_b] == {"line": 2, "success": False, "karte_url": "", "error": "ステップ失敗"}
+
+
+def test_broken_progress_starts_over(tmp_path):
+    progress_dir = tmp_path / ".progress"
+    progress_dir.mkdir()
+    (progress_dir / "kenshin.jsonl.json").write_text("{broken", encoding="utf-8")
+    assert BundleProgress(tmp_path, "kenshin.jsonl").results == {}
+
+
+def test_expand_compound_merges_shared_data():
+    job = {"action": "homis_karte_write", "job_id": "parent", "_retry": {"attempts": 1},
+           "data": {"homisId": "1", "doctorName": "山田"},
+           "templates": [{"template": "xray_karte", "data": {"orderId": "O-1"}},
+                         {"template": "oushin_blank_karte", "data": {"doctorName": "佐藤"}, "job_id": "J-2"}]}
+    first, second = expand_compound(job)
+    assert first == {"action": "homis_karte_write", "template": "xray_karte",
+                     "data": {"homisId": "1", "doctorName": "山田", "orderId": "O-1"}}
+    assert second["data"]["doctorName"] == "佐藤" and second["job_id"] == "J-2"
+
+
+def test_expand_compound_rejects_bad_entries():
+    for templates in (None, [], [{"data": {}}], ["xray_karte"]):
+        with pytest.raises(ValueError):
+            expand_compound({"templates": templates})
+
+
+def test_compound_keys():
+    items = [{"template": "xray_karte", "data": {"orderId": "O-1"}},
+             {"template": "oushin_blank_karte", "job_id": "J-2"}]
+    keys = compound_keys({"templates": items})
+    assert keys[0].startswith("1:") and keys[1] == "J-2"
+    # 並べ替え・書き換えると番号なしの要素は別のキーになる
+    assert compound_keys({"templates": [items[1], items[0]]})[1] != keys[0]
+    assert compound_keys({"templates": items}) == keys
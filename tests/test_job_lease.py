@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""job_lease: ファイルの取得・返却・期限切れ回収"""
+
+import time
+
+import pytest
+
+import job_lease
+from job_lease import CLAIM_MARK, JobLeaseManager, original_name
+
+
+@pytest.fixture
+def alive(monkeypatch):
+    """_pid_alive を差し替え（生きているPIDの集合を返す）"""
+    pids = set()
+    monkeypatch.setattr(job_lease, "_pid_alive", lambda pid: pid in pids)
+    return pids
+
+
+def _job(folder, name="XP_patient.json"):
+    path = folder / name
+    path.write_text("{}", encoding="utf-8")
+    return path
+
+
+def _foreign(folder, name, host, pid, claimed_at):
+    """他のノードが取得したファイルを作る"""
+    path = folder / f"{name}{CLAIM_MARK}{host}.{pid}.{int(claimed_at)}"
+    path.write_text("{}", encoding="utf-8")
+    return path
+
+
+def test_claim_renames_once(tmp_path):
+    path = _job(tmp_path)
+    leases = JobLeaseManager(tmp_path)
+
+    claimed = leases.claim(path)
+    assert claimed is not None and not path.exists()
+    assert original_name(claimed) == "XP_patient.json"
+    # 2台目は同じファイルを取得できない
+    assert JobLeaseManager(tmp_path).claim(path) is None
+
+
+def test_release_restores_original_name(tmp_path):
+    leases = JobLeaseManager(tmp_path)
+    claimed = leases.claim(_job(tmp_path))
+    assert leases.release(claimed) == tmp_path / "XP_patient.json"
+
+
+def test_renew_moves_claim_time(tmp_path):
+    leases = JobLeaseManager(tmp_path)
+    path = _job(tmp_path)
+    stale = _foreign(tmp_path, path.name, leases.host, leases.pid, time.time() - 100)
+    path.unlink()
+
+    renewed = leases.renew(stale)
+    assert renewed is not None and renewed != stale and renewed.exists()
+    assert original_name(renewed) == "XP_patient.json"
+    # 回収済みなら None
+    assert leases.renew(stale) is None
+
+
+def test_reclaim_skips_own_active_claim(tmp_path, alive):
+    leases = JobLeaseManager(tmp_path)
+    leases.claim(_job(tmp_path))
+    assert leases.reclaim_expired() == 0
+
+
+def test_reclaim_expired_lease(tmp_path, alive):
+    alive.add(4242)
+    _foreign(tmp_path, "a.json", "other-pc", 4242, time.time() - 700)
+    _foreign(tmp_path, "b.json", "other-pc", 4242, time.time() - 10)
+    leases = JobLeaseManager(tmp_path, lease_seconds=600)
+
+    assert leases.reclaim_expired() == 1
+    assert (tmp_path / "a.json").exists()
+    assert not (tmp_path / "b.json").exists()
+
+
+def test_reclaim_dead_process_on_same_host(tmp_path, alive):
+    leases = JobLeaseManager(tmp_path)
+    alive.add(4242)
+    _foreign(tmp_path, "alive.json", leases.host, 4242, time.time())
+    _foreign(tmp_path, "dead.json", leases.host, 4343, time.time())
+    # 他のPCのPIDは生死を確認できないので期限まで待つ
+    _foreign(tmp_path, "remote.json", "other-pc", 4343, time.time())
+
+    assert leases.reclaim_expired() == 1
+    assert (tmp_path / "dead.json").exists()
+
+
+def test_reclaim_own_claim_from_previous_run(tmp_path, alive):
+    """PIDが再利用された前回起動分（起動時刻より前の取得）は回収する"""
+    leases = JobLeaseManager(tmp_path)
+    _foreign(tmp_path, "old.json", leases.host, leases.pid, leases.started_at - 60)
+    assert leases.reclaim_expired() == 1
+    assert (tmp_path / "old.json").exists()
+
+
+def test_node_stats_roundtrip(tmp_path):
+    leases = JobLeaseManager(tmp_path, stats_interval=60)
+    assert leases.maybe_write_stats({"jobs_per_hour": 12, "total": 3, "total_success": 2})
+    assert not leases.maybe_write_stats({})
+    (stats,) = leases.read_node_stats()
+    assert stats["node"] == leases.node_id and stats["jobs_per_hour"] == 12
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""job_validator: ブラウザ起動前のジョブ検証"""
+
+import pytest
+
+import job_validator
+from job_validator import validate_job
+
+PROD = {"test_mode": False}
+
+XRAY_DATA = {
+    "homisId": "12345",
+    "doctorName": "山田",
+    "shootingDate": "2026-10-18",
+    "shootingTime": "09:30",
+    "shootingTimeEnd": "09:45",
+    "sContent": "胸部X線",
+    "apContent": "異常なし",
+}
+
+
+def _job(**data):
+    return {"action": "homis_karte_write", "template": "xray_karte", "data": dict(XRAY_DATA, **data)}
+
+
+def test_valid_template_job():
+    assert validate_job(_job(), PROD) == []
+
+
+def test_unsupported_action():
+    errors = validate_job({"action": "delete", "data": {"homisId": "1"}}, PROD)
+    assert errors and errors[0].startswith("action:")
+
+
+def test_data_must_be_object():
+    for data in (None, "12345", [1, 2]):
+        job = {"action": "homis_karte_write", "data": data}
+        assert validate_job(job, PROD)[-1] == "data: オブジェクトではありません"
+
+
+def test_homis_id_checked_only_outside_test_mode():
+    job = _job(homisId="abc")
+    assert any(e.startswith("homisId:") for e in validate_job(job, PROD))
+    assert validate_job(job, {"test_mode": True}) == []
+
+
+def test_reports_each_bad_field():
+    errors = validate_job(_job(shootingDate="2026-02-30", shootingTime="9:30", sContent=" "), PROD)
+    fields = sorted(e.split(":")[0] for e in errors)
+    assert fields == ["sContent", "shootingDate", "shootingTime"]
+
+
+def test_optional_variable_may_be_empty(tmp_path, monkeypatch):
+    (tmp_path / "memo_karte.yaml").write_text(
+        "variables:\n  visitDate: {type: date}\n  memo: {type: text, required: false}\n", encoding="utf-8")
+    monkeypatch.setattr(job_validator, "TEMPLATES_DIR", tmp_path)
+    job = {"action": "homis_karte_write", "template": "memo_karte",
+           "data": {"homisId": "1", "visitDate": "2026-10-18", "memo": ""}}
+    assert validate_job(job, PROD) == []
+    job["data"]["visitDate"] = "2026/10/18"
+    assert [e.split(":")[0] for e in validate_job(job, PROD)] == ["visitDate"]
+
+
+@pytest.mark.parametrize("visit_date", ["2026-10-18", "2026/10/18", "令和8年10月18日"])
+def test_oushin_visit_date_format_is_not_restricted(visit_date):
+    job = {"action": "homis_karte_write", "template": "oushin_blank_karte",
+           "data": {"homisId": "1", "visitDate": visit_date, "doctorName": "山田"}}
+    assert validate_job(job, PROD) == []
+    job["data"]["visitDate"] = " "
+    assert [e.split(":")[0] for e in validate_job(job, PROD)] == ["visitDate"]
+
+
+def test_unknown_template():
+    errors = validate_job(dict(_job(), template="no_such_template"), PROD)
+    assert errors == ["template: テンプレートが見つかりません: no_such_template"]
+
+
+def test_legacy_job_checks_date_only():
+    job = {"action": "homis_karte_write", "data": {"homisId": "1", "shootingDate": "10/18"}}
+    errors = validate_job(job, PROD)
+    assert len(errors) == 1 and errors[0].startswith("shootingDate:")
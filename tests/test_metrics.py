@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""metrics: 処理件数・遅延・工程別時間・WebDriverコマンドの集計"""
+
+import pytest
+
+import metrics
+from metrics import WatcherMetrics, _percentile
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [10000.0]
+    monkeypatch.setattr(metrics.time, "time", lambda: now[0])
+    return now
+
+
+def finish(m, clock, queued_ago, homis, success=True, commands=None):
+    timer = m.start_job(clock[0] - queued_ago)
+    timer.lap("parse")
+    clock[0] += homis
+    timer.lap("homis")
+    timer.commands = commands or {}
+    m.finish_job(timer, success)
+
+
+def test_empty_snapshot():
+    snapshot = WatcherMetrics().snapshot()
+    assert snapshot["jobs_per_hour"] == 0 and snapshot["success_rate"] is None
+    assert snapshot["latency_p50"] is None and snapshot["webdriver"] is None
+    assert snapshot["stages"] == {"parse": None, "homis": None, "post": None}
+
+
+def test_counts_latency_and_stages(clock):
+    m = WatcherMetrics()
+    m.set_queue_depth(3)
+    finish(m, clock, queued_ago=10, homis=2)
+    finish(m, clock, queued_ago=20, homis=4, success=False)
+    snapshot = m.snapshot()
+    assert snapshot["queue_depth"] == 1
+    assert snapshot["jobs_per_hour"] == 2 and snapshot["success_rate"] == 50.0
+    assert (snapshot["latency_p50"], snapshot["latency_p95"]) == (12, 24)
+    assert snapshot["stages"] == {"parse": 0.0, "homis": 3.0, "post": 0.0}
+    assert (snapshot["total"], snapshot["total_success"]) == (2, 1)
+
+
+def test_throughput_window(clock):
+    m = WatcherMetrics()
+    finish(m, clock, queued_ago=0, homis=1)
+    clock[0] += metrics.THROUGHPUT_WINDOW + 1
+    finish(m, clock, queued_ago=0, homis=1)
+    snapshot = m.snapshot()
+    assert snapshot["jobs_per_hour"] == 1 and snapshot["total"] == 2
+
+
+def test_future_or_unknown_queued_at_uses_start(clock):
+    m = WatcherMetrics()
+    assert m.start_job(clock[0] + 60).queued_at == clock[0]   # 時計ずれ
+    assert m.start_job(None).queued_at == clock[0]
+
+
+def test_webdriver_commands_per_job(clock):
+    m = WatcherMetrics()
+    finish(m, clock, 0, 1, commands={"findElement": (4, 0.2), "clickElement": (2, 0.1)})
+    finish(m, clock, 0, 1, commands={"findElement": (2, 0.1)})
+    finish(m, clock, 0, 1)   # ブラウザを使わなかったジョブは平均に含めない
+    webdriver = m.snapshot()["webdriver"]
+    assert webdriver["commands_per_job"] == 4.0
+    assert webdriver["seconds_per_job"] == pytest.approx(0.2)
+    assert list(webdriver["by_command"]) == ["findElement", "clickElement"]
+    assert webdriver["by_command"]["findElement"] == {"per_job": 3.0, "avg_ms": pytest.approx(50.0)}
+
+
+def test_percentile_nearest_rank():
+    values = list(range(1, 21))
+    assert _percentile(values, 50) == 10 and _percentile(values, 95) == 19
+    assert _percentile([7], 95) == 7 and _percentile([], 50) is None
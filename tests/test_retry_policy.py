@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""retry_policy: 再試行の待ち時間・スケジュール・デッドレター"""
+
+import json
+import time
+
+from retry_policy import RETRY_MARK, RetryPolicy, with_attempt
+
+JOB = {"action": "homis_karte_write", "data": {"homisId": "1"}}
+FAILURE = {"success": False, "error": "タイムアウト", "error_class": "transient"}
+
+
+def test_backoff_doubles_up_to_max_delay(tmp_path):
+    policy = RetryPolicy(tmp_path)
+    assert [policy.retry_delay("transient", n) for n in (1, 2, 3, 4, 5)] == [30, 60, 120, 240, None]
+    assert policy.retry_delay("ui_changed", 4) == 3600
+
+
+def test_classes_without_retry(tmp_path):
+    policy = RetryPolicy(tmp_path)
+    for error_class in ("invalid", "url_missing", "no_such_class"):
+        assert policy.retry_delay(error_class, 1) is None
+        assert policy.max_attempts(error_class) == 1
+
+
+def test_config_overrides_policy(tmp_path):
+    policy = RetryPolicy(tmp_path, {"policies": {"login": {"max_attempts": 1},
+                                                 "transient": {"base_delay": 5}}})
+    assert policy.retry_delay("login", 1) is None
+    assert policy.retry_delay("transient", 2) == 10
+    assert policy.max_attempts("transient") == 5
+
+
+def test_with_attempt_keeps_original(tmp_path):
+    job = with_attempt(JOB, FAILURE, 1)
+    job = with_attempt(job, dict(FAILURE, error="再度タイムアウト"), 2)
+    assert "_retry" not in JOB
+    assert RetryPolicy.attempts_of(job) == 2
+    assert [h["error"] for h in job["_retry"]["history"]] == ["タイムアウト", "再度タイムアウト"]
+
+
+def test_schedule_and_release_due(tmp_path):
+    policy = RetryPolicy(tmp_path)
+    claimed = tmp_path / "a.json.claimed.pc.1.1000"
+    claimed.write_text(json.dumps(JOB), encoding="utf-8")
+
+    target = policy.schedule(claimed, "a.json", JOB, FAILURE, attempts=1, delay=60)
+    assert not claimed.exists() and target.name.startswith(f"a.json{RETRY_MARK}")
+    assert [p.name for p in tmp_path.iterdir()] == [target.name]   # 一時ファイルは残らない
+    assert policy.release_due() == 0   # まだ時刻前
+
+    due = tmp_path / f"a.json{RETRY_MARK}{int(time.time()) - 1}"
+    target.rename(due)
+    assert policy.release_due() == 1
+    job = json.loads((tmp_path / "a.json").read_text(encoding="utf-8"))
+    assert RetryPolicy.attempts_of(job) == 1
+
+
+def test_release_waits_for_same_name_job(tmp_path):
+    policy = RetryPolicy(tmp_path)
+    (tmp_path / "a.json").write_text("{}", encoding="utf-8")
+    (tmp_path / f"a.json{RETRY_MARK}0").write_text("{}", encoding="utf-8")
+    (tmp_path / f"b.json{RETRY_MARK}soon").write_text("{}", encoding="utf-8")
+    assert policy.release_due() == 0
+
+
+def test_dead_letter_writes_error_info(tmp_path):
+    policy = RetryPolicy(tmp_path, {"dead_letter_folder": str(tmp_path / "dlq")})
+    results = [{"template": "xray_karte", "success": True}]
+    for _ in range(2):
+        path = tmp_path / "a.json.claimed.pc.1.1000"
+        path.write_text(json.dumps(JOB), encoding="utf-8")
+        dest = policy.dead_letter(path, "a.json", dict(FAILURE, results=results), attempts=5)
+
+    # 同名がすでにあれば日時付きの名前にする
+    assert dest.name != "a.json" and dest.parent == tmp_path / "dlq"
+    info = json.loads(dest.with_name(dest.name + ".error.json").read_text(encoding="utf-8"))
+    assert info["file"] == dest.name and info["attempts"] == 5
+    assert info["error_class"] == "transient" and info["results"] == results
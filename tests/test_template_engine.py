@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""template_engine: ステップ実行（セッション切れからの再開・保存ステップの扱い）"""
+
+from types import SimpleNamespace
+
+import pytest
+from selenium.common.exceptions import WebDriverException
+
+import template_engine
+from browser_actions import SessionExpired
+from template_engine import TemplateEngine
+
+EXPIRED = "expired"
+
+
+class FakeActions:
+    """ステップ名ごとに結果（True / False / EXPIRED）を順に返す"""
+
+    def __init__(self, outcomes=None):
+        self.outcomes = {name: list(values) for name, values in (outcomes or {}).items()}
+        self.calls = []
+
+    def execute_action(self, step, data):
+        self.calls.append(step["name"])
+        queue = self.outcomes.get(step["name"])
+        outcome = queue.pop(0) if queue else True
+        if outcome == EXPIRED:
+            raise SessionExpired("ログイン画面に戻された")
+        return outcome
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    engine = TemplateEngine({})
+    engine.logins = 0
+
+    def login(auth_config, target_url):
+        engine.logins += 1
+        return True
+    monkeypatch.setattr(engine, "_do_login", login)
+    return engine
+
+
+class FakeDriver:
+    """fingerprint の確認スクリプトに、見つからないセレクタを順に返す"""
+
+    def __init__(self, *missing):
+        self.missing = list(missing)
+        self.checked = []
+
+    def execute_script(self, script, selectors):
+        self.checked.append(list(selectors))
+        return self.missing.pop(0) if self.missing else []
+
+
+def run(engine, steps, outcomes=None, auth=None):
+    engine.actions = FakeActions(outcomes)
+    result = {"success": False, "karte_url": None}
+    ok = engine._run_steps(steps, {}, auth or {"max_relogins": 1}, "https://homis/p", result)
+    return ok, result
+
+
+def _steps(*names, **options):
+    return [dict({"name": name}, **options.get(name, {})) for name in names]
+
+
+def test_relogin_resumes_from_checkpoint(engine):
+    steps = _steps("新規", "入力", "本文", "保存", 入力={"checkpoint": True})
+    ok, result = run(engine, steps, {"本文": [EXPIRED]})
+    assert ok and engine.logins == 1
+    assert engine.actions.calls == ["新規", "入力", "本文", "入力", "本文", "保存"]
+
+
+def test_relogin_without_checkpoint_restarts(engine):
+    ok, _ = run(engine, _steps("新規", "入力", "保存"), {"入力": [EXPIRED]})
+    assert ok and engine.actions.calls == ["新規", "入力", "新規", "入力", "保存"]
+
+
+def test_expired_on_last_step_is_not_replayed(engine):
+    ok, result = run(engine, _steps("新規", "入力", "保存"), {"保存": [EXPIRED]})
+    assert not ok and result["error_class"] == "url_missing"
+    assert engine.logins == 0 and engine.actions.calls == ["新規", "入力", "保存"]
+
+
+def test_expired_after_commit_step_is_not_replayed(engine):
+    steps = _steps("新規", "保存", "確認", 保存={"commit": True})
+    ok, result = run(engine, steps, {"確認": [EXPIRED]})
+    assert not ok and result["error_class"] == "url_missing" and "「保存」" in result["error"]
+    assert engine.actions.calls == ["新規", "保存", "確認"]
+
+
+def test_relogin_limit(engine):
+    ok, result = run(engine, _steps("新規", "入力", "保存"), {"入力": [EXPIRED, EXPIRED]})
+    assert not ok and result["error_class"] == "login" and engine.logins == 1
+
+
+@pytest.mark.parametrize("name", ["xray_karte", "oushin_blank_karte"])
+def test_templates_mark_save_step(engine, name):
+    steps = engine.load_template(name)["steps"]
+    assert [s["name"] for s in steps if s.get("commit")] == [steps[-1]["name"]]
+
+
+def test_step_failure_continues(engine):
+    ok, _ = run(engine, _steps("新規", "入力", "保存"), {"入力": [False]})
+    assert ok and engine.actions.calls == ["新規", "入力", "保存"]
+
+
+def test_critical_failure_aborts(engine):
+    steps = _steps("新規", "入力", "保存", 新規={"critical": True})
+    ok, result = run(engine, steps, {"新規": [False]})
+    assert not ok and result["error_class"] == "step_failed" and "新規" in result["error"]
+    assert engine.actions.calls == ["新規"]
+
+
+def test_depends_on_skips_without_running(engine):
+    steps = _steps("医科カルテ", "診察日", "本文", "保存",
+                   診察日={"depends_on": "医科カルテ"}, 本文={"depends_on": ["診察日"]})
+    ok, _ = run(engine, steps, {"医科カルテ": [False]})
+    # 前提が失敗 → 直接の依存も、スキップされたステップへの依存も実行しない
+    assert ok and engine.actions.calls == ["医科カルテ", "保存"]
+
+
+def test_depends_on_runs_when_prerequisite_succeeds(engine):
+    steps = _steps("医科カルテ", "診察日", "保存", 診察日={"depends_on": "医科カルテ"})
+    ok, _ = run(engine, steps)
+    assert ok and engine.actions.calls == ["医科カルテ", "診察日", "保存"]
+
+
+def test_depends_on_cleared_after_relogin(engine):
+    steps = _steps("新規", "医科カルテ", "診察日", "本文", "保存",
+                   新規={"checkpoint": True}, 診察日={"depends_on": "医科カルテ"})
+    ok, _ = run(engine, steps, {"医科カルテ": [False, True], "本文": [EXPIRED]})
+    # 再開後は前提をやり直すので、1回目にスキップした診察日も実行する
+    assert ok and engine.actions.calls == ["新規", "医科カルテ", "本文",
+                                           "新規", "医科カルテ", "診察日", "本文", "保存"]
+
+
+@pytest.mark.parametrize("depends_on", ["保存", "存在しない", "入力"])
+def test_depends_on_must_point_to_earlier_step(engine, depends_on):
+    steps = _steps("新規", "入力", "保存", 入力={"depends_on": depends_on})
+    ok, result = run(engine, steps)
+    assert not ok and result["error_class"] == "invalid"
+    assert engine.actions.calls == []
+
+
+@pytest.fixture
+def fingerprint_engine(monkeypatch):
+    monkeypatch.setattr(template_engine, "FINGERPRINT_RETRY_DELAY", 0)
+    engine = TemplateEngine({})
+    engine.session = SimpleNamespace(generation=1, verified={})
+    return engine
+
+
+FINGERPRINT = {"fingerprint": ["#karteNew", "#doctor018"]}
+
+
+def test_fingerprint_missing_after_retries(fingerprint_engine):
+    fingerprint_engine.driver = FakeDriver(*[["#doctor018"]] * 3)
+    assert fingerprint_engine._check_fingerprint("xray_karte", FINGERPRINT) == ["#doctor018"]
+    # 再確認は見つからなかった要素だけ。一致しなかった世代は記録しない
+    assert fingerprint_engine.driver.checked == [["#karteNew", "#doctor018"]] + [["#doctor018"]] * 2
+    assert fingerprint_engine.session.verified == {}
+
+
+def test_fingerprint_late_element_is_not_ui_change(fingerprint_engine):
+    fingerprint_engine.driver = FakeDriver(["#doctor018"], [])
+    assert fingerprint_engine._check_fingerprint("xray_karte", FINGERPRINT) == []
+    assert fingerprint_engine.session.verified == {"xray_karte": 1}
+
+
+def test_fingerprint_checked_once_per_generation(fingerprint_engine):
+    fingerprint_engine.driver = FakeDriver()
+    fingerprint_engine._check_fingerprint("xray_karte", FINGERPRINT)
+    fingerprint_engine._check_fingerprint("xray_karte", FINGERPRINT)
+    assert len(fingerprint_engine.driver.checked) == 1
+
+    fingerprint_engine.session.generation = 2   # ブラウザを起動し直したら確認し直す
+    fingerprint_engine._check_fingerprint("xray_karte", FINGERPRINT)
+    assert len(fingerprint_engine.driver.checked) == 2
+
+
+def test_no_fingerprint_skips_check(fingerprint_engine):
+    fingerprint_engine.driver = FakeDriver(["#x"])
+    assert fingerprint_engine._check_fingerprint("xray_karte", {}) == []
+    assert fingerprint_engine.driver.checked == []
+
+
+PATIENT = "https://homis/?patient_id=1"
+
+
+class PageDriver(FakeDriver):
+    def __init__(self, url=PATIENT, *missing):
+        super().__init__(*missing)
+        self.url = url
+
+    @property
+    def current_url(self):
+        if isinstance(self.url, Exception):
+            raise self.url
+        return self.url
+
+
+def reuse(driver, previous=PATIENT, template=None, **config):
+    engine = TemplateEngine(config)
+    engine.driver = driver
+    engine.session = SimpleNamespace(current_page=previous)
+    reused = engine._can_reuse_page(PATIENT, template or FINGERPRINT)
+    assert engine.session.current_page is None   # 次に正常終了するまで再利用しない
+    return reused
+
+
+def test_reuse_same_patient_page():
+    driver = PageDriver()
+    assert reuse(driver)
+    assert driver.checked == [FINGERPRINT["fingerprint"]]
+
+
+@pytest.mark.parametrize("driver, previous, config", [
+    (PageDriver(), "https://homis/?patient_id=2", {}),             # 別の患者
+    (PageDriver(), None, {}),                                      # 前のジョブが失敗
+    (PageDriver(), PATIENT, {"reuse_patient_page": False}),        # 設定で無効
+    (PageDriver("https://homis/login"), PATIENT, {}),              # 画面が移動している
+    (PageDriver(PATIENT, ["#doctor018"]), PATIENT, {}),            # 画面の要素がそろっていない
+    (PageDriver(WebDriverException("disconnected")), PATIENT, {}),  # ブラウザ異常
+])
+def test_page_not_reused(driver, previous, config):
+    assert not reuse(driver, previous, **config)
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""watcher: 画面構成の変更（ui_changed）でキューを止める"""
+
+import copy
+import json
+
+import pytest
+
+import watcher
+from circuit_breaker import OPEN, CLOSED
+
+
+@pytest.fixture
+def folder_watcher(tmp_path, monkeypatch):
+    config = copy.deepcopy(watcher.DEFAULT_CONFIG)
+    config.update(watch_folder=str(tmp_path), test_mode=False)
+    w = watcher.FolderWatcher(config)
+    w.readiness.stable_seconds = 0
+    w.written = []
+    w.outcome = {"success": False, "karte_url": None,
+                 "error": "画面構成の変更を検出（見つからない要素: #karteNew）", "error_class": "ui_changed"}
+
+    def write(data):
+        w.written.append(data["data"]["homisId"])
+        return dict(w.outcome)
+    monkeypatch.setattr(watcher, "validate_job", lambda data, config: [])
+    monkeypatch.setattr(w, "_write_to_homis", write)
+    monkeypatch.setattr(w, "_notify_gas", lambda *args: None)
+    monkeypatch.setattr(w, "_write_result_file", lambda *args, **kwargs: None)
+    monkeypatch.setattr(w, "_notify_oushin_chat", lambda *args, **kwargs: None)
+    monkeypatch.setattr(w, "_maintain_browser", lambda active: None)
+    monkeypatch.setattr(w.breaker, "probe", lambda: True)
+    for homis_id in ("1", "2"):
+        (tmp_path / f"job{homis_id}.json").write_text(
+            json.dumps({"action": "homis_karte_write", "data": {"homisId": homis_id}}), encoding="utf-8")
+    return w
+
+
+def test_ui_changed_pauses_queue(folder_watcher, tmp_path):
+    results = folder_watcher.run_cycle()
+
+    assert folder_watcher.breaker.state == OPEN
+    assert folder_watcher.written == ["1"]   # 2件目はブラウザを使わずにフォルダに残す
+    assert [ok for _, ok in results] == [False]
+    assert (tmp_path / "job2.json").exists()
+    assert not list((tmp_path / "失敗").glob("*"))   # 再試行待ち（デッドレターにしない）
+    assert list(tmp_path.glob("job1.json.retry.*"))
+
+    folder_watcher.run_cycle()
+    assert folder_watcher.written == ["1"]   # 保留時間（ui_change_hold）中はHTTP確認もしない
+
+
+def test_ui_changed_opens_breaker_at_once(folder_watcher):
+    folder_watcher.breaker.failure_threshold = 10
+    folder_watcher._job_timer = folder_watcher.metrics.start_job(None)
+    folder_watcher._execute_job({"action": "homis_karte_write", "data": {"homisId": "1"}}, "job1.json")
+    assert folder_watcher.breaker.state == OPEN
+
+
+def test_step_failure_does_not_pause_queue(folder_watcher):
+    folder_watcher.outcome.update(error="ステップ失敗: 新規", error_class="step_failed")
+    folder_watcher.run_cycle()
+    assert folder_watcher.breaker.state == CLOSED
+    assert folder_watcher.written == ["1", "2"]
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""watcher: バンドル処理の中断と再開"""
+
+import copy
+import json
+
+import pytest
+
+import watcher
+
+LINES = [{"action": "homis_karte_write", "data": {"homisId": str(i)}} for i in (1, 2, 3)]
+
+
+@pytest.fixture
+def folder_watcher(tmp_path, monkeypatch):
+    config = copy.deepcopy(watcher.DEFAULT_CONFIG)
+    config.update(watch_folder=str(tmp_path), test_mode=False)
+    w = watcher.FolderWatcher(config)
+    w.readiness.stable_seconds = 0
+    w.calls = []
+    w.fail_on = set()
+
+    def execute(data, label, attempts=None):
+        w.calls.append(data["data"]["homisId"])
+        if data["data"]["homisId"] in w.fail_on:
+            w.fail_on.discard(data["data"]["homisId"])
+            raise RuntimeError("想定外")
+        return {"success": True, "karte_url": "https://homis/k"}
+    monkeypatch.setattr(w, "_execute_job", execute)
+    monkeypatch.setattr(w, "_maintain_browser", lambda active: None)
+    (tmp_path / "batch.jsonl").write_text("\n".join(json.dumps(line) for line in LINES) + "\n",
+                                          encoding="utf-8")
+    return w
+
+
+def test_unexpected_error_returns_bundle_for_resume(folder_watcher, tmp_path):
+    folder_watcher.fail_on = {"2"}
+    results = folder_watcher.run_cycle()
+
+    assert [ok for _, ok in results] == [False]
+    assert "batch.jsonl" not in folder_watcher.processed_files   # このPCでも再び拾える
+    assert (tmp_path / "batch.jsonl").exists()   # リースを解除して元の名前に戻る
+
+    results = folder_watcher.run_cycle()
+    assert [ok for _, ok in results] == [True]
+    assert folder_watcher.calls == ["1", "2", "2", "3"]   # 1行目は進捗から飛ばす
+    assert (tmp_path / "済" / "batch.jsonl").exists()
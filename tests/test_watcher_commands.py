@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""watcher: ジョブごとのWebDriverコマンド数の記録"""
+
+import copy
+from types import SimpleNamespace
+
+import pytest
+
+import watcher
+from browser_session import CommandCounter
+
+JOB = {"action": "homis_karte_write", "job_id": "j1", "data": {"homisId": "1"}}
+
+
+@pytest.fixture
+def folder_watcher(tmp_path, monkeypatch):
+    config = copy.deepcopy(watcher.DEFAULT_CONFIG)
+    config.update(watch_folder=str(tmp_path), test_mode=False)
+    w = watcher.FolderWatcher(config)
+    w.browser_session = SimpleNamespace(commands=CommandCounter())
+
+    def write(data):
+        for command in ("findElement", "findElement", "clickElement"):
+            w.browser_session.commands.record(command, 0.01)
+        return {"success": True, "karte_url": "https://homis/k"}
+    monkeypatch.setattr(watcher, "validate_job", lambda data, config: [])
+    monkeypatch.setattr(w, "_write_to_homis", write)
+    monkeypatch.setattr(w, "_write_result_file", lambda *args, **kwargs: None)
+    monkeypatch.setattr(w, "_notify_oushin_chat", lambda *args, **kwargs: None)
+    w._job_timer = w.metrics.start_job(None)
+    return w
+
+
+def test_commands_are_recorded_per_job(folder_watcher):
+    folder_watcher.browser_session.commands.record("newWindow", 0.5)   # ジョブ間（リサイクル等）の分
+    folder_watcher._execute_job(dict(JOB), "j1.json")
+    commands = folder_watcher._job_timer.commands
+    assert {command: count for command, (count, _) in commands.items()} == {"findElement": 2, "clickElement": 1}
+
+    folder_watcher.metrics.finish_job(folder_watcher._job_timer, True)
+    assert folder_watcher.metrics.snapshot()["webdriver"]["commands_per_job"] == 3
+
+
+def test_commands_of_compound_parts_are_merged(folder_watcher):
+    folder_watcher._execute_job(dict(JOB), "j1.json")
+    folder_watcher._execute_job(dict(JOB, job_id="j2"), "j2.json")
+    count, seconds = folder_watcher._job_timer.commands["findElement"]
+    assert count == 4 and seconds == pytest.approx(0.04)
+
+
+def test_no_browser_records_nothing(folder_watcher):
+    folder_watcher.browser_session = None
+    folder_watcher._record_commands("j1.json")
+    assert folder_watcher._job_timer.commands == {}
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""watcher: 複合ジョブ（templates）の事前検証・再試行時の再開"""
+
+import copy
+
+import pytest
+
+import watcher
+
+XRAY = {"doctorName": "山田", "shootingDate": "2026-10-18", "shootingTime": "09:30",
+        "shootingTimeEnd": "09:45", "sContent": "胸部X線", "apContent": "異常なし"}
+
+
+@pytest.fixture
+def folder_watcher(tmp_path, monkeypatch):
+    config = copy.deepcopy(watcher.DEFAULT_CONFIG)
+    config.update(watch_folder=str(tmp_path), test_mode=False)
+    w = watcher.FolderWatcher(config)
+    w._job_timer = w.metrics.start_job(None)
+    w.calls = []
+    w.outcomes = []
+
+    def write(data):
+        w.calls.append(data["template"])
+        if w.outcomes:
+            return w.outcomes.pop(0)
+        return {"success": True, "karte_url": f"https://homis/k/{len(w.calls)}"}
+    monkeypatch.setattr(w, "_write_to_homis", write)
+    monkeypatch.setattr(w, "_notify_gas", lambda *args: None)
+    monkeypatch.setattr(w, "_write_result_file", lambda *args, **kwargs: None)
+    monkeypatch.setattr(w, "_notify_oushin_chat", lambda *args, **kwargs: None)
+    return w
+
+
+def _compound(*templates):
+    return {"action": "homis_karte_write", "data": {"homisId": "123"}, "templates": list(templates)}
+
+
+def _xray(**data):
+    return {"template": "xray_karte", "data": dict(XRAY, **data)}
+
+
+def test_invalid_entry_rejects_whole_job(folder_watcher):
+    job = _compound(_xray(orderId="O-1"), _xray(orderId="O-2", shootingDate="2026/10/18"))
+    result = folder_watcher._execute_job(job, "compound.json", attempts=1)
+
+    assert folder_watcher.calls == []   # 1件目も作成しない
+    assert result["error_class"] == "invalid" and "[2 xray_karte] shootingDate" in result["error"]
+
+
+def test_duplicate_job_id_rejected(folder_watcher):
+    job = _compound(dict(_xray(), job_id="J"), dict(_xray(), job_id="J"))
+    result = folder_watcher._execute_job(job, "compound.json", attempts=1)
+    assert folder_watcher.calls == [] and "重複" in result["error"]
+
+
+def test_retry_skips_finished_entries(folder_watcher):
+    job = _compound(_xray(orderId="O-1"), _xray(orderId="O-2"))
+    folder_watcher.outcomes = [
+        {"success": True, "karte_url": "https://homis/k/1"},
+        {"success": False, "karte_url": None, "error": "タイムアウト", "error_class": "navigation"},
+    ]
+    first = folder_watcher._execute_job(job, "compound.json", attempts=1)
+    assert first["retry"] and folder_watcher.calls == ["xray_karte", "xray_karte"]
+
+    # 再試行（_results は同じジョブJSONに残っている）
+    second = folder_watcher._execute_job(job, "compound.json", attempts=2)
+    assert folder_watcher.calls == ["xray_karte"] * 3   # 1件目は飛ばす
+    assert second["success"] and [item["order_id"] for item in second["results"]] == ["O-1", "O-2"]
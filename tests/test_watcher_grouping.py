@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""watcher: 同じ患者のジョブをまとめる並べ替え"""
+
+import json
+
+import pytest
+
+from watcher import _patient_key, _peek_patient, group_by_patient
+
+
+@pytest.mark.parametrize("job", [
+    None, "12345", [1, 2], {}, {"data": None}, {"data": "12345"}, {"data": [1]}, {"data": {}},
+])
+def test_patient_key_unknown(job):
+    assert _patient_key(job) == ""
+
+
+def test_patient_key():
+    assert _patient_key({"data": {"homisId": 12345}}) == "12345"
+
+
+def test_peek_patient_tolerates_bad_files(tmp_path):
+    null_data = tmp_path / "null.json"
+    null_data.write_text(json.dumps({"action": "homis_karte_write", "data": None}), encoding="utf-8")
+    broken = tmp_path / "broken.json"
+    broken.write_text("{broken", encoding="utf-8")
+    ok = tmp_path / "ok.json"
+    ok.write_text(json.dumps({"data": {"homisId": "7"}}), encoding="utf-8")
+
+    assert _peek_patient(null_data) == ""
+    assert _peek_patient(broken) == ""
+    assert _peek_patient(tmp_path / "missing.json") == ""
+    assert _peek_patient(ok) == "7"
+
+
+def test_group_by_patient_keeps_first_positions():
+    jobs = [{"id": 1, "data": {"homisId": "A"}}, {"id": 2, "data": None},
+            {"id": 3, "data": {"homisId": "B"}}, {"id": 4, "data": {"homisId": "A"}},
+            {"id": 5, "data": None}]
+    ordered = group_by_patient(jobs, _patient_key)
+    # 不明な患者（data が null）はまとめずに元の位置のまま
+    assert [job["id"] for job in ordered] == [1, 4, 2, 3, 5]